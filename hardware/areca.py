@@ -15,11 +15,11 @@
 """Wrapper functions around the areca command."""
 
 import re
-from subprocess import PIPE
-from subprocess import Popen
+import shlex
 import sys
 
 from hardware import detect_utils
+from hardware import runner
 
 
 SEP_REGEXP = re.compile(r"\s*:\s*")
@@ -89,14 +89,10 @@ def _split_parts(sep, output):
     return arr
 
 
-def _run_areca(*args):
+def _run_areca(*args, cached=True):
     """Run the areca command in a subprocess and return the output."""
-    cmd = 'cli64 ' + ' '.join(args)
-    proc = Popen(cmd,
-                 shell=True,
-                 stdout=PIPE,
-                 universal_newlines=True)
-    return proc.communicate()[0]
+    cmd = ['cli64'] + shlex.split(' '.join(args))
+    return runner.run(cmd, cached=cached).text
 
 
 def _run_and_parse(*args, rev=False):
@@ -145,7 +141,7 @@ def _disk_info(disk):
 
 def _disable_password():
     """Command to temporarly disable password on the cli"""
-    _run_areca('set password=0000')
+    _run_areca('set password=0000', cached=False)
 
 
 def detect():
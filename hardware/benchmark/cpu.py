@@ -18,10 +18,10 @@
 Benchmark CPU functions.
 """
 
-import subprocess
 import sys
 
 from hardware.benchmark import utils
+from hardware import runner
 
 
 def run_sysbench_cpu(hw_lst, max_time, cpu_count, processor_num=None):
@@ -34,22 +34,22 @@ def run_sysbench_cpu(hw_lst, max_time, cpu_count, processor_num=None):
         will test all CPUs. Defaults to None.
 
     """
-    taskset = ''
+    taskset = []
     if processor_num is not None:
         sys.stderr.write('Benchmarking CPU %d for %d seconds (%d threads)\n' %
                          (processor_num, max_time, cpu_count))
-        taskset = 'taskset %s' % hex(1 << processor_num)
+        taskset = ['taskset', hex(1 << processor_num)]
     else:
         sys.stderr.write('Benchmarking all CPUs for '
                          '%d seconds (%d threads)\n' % (max_time, cpu_count))
 
-    cmds = ('%s sysbench --max-time=%d --max-requests=10000000'
-            ' --num-threads=%d --test=cpu --cpu-max-prime=15000 run'
-            % (taskset, max_time, cpu_count))
-    sysbench_cmd = subprocess.Popen(cmds, shell=True, stdout=subprocess.PIPE)
+    cmdline = taskset + ['sysbench', '--max-time=%d' % max_time,
+                         '--max-requests=10000000',
+                         '--num-threads=%d' % cpu_count, '--test=cpu',
+                         '--cpu-max-prime=15000', 'run']
+    sysbench_cmd = runner.run(cmdline)
 
-    for line in sysbench_cmd.stdout:
-        line = line.decode()
+    for line in sysbench_cmd.lines():
         if "total number of events" in line:
             line_ = line.rstrip('\n').replace(' ', '')
             _, perf = line_.split(':')
@@ -20,9 +20,12 @@ Benchmark Disk functions.
 
 import json
 import os
+import re
 import subprocess
 import sys
 
+from hardware import runner
+
 
 # NOTE(lucasagomes): The amount of time a specified workload will run before
 # logging any performance numbers. Useful for letting performance settle
@@ -35,15 +38,18 @@ RAMP_TIME = 5
 
 def is_booted_storage_device(disk):
     """Check if a given disk is booted."""
-    cmdline = ("grep -w /ahcexport /proc/mounts | cut -d ' ' -f 1 | "
-               "sed -e 's/[0-9]*//g'")
     if '/dev/' not in disk:
         disk = '/dev/%s' % disk
-    grep_cmd = subprocess.Popen(cmdline,
-                                shell=True, stdout=subprocess.PIPE)
-    for booted_disk in grep_cmd.stdout:
-        booted_disk = booted_disk.decode(errors='ignore')
-        booted_disk = booted_disk.rstrip('\n').strip()
+    try:
+        with open('/proc/mounts', errors='ignore') as mounts:
+            lines = mounts.readlines()
+    except (IOError, OSError):
+        return False
+    for line in lines:
+        if not re.search(r'(^|\W)/ahcexport(\W|$)', line):
+            continue
+        # the device without its partition number
+        booted_disk = re.sub(r'[0-9]*', '', line.split(' ')[0]).strip()
         if booted_disk == disk:
             return True
     return False
@@ -69,27 +75,31 @@ def run_fio(hw_lst, disks_list, mode, io_size, time, rampup_time):
     filelist = [f for f in os.listdir(".") if f.endswith(".fio")]
     for myfile in filelist:
         os.remove(myfile)
-    fio = ("fio --ioengine=libaio --invalidate=1 --ramp_time=%d --iodepth=32 "
-           "--runtime=%d --time_based --direct=1 --output-format=json "
-           "--bs=%s --rw=%s --random_generator=tausworthe64" %
-           (rampup_time, time, io_size, mode))
+    fio = ['fio', '--ioengine=libaio', '--invalidate=1',
+           '--ramp_time=%d' % rampup_time, '--iodepth=32',
+           '--runtime=%d' % time, '--time_based', '--direct=1',
+           '--output-format=json', '--bs=%s' % io_size, '--rw=%s' % mode,
+           '--random_generator=tausworthe64']
 
     global_disk_list = ''
     for disk in disks_list:
         if '/dev/' not in disk:
             disk = '/dev/%s' % disk
         # Flusing Disk's cache prior benchmark
-        os.system("hdparm -f %s >/dev/null 2>&1" % disk)
+        runner.run(['hdparm', '-f', disk])
         short_disk = disk.replace('/dev/', '')
-        fio = "%s --name=MYJOB-%s --filename='%s'" % (fio, short_disk, disk)
+        fio += ['--name=MYJOB-%s' % short_disk, '--filename=%s' % disk]
         global_disk_list += '%s,' % short_disk
     global_disk_list = global_disk_list.rstrip(',')
     sys.stderr.write(
         'Benchmarking storage %s for %s seconds in '
         '%s mode with blocksize=%s\n' %
         (global_disk_list, time, mode, io_size))
-    fio_cmd = subprocess.check_output(fio, shell=True)
-    data = json.loads(fio_cmd)
+    fio_cmd = runner.run(fio)
+    if fio_cmd.returncode != 0:
+        raise subprocess.CalledProcessError(fio_cmd.returncode, fio,
+                                            fio_cmd.stdout, fio_cmd.stderr)
+    data = json.loads(fio_cmd.stdout)
     for job in data['jobs']:
         current_disk = job['jobname'].replace("MYJOB-", "")
         if len(disks_list) > 1:
@@ -19,10 +19,10 @@ Benchmark Memory functions.
 """
 
 import re
-import subprocess
 import sys
 
 from hardware.benchmark import utils
+from hardware import runner
 
 
 def get_available_memory():
@@ -55,11 +55,17 @@ def check_mem_size(block_size, cpu_count):
     return True
 
 
+def _sysbench_memory(max_time, cpu_count, block_size):
+    return ['sysbench', '--max-time=%d' % max_time,
+            '--max-requests=100000000', '--num-threads=%d' % cpu_count,
+            '--test=memory', '--memory-block-size=%s' % block_size, 'run']
+
+
 def run_sysbench_memory_threaded(hw_lst, max_time, block_size, cpu_count,
                                  processor_num=None):
     """Running memtest on a processor."""
     check_mem = check_mem_size(block_size, cpu_count)
-    taskset = ''
+    taskset = []
     if processor_num is not None:
         if check_mem is False:
             msg = ("Avoid Benchmarking memory @%s "
@@ -70,7 +76,7 @@ def run_sysbench_memory_threaded(hw_lst, max_time, block_size, cpu_count,
         sys.stderr.write('Benchmarking memory @%s from CPU %d'
                          ' for %d seconds (%d threads)\n' %
                          (block_size, processor_num, max_time, cpu_count))
-        taskset = 'taskset %s' % hex(1 << processor_num)
+        taskset = ['taskset', hex(1 << processor_num)]
     else:
         if check_mem is False:
             msg = ("Avoid Benchmarking memory @%s "
@@ -81,14 +87,10 @@ def run_sysbench_memory_threaded(hw_lst, max_time, block_size, cpu_count,
                          'for %d seconds (%d threads)\n'
                          % (block_size, max_time, cpu_count))
 
-    _cmd = ('%s sysbench --max-time=%d --max-requests=100000000 '
-            '--num-threads=%d --test=memory --memory-block-size=%s run')
-    sysbench_cmd = subprocess.Popen(_cmd % (taskset, max_time,
-                                            cpu_count, block_size),
-                                    shell=True, stdout=subprocess.PIPE)
+    sysbench_cmd = runner.run(
+        taskset + _sysbench_memory(max_time, cpu_count, block_size))
 
-    for line in sysbench_cmd.stdout:
-        line = line.decode()
+    for line in sysbench_cmd.lines():
         if "transferred" in line:
             _, right = line.rstrip('\n').replace(' ', '').split('(')
             perf, _ = right.split('.')
@@ -113,20 +115,12 @@ def run_sysbench_memory_forked(hw_lst, max_time, block_size, cpu_count):
     sys.stderr.write('Benchmarking memory @%s from all CPUs'
                      ' for %d seconds (%d forked processes)\n'
                      % (block_size, max_time, cpu_count))
-    sysbench_cmd = '('
-    for _ in range(cpu_count):
-        _cmd = ('sysbench --max-time=%d --max-requests=100000000 '
-                '--num-threads=1 --test=memory --memory-block-size=%s run &')
-        sysbench_cmd += _cmd % (max_time, block_size)
-
-    sysbench_cmd.rstrip('&')
-    sysbench_cmd += ')'
+    # the processes run at the same time, like the jobs of a shell
+    cmdlines = [_sysbench_memory(max_time, 1, block_size)] * cpu_count
 
     global_perf = 0
-    process = subprocess.Popen(
-        sysbench_cmd, shell=True, stdout=subprocess.PIPE)
-    for line in process.stdout:
-        line = line.decode()
+    results = runner.run_many(cmdlines, concurrency=cpu_count)
+    for line in (line for result in results for line in result.lines()):
         if "transferred" in line:
             _, right = line.rstrip('\n').replace(' ', '').split('(')
             perf, _ = right.split('.')
@@ -18,11 +18,13 @@
 Benchmark utility functions.
 """
 
-import subprocess
+from hardware import inventory
 
 
 def get_value(hw_lst, level1, level2, level3):
     """Get an specific value from the hardware inventory."""
+    if isinstance(hw_lst, inventory.Inventory):
+        return hw_lst.get(level1, level2, level3)
     for entry in hw_lst:
         if level1 == entry[0] and level2 == entry[1] and level3 == entry[2]:
             return entry[3]
@@ -35,11 +37,14 @@ def get_one_cpu_per_socket(hw_lst):
     current_phys_package_id = -1
     cpu_list = []
     for processor_num in range(int(logical)):
-        cmdline = ("cat /sys/devices/system/cpu/cpu%d/topology"
-                   "/physical_package_id" % int(processor_num))
-        phys_cmd = subprocess.Popen(cmdline,
-                                    shell=True, stdout=subprocess.PIPE)
-        for phys_str in phys_cmd.stdout:
+        filename = ("/sys/devices/system/cpu/cpu%d/topology"
+                    "/physical_package_id" % int(processor_num))
+        try:
+            with open(filename) as phys_file:
+                phys_lines = phys_file.readlines()
+        except (IOError, OSError):
+            continue
+        for phys_str in phys_lines:
             phys_id = int(phys_str.strip())
             if phys_id > current_phys_package_id:
                 current_phys_package_id = phys_id
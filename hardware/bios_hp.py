@@ -20,15 +20,16 @@ import tempfile
 import xml.etree.ElementTree as ET
 
 from hardware.detect_utils import cmd
+from hardware import inventory
 
 
 def get_hp_conrep(hrdw):
-    for i in hrdw:
-        if i[0:3] == ('system', 'product', 'vendor'):
-            if i[3] not in ['HPE', 'HP']:
-                return True, ""
+    for i in inventory.lookup(hrdw, 'system', 'product', 'vendor'):
+        if i[3] not in ['HPE', 'HP']:
+            return True, ""
     output_file = tempfile.TemporaryFile()
-    status, output = cmd("hp-conrep --save -f {}".format(output_file))
+    status, output = cmd(['hp-conrep', '--save', '-f',
+                          '{}'.format(output_file)])
     if status != 0:
         sys.stderr.write("Unable to run hp-conrep: %s\n" % output)
         return False, ""
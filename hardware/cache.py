@@ -0,0 +1,134 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Cache the static part of the inventory until the next reboot."""
+
+import functools
+import json
+import os
+import sys
+
+from hardware import probe
+
+DEFAULT_CACHE = '/var/cache/hardware/detect.json'
+FORMAT_VERSION = 1
+
+
+def _version():
+    try:
+        from importlib import metadata
+        return metadata.version('hardware')
+    except Exception:
+        return 'unknown'
+
+
+def _listdir(path):
+    try:
+        return sorted(os.listdir(path))
+    except OSError:
+        return []
+
+
+def cache_keys(extra=()):
+    """Return the keys invalidating the cache when one of them changes.
+
+    :param extra: list of additional user-defined keys
+    """
+    try:
+        with open('/proc/sys/kernel/random/boot_id') as boot_id:
+            boot = boot_id.read().strip()
+    except IOError:
+        boot = None
+    return {'format': FORMAT_VERSION,
+            'boot_id': boot,
+            'version': _version(),
+            'block': _listdir('/sys/block'),
+            'net': _listdir('/sys/class/net'),
+            'extra': list(extra)}
+
+
+def load(filename, keys):
+    """Load the cached probe results.
+
+    :returns: dict of probe name to list of tuples, empty when the cache
+        does not exist or is invalidated by keys.
+    """
+    try:
+        with open(filename) as cache_file:
+            content = json.load(cache_file)
+    except (IOError, ValueError):
+        return {}
+    if not isinstance(content, dict) or content.get('keys') != keys:
+        sys.stderr.write('Info: cache %s is outdated\n' % filename)
+        return {}
+    return {name: [tuple(entry) for entry in entries]
+            for name, entries in content.get('probes', {}).items()}
+
+
+def save(filename, keys, probes, results, cached=None):
+    """Save the results of the static probes.
+
+    Results of volatile probes and of probes that timed out are not
+    saved.
+
+    :param probes: list of the Probe objects that produced results
+    :param results: dict of probe name to list of tuples
+    :param cached: dict of the previously cached results to keep
+    """
+    saved = dict(cached or {})
+    for entry in probes:
+        ret = results.get(entry.name)
+        if (entry.volatile or ret is None
+                or ret == probe.timeout_result(entry.name)):
+            continue
+        saved[entry.name] = ret
+    dirname = os.path.dirname(filename)
+    if dirname:
+        os.makedirs(dirname, exist_ok=True)
+    tmpname = '%s.%d' % (filename, os.getpid())
+    with open(tmpname, 'w') as cache_file:
+        json.dump({'keys': keys, 'probes': saved}, cache_file)
+    os.replace(tmpname, filename)
+
+
+def apply(probes, cached, refresh_probes=()):
+    """Replace the probes whose results are cached.
+
+    A refresh probe is added when all the probes it requires are cached.
+    The entries it collects again are removed from the cached results.
+
+    :param probes: list of Probe objects
+    :param cached: dict of probe name to list of tuples, see load()
+    :param refresh_probes: list of Probe objects collecting the volatile
+        entries of static probes
+    :returns: the list of Probe objects to run
+    """
+    names = [entry.name for entry in probes]
+    is_cached = {name: name in cached and not entry.volatile
+                 for name, entry in zip(names, probes)}
+    refreshes = [entry for entry in refresh_probes
+                 if entry.requires and all(is_cached.get(name)
+                                           for name in entry.requires)]
+    patterns = {}
+    for entry in refreshes:
+        for name in entry.requires:
+            patterns.setdefault(name, []).extend(entry.refreshes)
+
+    ret = []
+    for entry in probes:
+        if is_cached[entry.name]:
+            static = probe.strip_refreshed(cached[entry.name],
+                                           patterns.get(entry.name, []))
+            entry = probe.Probe(entry.name, functools.partial(list, static),
+                                fields=entry.fields)
+        ret.append(entry)
+    return ret + refreshes
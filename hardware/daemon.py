@@ -0,0 +1,170 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Keep the inventory up to date by sampling its volatile sources."""
+
+import functools
+import json
+import os
+import signal
+import socketserver
+import sys
+import threading
+import time
+
+from hardware import detect_utils
+from hardware import memo
+from hardware import probe
+
+DEFAULT_INTERVAL = 60
+
+
+class Collector(object):
+    """Inventory made of static results updated by sampling probes.
+
+    :param results: dict of probe name to list of tuples of the initial
+        inventory
+    :param samplers: list of Probe objects collecting volatile data. A
+        sampler replaces the results of the probe of the same name, and
+        the entries matching its refreshes patterns.
+    """
+
+    def __init__(self, results, samplers):
+        self.results = dict(results)
+        self.samples = {}
+        self.samplers = [sampler for sampler in samplers
+                         if self._can_sample(sampler)]
+        self.lock = threading.Lock()
+
+    def _can_sample(self, sampler):
+        if sampler.requires:
+            return all(name in self.results for name in sampler.requires)
+        return sampler.name in self.results
+
+    def probes(self, names):
+        """Return the Probe objects sampling again the given samplers.
+
+        The probes are bound to the initial results of their requirements.
+        """
+        ret = []
+        for sampler in self.samplers:
+            if sampler.name not in names:
+                continue
+            if sampler.requires:
+                hw_lst = []
+                for name in sampler.requires:
+                    hw_lst.extend(self.results[name])
+                sampler = probe.Probe(
+                    sampler.name, functools.partial(sampler.resolve(), hw_lst),
+                    timeout=sampler.timeout, fields=sampler.fields)
+            ret.append(sampler)
+        return ret
+
+    def update(self, name, hw_lst):
+        with self.lock:
+            self.samples[name] = hw_lst
+
+    def inventory(self):
+        """Return the current inventory, cleaned like the detect output."""
+        with self.lock:
+            samples = dict(self.samples)
+        patterns = []
+        for sampler in self.samplers:
+            if sampler.name in samples:
+                patterns.extend(sampler.refreshes)
+        hrdw = []
+        for name, hw_lst in self.results.items():
+            if name in samples:
+                hrdw.extend(samples.pop(name))
+            else:
+                hrdw.extend(probe.strip_refreshed(hw_lst, patterns))
+        for hw_lst in samples.values():
+            hrdw.extend(hw_lst)
+        return list(filter(None, detect_utils.clean_tuples(hrdw)))
+
+
+def write_file(filename, hrdw):
+    """Atomically replace filename with the JSON inventory."""
+    tmpname = '%s.%d' % (filename, os.getpid())
+    with open(tmpname, 'w') as output:
+        json.dump(hrdw, output)
+    os.replace(tmpname, filename)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        hrdw = self.server.collector.inventory()
+        self.wfile.write(json.dumps(hrdw).encode('utf-8') + b'\n')
+
+
+def serve(collector, intervals, output=None, socket_path=None,
+          timeout=None, stop=None):
+    """Sample the volatile probes until stop is set.
+
+    The inventory is written to output after each sampling round and sent
+    as a JSON document to each client connecting to socket_path.
+
+    :param collector: Collector object
+    :param intervals: dict of sampler name to number of seconds between
+        two samples, DEFAULT_INTERVAL when missing
+    :param output: name of the file to write the inventory to
+    :param socket_path: path of the Unix socket to listen on
+    :param timeout: number of seconds each sampling probe may run
+    :param stop: threading.Event stopping the loop, SIGTERM and SIGINT
+        set it when None
+    """
+    if stop is None:
+        stop = threading.Event()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *args: stop.set())
+
+    server = None
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = socketserver.ThreadingUnixStreamServer(socket_path,
+                                                        _Handler)
+        server.daemon_threads = True
+        server.collector = collector
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    try:
+        if output:
+            write_file(output, collector.inventory())
+        now = time.monotonic()
+        next_run = {sampler.name: now + intervals.get(sampler.name,
+                                                      DEFAULT_INTERVAL)
+                    for sampler in collector.samplers}
+        while next_run and not stop.wait(max(0.0, min(next_run.values())
+                                             - time.monotonic())):
+            now = time.monotonic()
+            due = [name for name, when in next_run.items() if when <= now]
+            try:
+                # each sampling round queries the hardware again
+                with memo.run():
+                    probe.run_probes(collector.probes(due), timeout=timeout,
+                                     callback=collector.update)
+            except probe.ProbeError as excpt:
+                sys.stderr.write('Error: %s\n' % excpt)
+            for name in due:
+                next_run[name] = now + intervals.get(name, DEFAULT_INTERVAL)
+            if output:
+                write_file(output, collector.inventory())
+        if not next_run:
+            # nothing to sample, only serve the initial inventory
+            stop.wait()
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+            os.unlink(socket_path)
@@ -0,0 +1,165 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Send only the changes of an inventory since the last acknowledged one.
+
+A delta is a JSON object holding the hash of the base inventory, the hash
+of the new inventory and the operations building the new inventory from
+the base one: [start, count] copies count entries of the base inventory
+from start and a list of entries inserts them. A delta without base
+inserts the whole inventory.
+
+The agent keeps the inventories it sent in a directory named after their
+hash (see save() and load_base()), the collector keeps the inventory it
+acknowledged and calls reconstruct() on each delta it receives.
+"""
+
+import difflib
+import hashlib
+import json
+import os
+
+from hardware import inventory
+
+SUFFIX = '.json'
+
+
+class DeltaError(Exception):
+    """The delta cannot be applied to the inventory."""
+
+
+def inventory_hash(hw_lst):
+    """Return the hexadecimal sha256 of the JSON of an inventory."""
+    text = json.dumps(hw_lst, separators=(',', ':'))
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _opcodes(base, new):
+    """Return the difflib opcodes building new from base.
+
+    The common head and tail, the whole inventory in steady state, are
+    skipped before comparing the remaining entries.
+    """
+    head = 0
+    end = min(len(base), len(new))
+    while head < end and base[head] == new[head]:
+        head += 1
+    tail = 0
+    while (tail < end - head
+           and base[len(base) - tail - 1] == new[len(new) - tail - 1]):
+        tail += 1
+    ops = []
+    if head:
+        ops.append(('equal', 0, head, 0, head))
+    matcher = difflib.SequenceMatcher(None, base[head:len(base) - tail],
+                                      new[head:len(new) - tail])
+    for tag, base_start, base_end, new_start, new_end in \
+            matcher.get_opcodes():
+        ops.append((tag, base_start + head, base_end + head,
+                    new_start + head, new_end + head))
+    if tail:
+        ops.append(('equal', len(base) - tail, len(base),
+                    len(new) - tail, len(new)))
+    return ops
+
+
+def make_delta(base, new, base_hash=None):
+    """Return the delta building the new inventory from the base one.
+
+    :param base: list of (class, type, key, value) tuples acknowledged by
+        the receiver, or None to send the whole new inventory
+    :param new: list of (class, type, key, value) tuples
+    :param base_hash: inventory_hash() of base when already known
+    """
+    new = [tuple(entry) for entry in new]
+    if base is None:
+        return {'base': None, 'hash': inventory_hash(new),
+                'ops': [new] if new else []}
+    base = [tuple(entry) for entry in base]
+    ops = []
+    for tag, base_start, base_end, new_start, new_end in _opcodes(base, new):
+        if tag == 'equal':
+            ops.append([base_start, base_end - base_start])
+        elif new_start != new_end:
+            ops.append(new[new_start:new_end])
+    return {'base': base_hash or inventory_hash(base),
+            'hash': inventory_hash(new),
+            'ops': ops}
+
+
+def reconstruct(base, delta):
+    """Return the inventory sent as a delta against base.
+
+    :param base: list of (class, type, key, value) tuples, the inventory
+        of the base hash of the delta, or None for a delta without base
+    :param delta: dict returned by make_delta()
+    :raises: DeltaError when base is not the base of the delta or the
+        delta is invalid
+    """
+    if delta.get('base') is not None:
+        if base is None or inventory_hash(base) != delta['base']:
+            raise DeltaError('delta against %s, not the given inventory'
+                             % delta['base'])
+    ret = []
+    try:
+        for op in delta['ops']:
+            if len(op) == 2 and all(isinstance(val, int) for val in op):
+                start, count = op
+                if base is None or start < 0 or start + count > len(base):
+                    raise DeltaError('copy out of the base inventory: %s'
+                                     % op)
+                ret.extend(tuple(entry)
+                           for entry in base[start:start + count])
+            else:
+                ret.extend(tuple(entry) for entry in op)
+    except (KeyError, TypeError) as excpt:
+        raise DeltaError('invalid delta: %s' % excpt)
+    if inventory_hash(ret) != delta.get('hash'):
+        raise DeltaError('inventory hash mismatch, expected %s'
+                         % delta.get('hash'))
+    return ret
+
+
+def load_base(directory, acked):
+    """Return the inventory saved in directory with the hash acked.
+
+    :returns: the list of tuples, or None when the inventory is unknown
+    """
+    if not acked:
+        return None
+    try:
+        with open(os.path.join(directory, acked + SUFFIX)) as fileobj:
+            hw_lst = inventory.load(fileobj)
+    except (IOError, OSError, ValueError):
+        return None
+    if inventory_hash(hw_lst) != acked:
+        return None
+    return hw_lst
+
+
+def save(directory, hw_lst, hw_hash, keep=()):
+    """Save an inventory in directory under its hash.
+
+    The other inventories of the directory are removed, except the ones
+    with the hashes in keep.
+    """
+    os.makedirs(directory, exist_ok=True)
+    filename = os.path.join(directory, hw_hash + SUFFIX)
+    tmpname = '%s.%d' % (filename, os.getpid())
+    with open(tmpname, 'w') as fileobj:
+        json.dump(hw_lst, fileobj)
+    os.replace(tmpname, filename)
+    kept = set(name + SUFFIX for name in keep if name)
+    kept.add(hw_hash + SUFFIX)
+    for name in os.listdir(directory):
+        if name.endswith(SUFFIX) and name not in kept:
+            os.unlink(os.path.join(directory, name))
@@ -15,35 +15,184 @@
 """Main entry point for hardware and system detection routines in eDeploy."""
 
 import argparse
+import itertools
 import json
 import os
 import pprint
 import sys
+import time
 
-from hardware import areca
-from hardware.benchmark import cpu as bm_cpu
-from hardware.benchmark import disk as bm_disk
-from hardware.benchmark import mem as bm_mem
-from hardware import bios_hp
+from hardware import cache
+from hardware import daemon
+from hardware import delta
 from hardware import detect_utils
-from hardware import diskinfo
-from hardware import hpacucli
-from hardware import infiniband as ib
-from hardware import ipmi
-from hardware import megacli
-from hardware import rtc
-from hardware import sensors
-from hardware import system
+from hardware import fingerprint
+from hardware import inventory
+from hardware import memo
+from hardware import probe
+from hardware import replay
+
+
+def _probe_seconds(value):
+    """Parse a NAME=SECONDS probe timeout or interval."""
+    name, _, seconds = value.partition('=')
+    try:
+        return name, float(seconds)
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            'invalid value %r, expected NAME=SECONDS' % value)
+
+
+def write_stream(hw_lst, output=None):
+    """Write tuples as newline delimited JSON arrays."""
+    output = output or sys.stdout
+    for entry in hw_lst:
+        entry = tuple(detect_utils.clean_str(val) for val in entry)
+        if entry:
+            output.write(json.dumps(entry) + '\n')
+    output.flush()
+
+
+def _stream_probe(name, hw_lst):
+    """Write the results of a probe as soon as it finishes."""
+    write_stream(hw_lst)
 
 
 def parse_args(arguments):
     """Arguments parser."""
 
     parser = argparse.ArgumentParser()
-    parser.add_argument('-H', '--human',
+    output = parser.add_mutually_exclusive_group()
+    output.add_argument('-H', '--human',
                         help='Print output in human readable format',
                         action='store_true',
                         default=False)
+    output.add_argument('--stream',
+                        help=('Print one JSON array per line as soon as '
+                              'each probe completes'),
+                        action='store_true',
+                        default=False)
+    selection = parser.add_mutually_exclusive_group()
+    selection.add_argument('--only',
+                           choices=probe.PROBE_NAMES,
+                           nargs='+',
+                           metavar='PROBE',
+                           help=('Run only these probes and the probes they '
+                                 'require. Valid probes are: %s'
+                                 % ', '.join(probe.PROBE_NAMES)))
+    selection.add_argument('--skip',
+                           choices=probe.PROBE_NAMES,
+                           nargs='+',
+                           metavar='PROBE',
+                           help='Do not run these probes')
+    parser.add_argument('-j', '--jobs',
+                        help=('Number of probes to run in parallel '
+                              '(default: %(default)s)'),
+                        type=int,
+                        default=probe.DEFAULT_JOBS)
+    parser.add_argument('--timeout',
+                        help=('Maximum number of seconds each probe may '
+                              'run before being reported as timed out'),
+                        type=float)
+    parser.add_argument('--probe-timeout',
+                        help=('Maximum number of seconds a given probe may '
+                              'run, e.g. ipmi_sdr=30. Can be repeated'),
+                        metavar='NAME=SECONDS',
+                        type=_probe_seconds,
+                        action='append',
+                        default=[])
+    parser.add_argument('--time-budget',
+                        help=('Maximum number of seconds all the probes may '
+                              'run'),
+                        type=float)
+
+    caching = parser.add_argument_group('cache')
+    caching.add_argument('--cache',
+                         help=('Reuse the static part of the inventory '
+                               'stored in this file until the next reboot, '
+                               'only volatile data is collected again '
+                               '(default: %s)' % cache.DEFAULT_CACHE),
+                         metavar='FILE',
+                         nargs='?',
+                         const=cache.DEFAULT_CACHE)
+    caching.add_argument('--cache-key',
+                         help=('Invalidate the cache when this value '
+                               'changes. Can be repeated'),
+                         metavar='VALUE',
+                         action='append',
+                         default=[])
+
+    archive = parser.add_mutually_exclusive_group()
+    archive.add_argument('--record',
+                         help=('Save the output of the commands and the '
+                               'files read by the probes to this directory'),
+                         metavar='DIR')
+    archive.add_argument('--replay',
+                         help=('Run the probes against the commands and '
+                               'files saved in this directory by --record '
+                               'instead of the hardware'),
+                         metavar='DIR')
+
+    parser.add_argument('--fingerprint',
+                        help=('Write the hash of the hardware model instead '
+                              'of the inventory: CPU, memory banks, disks, '
+                              'NICs and controllers without their serial '
+                              'numbers'),
+                        action='store_true',
+                        default=False)
+
+    delta_group = parser.add_argument_group('delta')
+    delta_group.add_argument('--delta',
+                             help=('Write only the changes since the '
+                                   'inventory acknowledged with --delta-ack '
+                                   'and keep the inventories sent in this '
+                                   'directory'),
+                             metavar='DIR')
+    delta_group.add_argument('--delta-ack',
+                             help=('Hash of the last inventory received by '
+                                   'the collector. The whole inventory is '
+                                   'written when it is unknown'),
+                             metavar='HASH')
+
+    daemon_group = parser.add_argument_group('daemon')
+    daemon_group.add_argument('--daemon',
+                              help=('Keep running after the detection and '
+                                    'sample again the volatile sources: %s'
+                                    % ', '.join(probe.SAMPLER_NAMES)),
+                              action='store_true',
+                              default=False)
+    daemon_group.add_argument('--interval',
+                              help=('Number of seconds between two samples '
+                                    '(default: %(default)s)'),
+                              type=float,
+                              default=daemon.DEFAULT_INTERVAL)
+    daemon_group.add_argument('--sample-interval',
+                              help=('Number of seconds between two samples '
+                                    'of a given source, e.g. ipmi_sdr=300. '
+                                    'Can be repeated'),
+                              metavar='NAME=SECONDS',
+                              type=_probe_seconds,
+                              action='append',
+                              default=[])
+    daemon_group.add_argument('--output',
+                              help=('File the daemon writes the inventory to '
+                                    'after each sample'),
+                              metavar='FILE')
+    daemon_group.add_argument('--socket',
+                              help=('Unix socket sending the inventory to '
+                                    'each client connecting to it'),
+                              metavar='PATH')
+
+    timing = parser.add_argument_group('timing')
+    timing.add_argument('--timing',
+                        help=("Report the wall time of each probe as "
+                              "('hw', 'timing', <probe>, <ms>) entries"),
+                        action='store_true',
+                        default=False)
+    timing.add_argument('--timing-report',
+                        help=('Write wall time, CPU time, subprocesses and '
+                              'bytes parsed by each probe to this JSON file'),
+                        metavar='FILE')
 
     benchmark = parser.add_argument_group('benchmark')
     benchmark.add_argument('--benchmark', '-b',
@@ -57,7 +206,31 @@ def parse_args(arguments):
                            action='store_true',
                            default=False)
 
-    return parser.parse_args(arguments)
+    args = parser.parse_args(arguments)
+    if args.daemon and not (args.output or args.socket):
+        parser.error('--daemon requires --output or --socket')
+    if args.daemon and (args.stream or args.human):
+        parser.error('--daemon cannot be used with --stream or --human')
+    if args.daemon and (args.record or args.replay):
+        parser.error('--daemon cannot be used with --record or --replay')
+    if args.delta and (args.stream or args.human or args.daemon):
+        parser.error('--delta cannot be used with --stream, --human or '
+                     '--daemon')
+    if args.fingerprint and (args.stream or args.human or args.daemon
+                             or args.delta):
+        parser.error('--fingerprint cannot be used with --stream, --human, '
+                     '--daemon or --delta')
+    if args.delta_ack and not args.delta:
+        parser.error('--delta-ack requires --delta')
+    unknown = set(dict(args.probe_timeout)) - set(probe.PROBE_NAMES)
+    if unknown:
+        parser.error('unknown probes in --probe-timeout: %s' %
+                     ', '.join(sorted(unknown)))
+    unknown = set(dict(args.sample_interval)) - set(probe.SAMPLER_NAMES)
+    if unknown:
+        parser.error('unknown sources in --sample-interval: %s' %
+                     ', '.join(sorted(unknown)))
+    return args
 
 
 def main():
@@ -66,41 +239,122 @@ def main():
     os.environ["LANG"] = "en_US.UTF-8"
     args = parse_args(sys.argv[1:])
 
-    hrdw = []
+    stats = {}
+    cached = {}
+    callback = _stream_probe if args.stream else None
 
-    hrdw.extend(areca.detect())
-    hrdw.extend(hpacucli.detect())
-    hrdw.extend(megacli.detect())
-    hrdw.extend(diskinfo.detect())
+    start = time.monotonic()
+    try:
+        memo.start()
+        if args.record:
+            replay.start(args.record, replay.RECORD)
+        elif args.replay:
+            replay.start(args.replay, replay.REPLAY)
+        probes = selected = probe.select(probe.PROBES, only=args.only,
+                                         skip=args.skip)
+        if args.cache:
+            keys = cache.cache_keys(args.cache_key)
+            cached = cache.load(args.cache, keys)
+            probes = cache.apply(selected, cached, probe.REFRESH_PROBES)
+        # the timeouts of the probes not selected or cached are ignored
+        names = set(entry.name for entry in probes)
+        timeouts = {name: seconds for name, seconds in args.probe_timeout
+                    if name in names}
+        # the streamed results are only kept when they are used later
+        if args.benchmark:
+            keep = names
+        else:
+            keep = set(['system'])
+            if args.cache:
+                keep.update(entry.name for entry in probes
+                            if not entry.volatile)
+        results = probe.run_probes(probes, jobs=args.jobs,
+                                   timeout=args.timeout,
+                                   timeouts=timeouts,
+                                   time_budget=args.time_budget,
+                                   stats=stats,
+                                   callback=callback,
+                                   keep=keep)
+    except (probe.ProbeError, replay.ReplayError) as excpt:
+        sys.stderr.write('Error: %s\n' % excpt)
+        sys.exit(1)
+    finally:
+        replay.stop()
+        memo.stop()
+    wall = time.monotonic() - start
+
+    if args.cache and any(entry.name not in cached for entry in selected
+                          if not entry.volatile):
+        try:
+            fresh = {name: ret for name, ret in results.items()
+                     if name not in cached}
+            cache.save(args.cache, keys, selected, fresh, cached)
+        except (IOError, OSError) as excpt:
+            sys.stderr.write('Info: unable to save cache: %s\n' % excpt)
+
+    if args.timing_report:
+        with open(args.timing_report, 'w') as report:
+            json.dump(probe.timing_report(stats, wall), report, indent=2)
 
-    system_info = system.detect()
-    if not system_info:
+    if 'system' in results and not results['system']:
         sys.exit(1)
-    hrdw.extend(system_info)
 
-    hrdw.extend(ipmi.detect())
-    hrdw.extend(ib.detect())
-    hrdw.extend(sensors.detect_temperatures())
-    hrdw.extend(ipmi.get_ipmi_sdr())
-    hrdw.extend(rtc.detect_rtc_clock())
-    hrdw.extend(detect_utils.detect_auxv())
-    hrdw.extend(detect_utils.parse_dmesg())
-    hrdw.extend(bios_hp.dump_hp_bios(hrdw))
+    hrdw = []
+    if not args.stream or args.benchmark:
+        hrdw = inventory.Inventory(
+            itertools.chain.from_iterable(results.values()))
+    # the probes results have already been streamed or are kept by the
+    # daemon
+    streamed = len(hrdw) if args.stream or args.daemon else 0
+    if args.timing:
+        hrdw.extend(probe.timing_result(stats))
 
     if args.benchmark:
         if 'cpu' in args.benchmark:
+            from hardware.benchmark import cpu as bm_cpu
             bm_cpu.cpu_perf(hrdw)
         if 'mem' in args.benchmark:
+            from hardware.benchmark import mem as bm_mem
             bm_mem.mem_perf(hrdw)
         if 'disk' in args.benchmark:
+            from hardware.benchmark import disk as bm_disk
             bm_disk.disk_perf(hrdw,
                               destructive=args.benchmark_disk_destructive)
 
+    if args.stream:
+        write_stream(hrdw[streamed:])
+        return
+
+    if args.daemon:
+        results = dict(results)
+        results['extra'] = hrdw[streamed:]
+        intervals = dict.fromkeys(probe.SAMPLER_NAMES, args.interval)
+        intervals.update(args.sample_interval)
+        daemon.serve(daemon.Collector(results, probe.SAMPLERS), intervals,
+                     output=args.output, socket_path=args.socket,
+                     timeout=args.timeout)
+        return
+
     hrdw = detect_utils.clean_tuples(hrdw)
 
     hrdw = list(filter(None, hrdw))
 
-    if args.human:
+    if args.fingerprint:
+        print(fingerprint.fingerprint(hrdw))
+    elif args.delta:
+        base = delta.load_base(args.delta, args.delta_ack)
+        result = delta.make_delta(base, hrdw,
+                                  args.delta_ack if base is not None
+                                  else None)
+        try:
+            delta.save(args.delta, hrdw, result['hash'],
+                       keep=[args.delta_ack])
+        except (IOError, OSError) as excpt:
+            sys.stderr.write('Error: unable to save the inventory: %s\n'
+                             % excpt)
+            sys.exit(1)
+        print(json.dumps(result))
+    elif args.human:
         pprint.pprint(hrdw)
     else:
         print(json.dumps(hrdw))
@@ -15,11 +15,14 @@
 import contextlib
 import os
 import re
-import subprocess
-from subprocess import Popen
 import sys
 import uuid
 
+from hardware import inventory
+from hardware import memo
+from hardware import replay
+from hardware import runner
+
 
 AUXV_FLAGS = ["AT_HWCAP", "AT_HWCAP2", "AT_PAGESZ",
               "AT_FLAGS", "AT_PLATFORM"]
@@ -27,21 +30,19 @@ AUXV_FLAGS = ["AT_HWCAP", "AT_HWCAP2", "AT_PAGESZ",
 AUXV_OPT_FLAGS = ["AT_BASE_PLATFORM"]
 
 
-def cmd(cmdline):
-    """Equivalent of commands.getstatusoutput"""
-    try:
-        return 0, subprocess.check_output(cmdline,
-                                          shell=True, universal_newlines=True)
-    except subprocess.CalledProcessError as excpt:
-        return excpt.returncode, excpt.output
+def cmd(cmdline, env=None, cached=False):
+    """Equivalent of commands.getstatusoutput
+
+    :param cmdline: list of arguments, executed without a shell
+    :param cached: True to run the command once per run, see runner.run()
+    """
+    result = runner.run(cmdline, env=env, cached=cached)
+    return result.returncode, result.text
 
 
-def output_lines(cmdline):
-    """Run a shell command and returns the output as lines."""
-    proc = subprocess.Popen(cmdline, shell=True, stdout=subprocess.PIPE,
-                            universal_newlines=True)
-    stdout = proc.communicate()[0]
-    return stdout.splitlines()
+def output_lines(cmdline, env=None, cached=False):
+    """Run a command and returns the output as lines, see cmd()."""
+    return runner.run(cmdline, env=env, cached=cached).lines()
 
 
 def parse_lldtool(hw_lst, interface_name, lines):
@@ -84,7 +85,8 @@ def parse_lldtool(hw_lst, interface_name, lines):
 
 def get_lld_status(hw_lst, interface_name):
     return parse_lldtool(hw_lst, interface_name,
-                         output_lines("lldptool -t -n -i %s" % interface_name))
+                         output_lines(['lldptool', '-t', '-n', '-i',
+                                       interface_name], cached=True))
 
 
 def parse_ethtool(hw_lst, interface_name, lines):
@@ -115,12 +117,42 @@ def parse_ethtool(hw_lst, interface_name, lines):
 
 def get_ethtool_status(hw_lst, interface_name):
     parse_ethtool(hw_lst, interface_name,
-                  output_lines("ethtool -a %s" % interface_name))
+                  output_lines(['ethtool', '-a', interface_name],
+                               cached=True))
     parse_ethtool(hw_lst, interface_name,
-                  output_lines("ethtool -k %s" % interface_name))
+                  output_lines(['ethtool', '-k', interface_name],
+                               cached=True))
+
+
+def get_network_status(interface_names):
+    """Run ethtool and lldptool on network interfaces concurrently.
+
+    :param interface_names: list of network interface names
+    :returns: list of the hw lists of the interfaces, ordered like
+        interface_names
+    """
+    cmdlines = []
+    for name in interface_names:
+        cmdlines.extend([['ethtool', '-a', name],
+                         ['ethtool', '-k', name],
+                         ['lldptool', '-t', '-n', '-i', name]])
+    results = iter(runner.run_many(cmdlines, cached=True))
+    ret = []
+    for name in interface_names:
+        hw_lst = []
+        parse_ethtool(hw_lst, name, next(results).lines())
+        parse_ethtool(hw_lst, name, next(results).lines())
+        parse_lldtool(hw_lst, name, next(results).lines())
+        ret.append(hw_lst)
+    return ret
 
 
 def which(program):
+    return memo.call('which', program, replay.call, 'which', program,
+                     _which, program)
+
+
+def _which(program):
     def is_exe(fpath):
         return os.path.isfile(fpath) and os.access(fpath, os.X_OK)
 
@@ -169,11 +201,11 @@ def clean_tuples(lst):
 def _get_uuid_x86_64():
     """Get uuid from dmidecode"""
 
-    uuid_cmd = subprocess.Popen(
-        "dmidecode -t 1 | grep UUID | awk '{print $2}'", shell=True,
-        stdout=subprocess.PIPE, universal_newlines=True)
-    stdout = uuid_cmd.communicate()[0]
-    return stdout.rstrip()
+    for line in output_lines(['dmidecode', '-t', '1']):
+        if 'UUID' in line:
+            fields = line.split()
+            return fields[1] if len(fields) > 1 else ''
+    return ''
 
 
 def _get_uuid_ppc64le(hw_lst):
@@ -188,8 +220,9 @@ def _get_uuid_ppc64le(hw_lst):
 
     system_uuid = None
     system_uuid_fname = '/sys/firmware/devicetree/base/system-uuid'
-    if os.access(system_uuid_fname, os.R_OK):
-        with open(system_uuid_fname) as uuidfile:
+    if replay.call('access', system_uuid_fname, os.access,
+                   system_uuid_fname, os.R_OK):
+        with replay.open(system_uuid_fname) as uuidfile:
             system_uuid = uuidfile.read().rstrip(' \t\r\n\0')
     elif vendor and serial:
         root = uuid.UUID(bytes=b'\x00' * 16)
@@ -200,12 +233,14 @@ def _get_uuid_ppc64le(hw_lst):
 
 
 def get_uuid(hw_lst):
-    if os.uname()[4] == 'ppc64le':
+    if replay.call('uname', 'machine', lambda: os.uname()[4]) == 'ppc64le':
         return _get_uuid_ppc64le(hw_lst)
     return _get_uuid_x86_64()
 
 
 def get_value(hw_lst, *vect):
+    if isinstance(hw_lst, inventory.Inventory):
+        return hw_lst.get(*vect, default='')
     for i in hw_lst:
         if i[0:3] == vect:
             return i[3]
@@ -228,7 +263,7 @@ def from_file(filename):
     :raises: IOError
     """
 
-    with open(filename) as f:
+    with replay.open(filename) as f:
         value = f.readline().rstrip('\n')
     return value
 
@@ -246,28 +281,24 @@ def fix_bad_serial(hw_lst, system_uuid, mobo_id, nic_id):
     :param mobo_id: motherboard id
     :param nic_id: NIC id
     """
-    for i in hw_lst:
-        if i[0:3] == ('system', 'product', 'serial'):
-            # Does the current serial number is part of the quirk list
-            if i[3] in ['0123456789', '0000000000']:
-
-                # Let's delete the stupid SN and use the another ID instead
-                # Items are ordered by level of confidence
-                new_serial = ''
+    serials = inventory.lookup(hw_lst, 'system', 'product', 'serial')
+    # Does the current serial number is part of the quirk list
+    if serials and serials[0][3] in ['0123456789', '0000000000']:
 
-                if system_uuid:
-                    new_serial = system_uuid
-                elif mobo_id:
-                    new_serial = mobo_id
-                elif nic_id:
-                    new_serial = nic_id
+        # Let's delete the stupid SN and use the another ID instead
+        # Items are ordered by level of confidence
+        new_serial = ''
 
-                if new_serial:
-                    hw_lst.remove(i)
-                    hw_lst.append(('system', 'product', 'serial',
-                                   new_serial))
+        if system_uuid:
+            new_serial = system_uuid
+        elif mobo_id:
+            new_serial = mobo_id
+        elif nic_id:
+            new_serial = nic_id
 
-                break
+        if new_serial:
+            hw_lst.remove(serials[0])
+            hw_lst.append(('system', 'product', 'serial', new_serial))
 
 
 def get_cpus(hw_lst):
@@ -301,7 +332,8 @@ def get_cpus(hw_lst):
 
     # Extracting lspcu information
     lscpu = {}
-    output = output_lines('LANG=en_US.UTF-8 lscpu')
+    lscpu_env = dict(os.environ, LANG='en_US.UTF-8')
+    output = output_lines(['lscpu'], env=lscpu_env, cached=True)
 
     for line in output:
         if ':' in line:
@@ -311,7 +343,8 @@ def get_cpus(hw_lst):
     # Extracting lspcu -x information
     # Use hexadecimal masks for CPU sets
     lscpux = {}
-    output = output_lines('LANG=en_US.UTF-8 lscpu -x')
+    output = output_lines(['lscpu', '-x'], env=lscpu_env,
+                          cached=True)
 
     for line in output:
         if ':' in line:
@@ -417,7 +450,7 @@ def get_cpus(hw_lst):
 
 def modprobe(module):
     """Load a kernel module using modprobe."""
-    status, _ = cmd('modprobe %s' % module)
+    status, _ = cmd(['modprobe', module])
     if status == 0:
         sys.stderr.write('Info: Probing %s failed\n' % module)
 
@@ -427,15 +460,14 @@ def detect_auxv():
     new_env = os.environ.copy()
     new_env["LD_SHOW_AUXV"] = "1"
 
-    auxv_cmd = Popen("/bin/true", env=new_env, stdout=subprocess.PIPE)
-    stdout, err = auxv_cmd.communicate()
-    if err is not None:
+    result = runner.run(['/bin/true'], env=new_env)
+    if result.returncode != 0:
         sys.stderr.write("Info: AUXV output received\n")
         return
 
     auxv = dict()
     supported_flags = AUXV_FLAGS + AUXV_OPT_FLAGS
-    for line in stdout.decode("utf-8").splitlines():
+    for line in result.lines():
         k, v = [i.strip() for i in line.split(":")]
         if k in supported_flags:
             auxv[k[3:].lower()] = v
@@ -462,7 +494,7 @@ def parse_dmesg():
     """Run dmesg and parse the output."""
     ahci_output = []
 
-    _, output = cmd("dmesg")
+    _, output = cmd(['dmesg'])
     for line in output.split('\n'):
         words = line.strip().split(" ")
 
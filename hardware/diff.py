@@ -0,0 +1,215 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Compare the inventories of two detection runs."""
+
+import argparse
+import collections
+import fnmatch
+import json
+import re
+import sys
+
+from hardware import inventory
+from hardware import probe
+
+# (class, type, key) patterns of the entries changing without any change
+# of the hardware, declared by the probes of hardware-detect.
+VOLATILE = probe.VOLATILE
+
+
+class _Patterns(object):
+    """(class, type, key) shell-style patterns indexed by class."""
+
+    def __init__(self, patterns):
+        self.by_class = collections.defaultdict(list)
+        self.wildcards = []
+        for pattern in patterns:
+            regexps = tuple(re.compile(fnmatch.translate(part))
+                            for part in pattern[1:3])
+            if any(char in pattern[0] for char in '*?['):
+                self.wildcards.append(
+                    (re.compile(fnmatch.translate(pattern[0])), regexps))
+            else:
+                self.by_class[pattern[0]].append(regexps)
+
+    def match(self, entry):
+        candidates = self.by_class.get(entry[0], [])
+        candidates = candidates + [
+            regexps for cls_regexp, regexps in self.wildcards
+            if cls_regexp.match(str(entry[0]))]
+        return any(all(regexp.match(str(part))
+                       for regexp, part in zip(regexps, entry[1:3]))
+                   for regexps in candidates)
+
+
+def _index(hw_lst, ignore):
+    """Return a dict of (class, type, key) to the list of values."""
+    index = collections.defaultdict(list)
+    for entry in hw_lst:
+        entry = tuple(entry)
+        if not entry or (ignore is not None and ignore.match(entry)):
+            continue
+        index[entry[0:3]].append(entry[3])
+    return index
+
+
+def _missing(values, others):
+    """Return the values not in others, counting the duplicates."""
+    remaining = collections.Counter(others)
+    ret = []
+    for value in values:
+        if remaining[value] > 0:
+            remaining[value] -= 1
+        else:
+            ret.append(value)
+    return ret
+
+
+def diff(old, new, ignore_volatile=False, ignore=()):
+    """Compare two inventories.
+
+    Values are compared for each (class, type, key). A key found several
+    times is compared as a multiset of values.
+
+    :param old: list of (class, type, key, value) tuples
+    :param new: list of (class, type, key, value) tuples
+    :param ignore_volatile: True to ignore the entries matching VOLATILE
+    :param ignore: additional (class, type, key) shell-style patterns of
+        the entries to ignore
+    :returns: dict of (class, type) to a dict with the 'added' and
+        'removed' lists of (key, value) and the 'changed' list of (key,
+        old value, new value), sorted by class and type. Only the
+        (class, type) with differences are present.
+    """
+    patterns = list(ignore)
+    if ignore_volatile:
+        patterns.extend(VOLATILE)
+    matcher = _Patterns(patterns) if patterns else None
+    old_index = _index(old, matcher)
+    new_index = _index(new, matcher)
+
+    ret = {}
+
+    def _group(name):
+        group = ret.get(name[0:2])
+        if group is None:
+            group = ret[name[0:2]] = {'added': [], 'removed': [],
+                                      'changed': []}
+        return group
+
+    for name, old_values in old_index.items():
+        new_values = new_index.get(name, [])
+        if old_values == new_values:
+            continue
+        if len(old_values) == 1 and len(new_values) == 1:
+            _group(name)['changed'].append((name[2], old_values[0],
+                                            new_values[0]))
+            continue
+        removed = _missing(old_values, new_values)
+        added = _missing(new_values, old_values)
+        if not removed and not added:
+            continue
+        group = _group(name)
+        count = min(len(removed), len(added))
+        group['changed'].extend((name[2], old_value, new_value)
+                                for old_value, new_value
+                                in zip(removed[:count], added[:count]))
+        group['removed'].extend((name[2], value) for value in removed[count:])
+        group['added'].extend((name[2], value) for value in added[count:])
+    for name, new_values in new_index.items():
+        if name not in old_index:
+            _group(name)['added'].extend((name[2], value)
+                                         for value in new_values)
+    return dict(sorted(ret.items(), key=lambda item: tuple(map(str,
+                                                               item[0]))))
+
+
+def format_diff(result):
+    """Return the text report of a diff() result."""
+    lines = []
+    for (cls, type_), group in result.items():
+        lines.append('%s/%s' % (cls, type_))
+        for key, value in group['removed']:
+            lines.append('  - %s: %s' % (key, value))
+        for key, value in group['added']:
+            lines.append('  + %s: %s' % (key, value))
+        for key, old_value, new_value in group['changed']:
+            lines.append('  ~ %s: %s -> %s' % (key, old_value, new_value))
+    return '\n'.join(lines)
+
+
+def _to_json(result):
+    return [{'class': cls, 'type': type_,
+             'added': group['added'],
+             'removed': group['removed'],
+             'changed': group['changed']}
+            for (cls, type_), group in result.items()]
+
+
+def parse_args(arguments):
+    """Parse the arguments of hardware-diff."""
+    parser = argparse.ArgumentParser(
+        description='Compare two inventories written by hardware-detect')
+    parser.add_argument('old', help='JSON inventory of the first run')
+    parser.add_argument('new', help='JSON inventory of the second run')
+    parser.add_argument('--ignore-volatile',
+                        help=('Ignore the entries changing without any '
+                              'hardware change: temperatures, SMART '
+                              'counters, link states...'),
+                        action='store_true',
+                        default=False)
+    parser.add_argument('--ignore',
+                        help=('Ignore the entries matching this '
+                              'CLASS/TYPE/KEY shell-style pattern, may be '
+                              'repeated'),
+                        action='append',
+                        default=[],
+                        metavar='CLASS/TYPE/KEY')
+    parser.add_argument('--json',
+                        help='Write the differences as JSON',
+                        action='store_true',
+                        default=False)
+    args = parser.parse_args(arguments)
+    patterns = []
+    for pattern in args.ignore:
+        parts = pattern.split('/', 2)
+        if len(parts) != 3:
+            parser.error('invalid --ignore pattern %s' % pattern)
+        patterns.append(tuple(parts))
+    args.ignore = patterns
+    return args
+
+
+def main():
+    """Command line entry point.
+
+    Exits with 0 when the inventories are the same, 1 when they differ.
+    """
+    args = parse_args(sys.argv[1:])
+    hw_lsts = []
+    for filename in (args.old, args.new):
+        try:
+            with open(filename) as fileobj:
+                hw_lsts.append(inventory.load(fileobj))
+        except (IOError, ValueError) as excpt:
+            sys.stderr.write('Error: cannot load %s: %s\n'
+                             % (filename, excpt))
+            sys.exit(2)
+    result = diff(hw_lsts[0], hw_lsts[1],
+                  ignore_volatile=args.ignore_volatile, ignore=args.ignore)
+    if args.json:
+        json.dump(_to_json(result), sys.stdout, indent=1)
+        sys.stdout.write('\n')
+    elif result:
+        print(format_diff(result))
+    sys.exit(1 if result else 0)
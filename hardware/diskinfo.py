@@ -12,11 +12,14 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
-import os
+import asyncio
+import functools
 import re
 import sys
 
 from hardware import detect_utils
+from hardware import replay
+from hardware import runner
 from hardware import smart_utils
 
 
@@ -25,13 +28,14 @@ def sizeingb(size):
 
 
 def disksize(name):
-    size = open('/sys/block/' + name + '/size').read(-1)
+    with replay.open('/sys/block/' + name + '/size') as size_file:
+        size = size_file.read(-1)
     return sizeingb(int(size))
 
 
 def disknames():
     names = []
-    for name in os.listdir('/sys/block'):
+    for name in replay.listdir('/sys/block'):
         if (name[1] == 'd' and name[0] in 'shv') or name.startswith('nvme'):
             names.append(name)
     return names
@@ -45,13 +49,13 @@ def get_disk_info(name, sizes, hw_lst):
     for info in info_list:
         disk_sys_info = '/sys/block/%s/%s' % (name, info)
         # revision can be explicitly named
-        if not os.path.exists(disk_sys_info) and info == 'device/rev':
+        if not replay.exists(disk_sys_info) and info == 'device/rev':
             info = 'device/revision'
         # for nvme devices we can have a nested device dir
-        if not os.path.exists(disk_sys_info):
+        if not replay.exists(disk_sys_info):
             disk_sys_info = '/sys/block/%s/device/%s' % (name, info)
         try:
-            with open(disk_sys_info, 'r') as dev:
+            with replay.open(disk_sys_info) as dev:
                 hw_lst.append(('disk', name, info.split('/')[1],
                                dev.readline().rstrip('\n').strip()))
         except Exception as exc:
@@ -59,7 +63,7 @@ def get_disk_info(name, sizes, hw_lst):
                 'Failed retrieving disk information %s for %s: %s\n' % (
                     info, name, str(exc)))
     try:
-        with open('/sys/block/%s/queue/scheduler' % name, 'r') as dev:
+        with replay.open('/sys/block/%s/queue/scheduler' % name) as dev:
             s_line = dev.readline().rstrip('\n').strip()
             sched = re.findall(r'\[(.*?)\]', s_line)
             if sched:
@@ -75,11 +79,11 @@ def get_disk_cache(name, hw_lst):
     device_path = '/sys/block/{0}/device'.format(name)
 
     try:
-        _link_info = os.readlink(device_path)
+        _link_info = replay.readlink(device_path)
         _scsi_addr = _link_info.rsplit('/', 1)[1]
         device_path = (device_path + '/scsi_disk/{0}/cache_type').format(
             _scsi_addr)
-        with open(device_path, 'r') as cache_info:
+        with replay.open(device_path) as cache_info:
             my_text = cache_info.readline().rstrip('\n').strip()
             _wce = '1'
             _rcd = '0'
@@ -100,9 +104,9 @@ def get_disk_cache(name, hw_lst):
 
 def get_disk_id(name, hw_lst):
     # In some VMs, the disk-by id doesn't exists
-    if os.path.exists('/dev/disk/by-id/'):
-        for entry in os.listdir('/dev/disk/by-id/'):
-            idp = os.path.realpath('/dev/disk/by-id/' + entry).split('/')
+    if replay.exists('/dev/disk/by-id/'):
+        for entry in replay.listdir('/dev/disk/by-id/'):
+            idp = replay.realpath('/dev/disk/by-id/' + entry).split('/')
             if idp[-1] == name:
                 id_name = "id"
                 if entry.startswith('wwn'):
@@ -125,13 +129,44 @@ def parse_hdparm_output(output):
 
 def diskperfs(names):
     return dict((name, parse_hdparm_output(
-        detect_utils.cmd('hdparm -t /dev/%s' % name))) for name in names)
+        detect_utils.cmd(['hdparm', '-t', '/dev/%s' % name])))
+        for name in names)
 
 
 def disksizes(names):
     return dict((name, disksize(name)) for name in names)
 
 
+async def get_disk_smart_async(name, hw_lst, limit=None):
+    # smartctl support
+    # run only if smartctl command is there
+    if detect_utils.which("smartctl"):
+        if name.startswith('nvme'):
+            sys.stderr.write('Reading SMART for nvme\n')
+            await smart_utils.read_smart_nvme_async(hw_lst, name, limit)
+        else:
+            await smart_utils.read_smart_async(hw_lst, "/dev/%s" % name,
+                                               limit=limit)
+    else:
+        sys.stderr.write("Cannot find smartctl, exiting\n")
+
+
+def get_disk_smart(name, hw_lst):
+    asyncio.run(get_disk_smart_async(name, hw_lst))
+
+
+def get_disks_smart(names):
+    """Read the S.M.A.R.T information of disks concurrently.
+
+    :returns: list of the hw lists of the disks, ordered like names
+    """
+    hw_lsts = [[] for _ in names]
+    asyncio.run(runner.gather(
+        [functools.partial(get_disk_smart_async, name, hw_lst)
+         for name, hw_lst in zip(names, hw_lsts)]))
+    return hw_lsts
+
+
 def detect():
     """Detect disks."""
 
@@ -140,7 +175,10 @@ def detect():
     sizes = disksizes(names)
     disks = [name for name, size in sizes.items() if size > 0]
     hw_lst.append(('disk', 'logical', 'count', str(len(disks))))
-    for name in disks:
+    # smartctl runs concurrently for all the disks, its results are
+    # inserted after the data of each disk.
+    smart_lsts = get_disks_smart(disks)
+    for name, smart_lst in zip(disks, smart_lsts):
         get_disk_info(name, sizes, hw_lst)
 
         # nvme devices do not need standard cache mechanisms
@@ -149,15 +187,37 @@ def detect():
 
         get_disk_id(name, hw_lst)
 
-        # smartctl support
-        # run only if smartctl command is there
-        if detect_utils.which("smartctl"):
-            if name.startswith('nvme'):
-                sys.stderr.write('Reading SMART for nvme\n')
-                smart_utils.read_smart_nvme(hw_lst, name)
-            else:
-                smart_utils.read_smart(hw_lst, "/dev/%s" % name)
-        else:
-            sys.stderr.write("Cannot find smartctl, exiting\n")
+        hw_lst.extend(smart_lst)
 
     return hw_lst
+
+
+def detect_disk_states(disk_lst):
+    """Read the state of the disks found by detect() from sysfs.
+
+    :param disk_lst: the output of detect()
+    """
+    hw_lst = []
+    for entry in disk_lst:
+        if entry[0] == 'disk' and entry[2] == 'size':
+            try:
+                state = detect_utils.from_file(
+                    '/sys/block/%s/device/state' % entry[1])
+            except IOError:
+                # nvme and virtual disks do not report any state
+                continue
+            hw_lst.append(('disk', entry[1], 'state', state))
+    return hw_lst
+
+
+def detect_smart(disk_lst):
+    """Read again the S.M.A.R.T information of the disks found by detect().
+
+    :param disk_lst: the output of detect()
+    """
+    names = [entry[1] for entry in disk_lst
+             if entry[0] == 'disk' and entry[2] == 'size']
+    hw_lst = []
+    for smart_lst in get_disks_smart(names):
+        hw_lst.extend(smart_lst)
+    return hw_lst
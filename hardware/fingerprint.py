@@ -0,0 +1,92 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Hash of the hardware model of a host.
+
+The fingerprint only covers the entries describing the hardware model:
+CPU models and counts, memory banks, disk models and sizes, NIC models
+and storage controllers. Serial numbers, MAC addresses, temperatures and
+the other per-unit or volatile values are left out, so hosts built the
+same way get the same fingerprint.
+
+The names of the devices (sda, eth0, physical_0...) are left out too:
+the devices of a class are compared as a sorted list of their values.
+"""
+
+import collections
+import fnmatch
+import hashlib
+import json
+import re
+
+# (class, type, keys) of the entries of the fingerprint, with a
+# shell-style pattern in type. The values of the keys of each matching
+# type make a device of the fingerprint.
+IDENTITY = [
+    ('system', 'product', ('vendor', 'name')),
+    ('system', 'motherboard', ('vendor', 'name')),
+    ('cpu', 'physical', ('number',)),
+    ('cpu', 'logical', ('number',)),
+    ('cpu', 'physical_*', ('vendor', 'product', 'cores', 'threads')),
+    ('memory', 'total', ('size',)),
+    ('memory', 'bank:*', ('slot', 'size', 'description')),
+    ('disk', '*', ('vendor', 'model', 'size')),
+    ('network', '*', ('vendor', 'product')),
+    ('infiniband', 'card*', ('card_type', 'device_type', 'nb_ports')),
+    ('megaraid', 'Controller_*', ('ProductName',)),
+    ('hpa', 'slot_*', ('model', 'bus_interface', 'number_of_ports')),
+    ('areca', 'system', ('ControllerName',)),
+]
+
+
+def compile_rules(rules):
+    """Index the rules by class."""
+    by_class = collections.defaultdict(list)
+    for idx, (cls, type_, keys) in enumerate(rules):
+        by_class[cls].append((idx, re.compile(fnmatch.translate(type_)),
+                              frozenset(keys)))
+    return by_class
+
+
+def identity(hw_lst, rules=None):
+    """Return the canonical description of the hardware model of hw_lst.
+
+    :param hw_lst: list of (class, type, key, value) tuples
+    :param rules: list of (class, type, keys) tuples, IDENTITY when None
+    :returns: list of [class, type, devices] lists, devices being the
+        sorted list of the sorted [key, value] lists of each matching type
+    """
+    if rules is None:
+        rules = IDENTITY
+    by_class = compile_rules(rules)
+    devices = collections.defaultdict(list)
+    for entry in hw_lst:
+        candidates = by_class.get(entry[0])
+        if not candidates:
+            continue
+        type_ = str(entry[1])
+        for idx, regexp, keys in candidates:
+            if entry[2] in keys and regexp.match(type_):
+                devices[(idx, type_)].append([entry[2],
+                                              str(entry[3]).strip()])
+                break
+    grouped = collections.defaultdict(list)
+    for (idx, _), values in devices.items():
+        grouped[idx].append(sorted(values))
+    return [[rules[idx][0], rules[idx][1], sorted(grouped[idx])]
+            for idx in sorted(grouped)]
+
+
+def fingerprint(hw_lst, rules=None):
+    """Return the hexadecimal sha256 of the identity() of hw_lst."""
+    text = json.dumps(identity(hw_lst, rules), separators=(',', ':'))
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
@@ -24,6 +24,8 @@ import sys
 import pexpect
 
 from hardware import detect_utils
+from hardware import probe
+from hardware import runner
 
 
 ALL_SHOW_REGEXP = re.compile(r'^(.*) in Slot ([0-9]+).*\(sn: (.*)\)', re.M)
@@ -31,6 +33,8 @@ ERROR_REGEXP = re.compile('Error: (.*)', re.M)
 LOGICAL_REGEXP = re.compile(r'\s*logicaldrive (.*) \((.*), (.*), (.*)\)')
 PHYSICAL_REGEXP = re.compile(r'\s*physicaldrive (.*) \(.*, (.*), (.*), (.*)\)')
 PROMPT_REGEXP = re.compile('=> ')
+# Default number of seconds to wait for the prompt
+EXPECT_TIMEOUT = 30
 
 
 class Error(Exception):
@@ -44,6 +48,14 @@ class Error(Exception):
         return repr(self.value)
 
 
+def _expect_timeout():
+    """Return the time to wait for the prompt within the probe deadline."""
+    time_left = probe.time_left()
+    if time_left is None:
+        return EXPECT_TIMEOUT
+    return min(EXPECT_TIMEOUT, time_left)
+
+
 def parse_ctrl_all_show(output):
     """Parse the output of the 'ctrl <sel> all show' hpacucli sub-command."""
     lst = []
@@ -207,7 +219,7 @@ class Cli:
         # With the hpsa kernel module, we need to load the sg kernel
         # module before to have everything working. So we always load
         # it.
-        os.system('modprobe sg')
+        runner.run(['modprobe', 'sg'])
         path = None
         for path2 in ('/usr/sbin/ssacli',
                       '/usr/sbin/hpssacli',
@@ -219,8 +231,10 @@ class Cli:
             try:
                 if self.debug:
                     print('Launching', path)
-                self.process = pexpect.spawn(path, encoding='utf-8')
-                self.process.expect(PROMPT_REGEXP)
+                with probe.command(path):
+                    self.process = pexpect.spawn(path, encoding='utf-8')
+                    self.process.expect(PROMPT_REGEXP,
+                                        timeout=_expect_timeout())
             except (OSError, pexpect.EOF, pexpect.TIMEOUT):
                 return False
             return True
@@ -237,9 +251,13 @@ class Cli:
             print(line)
         self.process.sendline(line)
         try:
-            self.process.expect(PROMPT_REGEXP)
+            self.process.expect(PROMPT_REGEXP, timeout=_expect_timeout())
             ret = self.process.before[len(line):]
+            probe.add_bytes(len(self.process.before))
         except pexpect.TIMEOUT:
+            if probe.time_left() == 0:
+                self.process.terminate(force=True)
+                raise probe.ProbeTimeout('killed %s' % self.process.name)
             ret = 'Error: timeout'
 
         parse_error(ret)
@@ -23,7 +23,7 @@ from hardware.detect_utils import cmd
 
 def ib_card_drv():
     """Return an array of IB devices (ex: ['mlx4_0'])."""
-    ret, output = cmd('ibstat -l')
+    ret, output = cmd(['ibstat', '-l'], cached=True)
     if ret == 0:
         # Use filter to omit empty item due to trailing newline.
         return list(filter(None, output.split('\n')))
@@ -42,7 +42,7 @@ def ib_global_info(card_drv):
     :returns: a list containing information on the card device
     """
     global_card_info = {}
-    ret, global_info = cmd('ibstat %s -s' % card_drv)
+    ret, global_info = cmd(['ibstat', card_drv, '-s'], cached=True)
     if ret == 0:
         for line in global_info.split('\n'):
             re_dev = re.search('CA type: (.*)', line)
@@ -76,7 +76,8 @@ def ib_port_info(card_drv, port):
     :returns: a list containing information on the port
     """
     port_infos = {}
-    ret, port_desc = cmd('ibstat %s %i' % (card_drv, port))
+    ret, port_desc = cmd(['ibstat', card_drv, '%i' % port],
+                         cached=True)
     if ret == 0:
         for line in port_desc.split('\n'):
             re_state = re.search('State: (.*)', line)
@@ -111,9 +112,9 @@ def detect():
     Class 280 stands for a Network Controller while ethernet device are 0200.
     """
     hw_lst = []
-    status, _ = detect_utils.cmd(
-        "lspci -d 15b3: -n|awk '{print $2}'|grep -q '0280'")
-    if status != 0:
+    lspci = detect_utils.output_lines(['lspci', '-d', '15b3:', '-n'])
+    if not any('0280' in line.split()[1]
+               for line in lspci if len(line.split()) > 1):
         sys.stderr.write('Info: No Infiniband device found\n')
         return []
 
@@ -0,0 +1,299 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Inventories of (class, type, key, value) tuples.
+
+Inventory is a list indexed for lookups. CompactInventory stores the
+entries as integer codes of a Vocabulary shared between inventories, to
+keep many of them in memory.
+"""
+
+import array
+import collections.abc
+import json
+
+
+class Inventory(list):
+    """List of (class, type, key, value) tuples indexed for lookups.
+
+    An Inventory is a list: it is iterated, serialized to JSON and
+    modified like the list of tuples returned by the probes. The indexes
+    on (class, type, key) and (class, type) are built on the first lookup,
+    kept up to date by append() and extend() and rebuilt after any other
+    modification.
+    """
+
+    def __init__(self, entries=()):
+        super(Inventory, self).__init__(entries)
+        self._by_key = None
+        self._by_type = None
+        self._types = None
+
+    def _build(self):
+        self._by_key = {}
+        self._by_type = {}
+        self._types = {}
+        for entry in self:
+            self._add(entry)
+
+    def _add(self, entry):
+        cls_type = tuple(entry[0:2])
+        self._by_key.setdefault(tuple(entry[0:3]), []).append(entry)
+        entries = self._by_type.get(cls_type)
+        if entries is None:
+            entries = self._by_type[cls_type] = []
+            self._types.setdefault(entry[0], []).append(entry[1])
+        entries.append(entry)
+
+    def _invalidate(self):
+        self._by_key = None
+
+    def lookup(self, cls, type_, key):
+        """Return the entries matching (cls, type_, key) in order."""
+        if self._by_key is None:
+            self._build()
+        return list(self._by_key.get((cls, type_, key), ()))
+
+    def get(self, cls, type_, key, default=None):
+        """Return the value of the first entry matching (cls, type_, key)."""
+        if self._by_key is None:
+            self._build()
+        entries = self._by_key.get((cls, type_, key))
+        return entries[0][3] if entries else default
+
+    def types(self, cls):
+        """Return the types of the entries of class cls in order."""
+        if self._by_key is None:
+            self._build()
+        return list(self._types.get(cls, ()))
+
+    def select(self, cls, type_=None, key=None):
+        """Return the entries of class cls filtered by type_ and key.
+
+        A type_ or key of None matches any value, e.g.
+        select('disk', key='size') returns the size of all the disks.
+        """
+        if type_ is not None and key is not None:
+            return self.lookup(cls, type_, key)
+        if self._by_key is None:
+            self._build()
+        if type_ is not None:
+            entries = self._by_type.get((cls, type_), ())
+        else:
+            entries = [entry
+                       for name in self._types.get(cls, ())
+                       for entry in self._by_type[(cls, name)]]
+        if key is None:
+            return list(entries)
+        return [entry for entry in entries if entry[2] == key]
+
+    def append(self, entry):
+        super(Inventory, self).append(entry)
+        if self._by_key is not None:
+            self._add(entry)
+
+    def extend(self, entries):
+        start = len(self)
+        super(Inventory, self).extend(entries)
+        if self._by_key is not None:
+            for entry in self[start:]:
+                self._add(entry)
+
+    def __iadd__(self, entries):
+        self.extend(entries)
+        return self
+
+    def insert(self, index, entry):
+        super(Inventory, self).insert(index, entry)
+        self._invalidate()
+
+    def remove(self, entry):
+        super(Inventory, self).remove(entry)
+        self._invalidate()
+
+    def pop(self, *args):
+        ret = super(Inventory, self).pop(*args)
+        self._invalidate()
+        return ret
+
+    def clear(self):
+        super(Inventory, self).clear()
+        self._invalidate()
+
+    def sort(self, *args, **kwargs):
+        super(Inventory, self).sort(*args, **kwargs)
+        self._invalidate()
+
+    def reverse(self):
+        super(Inventory, self).reverse()
+        self._invalidate()
+
+    def __setitem__(self, index, value):
+        super(Inventory, self).__setitem__(index, value)
+        self._invalidate()
+
+    def __delitem__(self, index):
+        super(Inventory, self).__delitem__(index)
+        self._invalidate()
+
+    def __imul__(self, count):
+        super(Inventory, self).__imul__(count)
+        self._invalidate()
+        return self
+
+
+def lookup(hw_lst, cls, type_, key):
+    """Return the entries of hw_lst matching (cls, type_, key).
+
+    The indexes are used when hw_lst is an Inventory.
+    """
+    if isinstance(hw_lst, Inventory):
+        return hw_lst.lookup(cls, type_, key)
+    vect = (cls, type_, key)
+    return [entry for entry in hw_lst if tuple(entry[0:3]) == vect]
+
+
+class Vocabulary(object):
+    """Table of the distinct values of inventories and of their codes.
+
+    Values of different types are kept apart: 1, 1.0 and '1' get
+    different codes.
+    """
+
+    def __init__(self):
+        self._codes = {}
+        self.values = []
+
+    def __len__(self):
+        return len(self.values)
+
+    @staticmethod
+    def _key(value):
+        return value if type(value) is str else (type(value), value)
+
+    def code(self, value):
+        """Return the code of value, adding it to the table if needed."""
+        key = self._key(value)
+        code = self._codes.get(key)
+        if code is None:
+            code = self._codes[key] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def find(self, value):
+        """Return the code of value, None when it is not in the table."""
+        return self._codes.get(self._key(value))
+
+
+class CompactInventory(collections.abc.Sequence):
+    """Read-mostly inventory stored as columns of vocabulary codes.
+
+    Each entry uses four machine integers instead of a tuple and its
+    strings. The tuples are built again when the entries are accessed,
+    so a CompactInventory can be given to the functions iterating over
+    a list of tuples, or converted with list().
+
+    :param entries: iterable of (class, type, key, value) sequences
+    :param vocabulary: Vocabulary shared with other inventories, a new
+        one when None
+    """
+
+    def __init__(self, entries=(), vocabulary=None):
+        if vocabulary is None:
+            vocabulary = Vocabulary()
+        self.vocabulary = vocabulary
+        self._columns = tuple(array.array('I') for _ in range(4))
+        self.extend(entries)
+
+    def append(self, entry):
+        if len(entry) != 4:
+            raise ValueError('Invalid inventory entry: %r' % (entry,))
+        code = self.vocabulary.code
+        for column, value in zip(self._columns, entry):
+            column.append(code(value))
+
+    def extend(self, entries):
+        for entry in entries:
+            self.append(entry)
+
+    def __len__(self):
+        return len(self._columns[0])
+
+    def __getitem__(self, index):
+        values = self.vocabulary.values
+        if isinstance(index, slice):
+            return [tuple(values[column[idx]] for column in self._columns)
+                    for idx in range(*index.indices(len(self)))]
+        return tuple(values[column[index]] for column in self._columns)
+
+    def __iter__(self):
+        values = self.vocabulary.values
+        for codes in zip(*self._columns):
+            yield tuple(values[code] for code in codes)
+
+    def __eq__(self, other):
+        if isinstance(other, (list, CompactInventory)):
+            return len(self) == len(other) and all(
+                entry == tuple(other_entry)
+                for entry, other_entry in zip(self, other))
+        return NotImplemented
+
+    def __ne__(self, other):
+        ret = self.__eq__(other)
+        return ret if ret is NotImplemented else not ret
+
+    def __repr__(self):
+        return 'CompactInventory(%r)' % list(self)
+
+    def select(self, cls, type_=None, key=None):
+        """Return the entries of class cls filtered by type_ and key.
+
+        The filter works on the codes, only the matching entries are
+        converted to tuples. See Inventory.select().
+        """
+        wanted = []
+        for column, value in zip(self._columns, (cls, type_, key)):
+            if value is not None:
+                code = self.vocabulary.find(value)
+                if code is None:
+                    return []
+                wanted.append((column, code))
+        return [self[idx] for idx in range(len(self))
+                if all(column[idx] == code for column, code in wanted)]
+
+    def nbytes(self):
+        """Return the memory used by the codes of the entries."""
+        return sum(column.itemsize * len(column) for column in self._columns)
+
+
+def load(fileobj):
+    """Load the JSON output of hardware-detect as a list of tuples.
+
+    Newline delimited JSON, as written by hardware-detect --stream, is
+    loaded too.
+    """
+    content = fileobj.read()
+    try:
+        entries = json.loads(content)
+    except ValueError:
+        entries = [json.loads(line) for line in content.splitlines()
+                   if line.strip()]
+    else:
+        if entries and not isinstance(entries[0], list):
+            # newline delimited JSON holding a single entry
+            entries = [entries]
+    return [tuple(entry) for entry in entries]
+
+
+def load_compact(fileobj, vocabulary=None):
+    """Load the output of hardware-detect as a CompactInventory."""
+    return CompactInventory(load(fileobj), vocabulary)
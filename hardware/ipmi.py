@@ -14,12 +14,12 @@
 
 """Set of functions to manage IPMI."""
 
-import os
 import re
-import subprocess
 import sys
 
 from hardware import detect_utils
+from hardware import replay
+from hardware import runner
 
 
 LINE_REGEXP = re.compile(r'^([^:]+[^ ])\s*:\s*(.*[^ ])\s*$')
@@ -32,11 +32,13 @@ def setup_user(channel, username, password):
     sys.stderr.write('Info: ipmi_setup_user: Setting user="%s", '
                      'password="%s" on channel %s\n' %
                      (username, password, channel))
-    detect_utils.cmd('ipmitool user set name 1 %s' % username)
-    detect_utils.cmd('ipmitool user set password 1 %s' % password)
-    detect_utils.cmd('ipmitool user priv 1 4 %s' % channel)
-    detect_utils.cmd('ipmitool user enable')
-    state, _ = detect_utils.cmd('ipmitool user test 1 16 %s' % password)
+    detect_utils.cmd(['ipmitool', 'user', 'set', 'name', '1', username])
+    detect_utils.cmd(['ipmitool', 'user', 'set', 'password', '1',
+                      password])
+    detect_utils.cmd(['ipmitool', 'user', 'priv', '1', '4', str(channel)])
+    detect_utils.cmd(['ipmitool', 'user', 'enable'])
+    state, _ = detect_utils.cmd(['ipmitool', 'user', 'test', '1', '16',
+                                 password])
     if state == 0:
         sys.stderr.write('Info: ipmi_setup_user: Setting user successful !\n')
 
@@ -47,7 +49,7 @@ def setup_user(channel, username, password):
 def restart_bmc():
     """Restart a BMC card."""
     sys.stderr.write('Info: Restarting IPMI BMC\n')
-    detect_utils.cmd('ipmitool bmc reset cold')
+    detect_utils.cmd(['ipmitool', 'bmc', 'reset', 'cold'])
 
 
 def setup_network(channel, ipv4, netmask, gateway, vlan_id=-1):
@@ -63,17 +65,17 @@ def setup_network(channel, ipv4, netmask, gateway, vlan_id=-1):
     # NOTE (leseb): assuming you're missing an argument
     # and this already happened
     # ipmitool always returns 0 and prompt the valid values...
-    detect_utils.cmd('ipmitool lan set %s ipsrc static' % channel)
-    detect_utils.cmd('ipmitool lan set %s ipaddr %s' % (channel, ipv4))
-    detect_utils.cmd('ipmitool lan set %s netmask %s' % (channel, netmask))
-    detect_utils.cmd(
-        'ipmitool lan set %s defgw ipaddr %s' % (channel, gateway))
-    detect_utils.cmd('ipmitool lan set %s arp respond on' % channel)
+    lan_set = ['ipmitool', 'lan', 'set', str(channel)]
+    detect_utils.cmd(lan_set + ['ipsrc', 'static'])
+    detect_utils.cmd(lan_set + ['ipaddr', ipv4])
+    detect_utils.cmd(lan_set + ['netmask', netmask])
+    detect_utils.cmd(lan_set + ['defgw', 'ipaddr', gateway])
+    detect_utils.cmd(lan_set + ['arp', 'respond', 'on'])
 
     if vlan_id >= 0:
-        detect_utils.cmd('ipmitool lan set %s vlan id %d' % (channel, vlan_id))
+        detect_utils.cmd(lan_set + ['vlan', 'id', '%d' % vlan_id])
     else:
-        detect_utils.cmd('ipmitool lan set %s vlan id off' % channel)
+        detect_utils.cmd(lan_set + ['vlan', 'id', 'off'])
 
     # We need to restart the bmc to insure the setup is properly done
     restart_bmc()
@@ -116,12 +118,8 @@ def parse_ipmi_sdr(output):
 
 
 def get_ipmi_sdr():
-    ipmi_cmd = subprocess.Popen("ipmitool -I open sdr",
-                                shell=True,
-                                stdout=subprocess.PIPE,
-                                universal_newlines=True)
-
-    return parse_ipmi_sdr(ipmi_cmd.stdout)
+    result = runner.run(['ipmitool', '-I', 'open', 'sdr'])
+    return parse_ipmi_sdr(result.lines())
 
 
 def detect():
@@ -132,25 +130,30 @@ def detect():
     detect_utils.modprobe("ipmi_smb")
     detect_utils.modprobe("ipmi_si")
     detect_utils.modprobe("ipmi_devintf")
-    if (os.path.exists('/dev/ipmi0')
-            or os.path.exists('/dev/ipmi/0')
-            or os.path.exists('/dev/ipmidev/0')):
-        for channel in range(0, 16):
-            status, _ = detect_utils.cmd(
-                'ipmitool channel info %d 2>&1 | grep -sq Volatile' % channel)
-            if status == 0:
+    if (replay.exists('/dev/ipmi0')
+            or replay.exists('/dev/ipmi/0')
+            or replay.exists('/dev/ipmidev/0')):
+        # query the channels concurrently, the first one with volatile
+        # settings is reported
+        results = runner.run_many(
+            [['ipmitool', 'channel', 'info', '%d' % channel]
+             for channel in range(0, 16)])
+        for channel, result in enumerate(results):
+            if b'Volatile' in result.stdout + result.stderr:
                 hw_lst.append(('system', 'ipmi', 'channel', '%s' % channel))
                 break
-        status, output = detect_utils.cmd('ipmitool lan print')
+        status, output = detect_utils.cmd(['ipmitool', 'lan', 'print'])
         if status == 0:
             parse_lan_info(output, hw_lst)
 
         return hw_lst
 
     # do we need a fake ipmi device for testing purpose ?
-    status, _ = detect_utils.cmd(
-        'grep -qi FAKEIPMI /proc/detect_utils.cmdline')
-    if status == 0:
+    try:
+        kernel_cmdline = detect_utils.from_file('/proc/cmdline')
+    except IOError:
+        kernel_cmdline = ''
+    if 'FAKEIPMI' in kernel_cmdline.upper():
         # Yes ! So let's create a fake entry
         hw_lst.append(('system', 'ipmi-fake', 'channel', '0'))
         sys.stderr.write('Info: Added fake IPMI device\n')
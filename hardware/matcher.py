@@ -14,11 +14,17 @@
 
 """Functions to match according to a requirement specification."""
 
+import bisect
+import collections
+import functools
+import inspect
 import ipaddress
 import logging
 import re
 import sys
 
+from hardware import typed
+
 
 LOG = logging.getLogger('hardware.matcher')
 
@@ -38,27 +44,27 @@ def _appender(array, index, value):
 
 def _range(elt, minval, maxval):
     """Helper for match_spec."""
-    return float(minval) <= float(elt) <= float(maxval)
+    return typed.number(minval) <= typed.number(elt) <= typed.number(maxval)
 
 
 def _gt(left, right):
     """Helper for match_spec."""
-    return float(left) > float(right)
+    return typed.number(left) > typed.number(right)
 
 
 def _ge(left, right):
     """Helper for match_spec."""
-    return float(left) >= float(right)
+    return typed.number(left) >= typed.number(right)
 
 
 def _lt(left, right):
     """Helper for match_spec."""
-    return float(left) < float(right)
+    return typed.number(left) < typed.number(right)
 
 
 def _le(left, right):
     'Helper for match_spec.'
-    return float(left) <= float(right)
+    return typed.number(left) <= typed.number(right)
 
 
 def _not(_, right):
@@ -78,7 +84,50 @@ def _or(_, left, right):
 
 def _network(left, right):
     """Helper for match_spec."""
-    return ipaddress.IPv4Address(left) in ipaddress.IPv4Network(right)
+    if not isinstance(right, (ipaddress.IPv4Network, ipaddress.IPv6Network)):
+        right = ipaddress.ip_network(right)
+    return ipaddress.ip_address(left) in right
+
+
+class _Networks(object):
+    """Set of networks, looked up by bisecting their sorted intervals."""
+
+    __slots__ = ('starts', 'ends')
+
+    def __init__(self, networks):
+        intervals = []
+        for network in networks:
+            if not isinstance(network, (ipaddress.IPv4Network,
+                                        ipaddress.IPv6Network)):
+                network = ipaddress.ip_network(network)
+            intervals.append((network.version,
+                              int(network.network_address),
+                              int(network.broadcast_address)))
+        intervals.sort()
+        # merge the overlapping intervals to keep starts and ends sorted
+        merged = []
+        for interval in intervals:
+            if (merged and merged[-1][0] == interval[0]
+                    and merged[-1][2] + 1 >= interval[1]):
+                if interval[2] > merged[-1][2]:
+                    merged[-1] = (interval[0], merged[-1][1], interval[2])
+            else:
+                merged.append(interval)
+        self.starts = [(version, start) for version, start, _ in merged]
+        self.ends = [end for _, _, end in merged]
+
+    def __contains__(self, address):
+        key = (address.version, int(address))
+        pos = bisect.bisect_right(self.starts, key) - 1
+        return (pos >= 0 and self.starts[pos][0] == key[0]
+                and key[1] <= self.ends[pos])
+
+
+def _network_any(left, *networks):
+    """Helper for match_spec."""
+    if len(networks) != 1 or not isinstance(networks[0], _Networks):
+        networks = (_Networks(networks),)
+    return ipaddress.ip_address(left) in networks[0]
 
 
 def _regexp(left, right):
@@ -91,6 +140,96 @@ def _in(elt, *lst):
     return elt in lst
 
 
+class Operator(object):
+    """Function usable in the specs, see register_operator()."""
+
+    __slots__ = ('name', 'func', 'min_args', 'max_args', 'prepare',
+                 'prepare_all')
+
+    def __init__(self, name, func, min_args, max_args, prepare,
+                 prepare_all=None):
+        self.name = name
+        self.func = func
+        self.min_args = min_args
+        self.max_args = max_args
+        self.prepare = prepare
+        self.prepare_all = prepare_all
+
+    def check_arity(self, count):
+        """Raise ValueError if the operator cannot take count arguments."""
+        if count < self.min_args or (self.max_args is not None
+                                     and count > self.max_args):
+            if self.max_args is None:
+                expected = 'at least %d' % self.min_args
+            elif self.min_args == self.max_args:
+                expected = '%d' % self.min_args
+            else:
+                expected = '%d to %d' % (self.min_args, self.max_args)
+            plural = '' if expected.endswith(' 1') or expected == '1' else 's'
+            raise ValueError('%s() takes %s argument%s, %d given'
+                             % (self.name, expected, plural, count))
+
+
+_OPERATORS = {}
+
+
+def _arity(func):
+    """Return the (min, max) arguments of func, the line value excluded."""
+    min_args = max_args = -1
+    for param in inspect.signature(func).parameters.values():
+        if param.kind == param.VAR_POSITIONAL:
+            max_args = None
+        elif param.kind in (param.POSITIONAL_ONLY,
+                            param.POSITIONAL_OR_KEYWORD):
+            if param.default is param.empty:
+                min_args += 1
+            max_args += 1
+    if min_args < 0:
+        raise ValueError('%s does not take the value of the line' % func)
+    return min_args, max_args
+
+
+def register_operator(name, func=None, arity=None, prepare=None,
+                      prepare_all=None):
+    """Make func usable as name(...) in the specs.
+
+    func is called with the value of the line and the arguments of the
+    spec, parsed by typed.parse() or by the converter of their position
+    in prepare, and returns True if the value matches. Can be used as a
+    decorator. The specs already compiled keep their operators.
+
+    :param arity: (min, max) number of arguments of the spec, max None
+        for no limit, found from the signature of func when None
+    :param prepare: dict of the converters of the literal arguments by
+        position, e.g. {0: re.compile}, called once when the spec is
+        compiled
+    :param prepare_all: converter of the tuple of all the arguments,
+        returning the tuple of arguments given to func, called once when
+        the spec is compiled and no argument is a function
+    """
+    if func is None:
+        return functools.partial(register_operator, name, arity=arity,
+                                 prepare=prepare, prepare_all=prepare_all)
+    if not re.match(r'^[A-Za-z_]\w*$', name):
+        raise ValueError('Invalid operator name: %r' % name)
+    min_args, max_args = arity if arity is not None else _arity(func)
+    _OPERATORS[name] = Operator(name, func, min_args, max_args,
+                                dict(prepare or {}), prepare_all)
+    _compile_cached.cache_clear()
+    return func
+
+
+def unregister_operator(name):
+    """Remove an operator, raise KeyError if it is unknown."""
+    del _OPERATORS[name]
+    _compile_cached.cache_clear()
+
+
+def get_operator(name):
+    """Return the Operator registered under name, None if unknown."""
+    return _OPERATORS.get(name)
+
+
 _FUNC_REGEXP = re.compile(r'^([^(]+)'          # function name
                           r'\(\s*([^,]+)'      # first argument
                           r'(?:\s*,\s*(.+))?'  # remaining optional arguments
@@ -103,8 +242,9 @@ def _call_func(func, implicit, res):
     # split the optional arguments if we have some
     if res.group(3):
         args = args + re.split(r'\s*,\s*', res.group(3))
-    # remove strings delimiters
-    args = [x.strip('\'"') for x in args]
+    # remove strings delimiters, keeping the parsed numbers
+    args = [x if isinstance(x, typed.Number) else x.strip('\'"')
+            for x in args]
     # call function
     args = [_extract_result(implicit, x) for x in args]
     return func(*args)
@@ -114,122 +254,788 @@ def _extract_result(implicit, expr):
     """Helper function for match_spec."""
     res = _FUNC_REGEXP.search(expr)
     if res:
-        func_name = '_' + res.group(1)
-        if func_name in globals():
-            return _call_func(globals()[func_name], implicit, res)
+        operator = _OPERATORS.get(res.group(1))
+        if operator is not None:
+            return _call_func(operator.func, implicit, res)
 
     return expr
 
 
+class _Call(object):
+    """Function of a spec with its arguments resolved."""
+
+    __slots__ = ('func', 'args')
+
+    def __init__(self, func, args):
+        self.func = func
+        self.args = args
+
+    def __call__(self, implicit):
+        first = implicit
+        if isinstance(first, str) and not isinstance(first, typed.Number):
+            first = first.strip('\'"')
+            if first[-1:] == ')':
+                first = _extract_result(implicit, first)
+        return self.func(first, *[arg(implicit) if isinstance(arg, _Call)
+                                  else arg for arg in self.args])
+
+
+def _compile_call(res):
+    """Return the _Call of a _FUNC_REGEXP match, None if unknown.
+
+    :raises: ValueError when the number of arguments does not fit the
+        operator
+    """
+    operator = _OPERATORS.get(res.group(1))
+    if operator is None:
+        return None
+    args = [res.group(2)]
+    if res.group(3):
+        args = args + re.split(r'\s*,\s*', res.group(3))
+    operator.check_arity(len(args))
+    prepare = operator.prepare
+    compiled = []
+    for pos, arg in enumerate(args):
+        arg = arg.strip('\'"')
+        nested = _FUNC_REGEXP.search(arg)
+        call = _compile_call(nested) if nested else None
+        if call is not None:
+            compiled.append(call)
+            continue
+        if pos in prepare:
+            try:
+                arg = prepare[pos](arg)
+            except (ValueError, re.error):
+                # reported when the function is called
+                pass
+        else:
+            arg = typed.parse(arg)
+        compiled.append(arg)
+    compiled = tuple(compiled)
+    if operator.prepare_all is not None and not any(
+            isinstance(arg, _Call) for arg in compiled):
+        try:
+            compiled = tuple(operator.prepare_all(compiled))
+        except ValueError:
+            # reported when the function is called
+            pass
+    return _Call(operator.func, compiled)
+
+
+# kinds of the fields of a compiled spec
+_LITERAL = 0
+_VARIABLE = 1
+_FUNCTION = 2
+_VARIABLE_FUNCTION = 3
+_NEVER = 4
+
+
+class _Field(object):
+    """Field of a compiled spec."""
+
+    __slots__ = ('kind', 'value', 'name', 'call')
+
+    def __init__(self, kind, value, name=None, call=None):
+        self.kind = kind
+        self.value = value
+        self.name = name
+        self.call = call
+
+
+def _compile_field(elt):
+    if not isinstance(elt, str) or not elt:
+        return _Field(_LITERAL, elt)
+    var = func = elt
+    # try to split the variable and function parts if we have both
+    if elt[0] == '$':
+        parts = elt.split('=')
+        if len(parts) == 2:
+            var, func = parts
+    res = _FUNC_REGEXP.search(func) if func[-1:] == ')' else None
+    call = _compile_call(res) if res else None
+    if var != func:
+        if call is None:
+            return _Field(_LITERAL, elt)
+        return _Field(_VARIABLE_FUNCTION, elt, var[1:], call)
+    if res:
+        if call is None:
+            return _Field(_NEVER, elt)
+        return _Field(_FUNCTION, elt, call=call)
+    if elt[0] == '$':
+        return _Field(_VARIABLE, elt, elt[1:])
+    return _Field(_LITERAL, elt)
+
+
+class CompiledSpec(object):
+    """Spec line parsed once, see compile_spec()."""
+
+    __slots__ = ('spec', 'fields', 'variables', 'literals')
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.fields = tuple(_compile_field(spec[idx]) for idx in range(4))
+        self.variables = tuple(field.name for field in self.fields
+                               if field.name is not None)
+        # values of the fields matched by equality, used by LineIndex
+        self.literals = {idx: field.value
+                         for idx, field in enumerate(self.fields)
+                         if field.kind == _LITERAL}
+
+    def __repr__(self):
+        return repr(self.spec)
+
+    def match(self, line, arr, check_vars=True):
+        """Return the (index, variable) of line if it matches, else None.
+
+        :param check_vars: True to compare the variables already in arr
+        """
+        varidx = []
+        for idx, field in enumerate(self.fields):
+            value = line[idx]
+            kind = field.kind
+            if kind == _FUNCTION:
+                if not field.call(value):
+                    return None
+                continue
+            if kind == _VARIABLE_FUNCTION:
+                kind = _VARIABLE if field.call(value) else _LITERAL
+            if kind == _VARIABLE:
+                if check_vars and field.name in arr:
+                    if arr[field.name] != value:
+                        return None
+                varidx.append((idx, field.name))
+            elif kind == _NEVER or value != field.value:
+                return None
+        return varidx
+
+
+@functools.lru_cache(maxsize=1024)
+def _compile_cached(spec):
+    return CompiledSpec(spec)
+
+
+def compile_spec(spec):
+    """Return spec as a CompiledSpec.
+
+    The variables, functions and literal arguments of the functions are
+    parsed once instead of for each line matched.
+    """
+    if isinstance(spec, CompiledSpec):
+        return spec
+    try:
+        return _compile_cached(spec)
+    except TypeError:
+        # unhashable spec
+        return CompiledSpec(spec)
+
+
+def compile_specs(specs):
+    """Return a tuple of the CompiledSpec of specs."""
+    return tuple(compile_spec(spec) for spec in specs)
+
+
+register_operator('range', _range)
+register_operator('gt', _gt)
+register_operator('ge', _ge)
+register_operator('lt', _lt)
+register_operator('le', _le)
+register_operator('not', _not)
+register_operator('and', _and)
+register_operator('or', _or)
+register_operator('network', _network, prepare={0: ipaddress.ip_network})
+register_operator('network_any', _network_any, arity=(1, None),
+                  prepare_all=lambda networks: (_Networks(networks),))
+register_operator('regexp', _regexp, prepare={0: re.compile})
+register_operator('in', _in)
+
+
+class LineIndex(object):
+    """Lines of an inventory indexed on their first fields for match_spec.
+
+    The lines are indexed by class, by (class, type) and by (class, key),
+    so match_spec only tries the lines having the literal fields of the
+    spec. Like a list given to match_spec, the matched lines are removed.
+    The indexes are built on first use and shared by the copies.
+    """
+
+    _KINDS = ((0, 1), (0, 2), (0,))
+
+    def __init__(self, lines=(), _shared=None):
+        if _shared is None:
+            _shared = (list(lines), {})
+        self._shared = _shared
+        self._base = _shared[0]
+        self._removed = bytearray(len(self._base))
+        self._extra = []
+        self._len = len(self._base)
+
+    def copy(self):
+        ret = LineIndex(_shared=self._shared)
+        ret._removed = bytearray(self._removed)
+        ret._extra = list(self._extra)
+        ret._len = self._len
+        return ret
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        for pos, removed in enumerate(self._removed):
+            if not removed:
+                yield self._line(pos)
+
+    def _line(self, pos):
+        if pos < len(self._base):
+            return self._base[pos]
+        return self._extra[pos - len(self._base)]
+
+    def append(self, line):
+        """Add a line after the others."""
+        self._extra.append(line)
+        self._removed.append(0)
+        self._len += 1
+
+    def pop(self, pos):
+        """Remove the line at position pos and return it."""
+        self._removed[pos] = 1
+        self._len -= 1
+        return self._line(pos)
+
+    def restore(self, pos):
+        """Put back the line removed at position pos."""
+        self._removed[pos] = 0
+        self._len += 1
+
+    def size(self):
+        """Return the number of positions, removed lines included."""
+        return len(self._removed)
+
+    def all(self):
+        """Return all the lines, removed lines included."""
+        return self._base + self._extra
+
+    def of_type(self, type_):
+        """Yield (position, line) of the remaining lines of a type."""
+        positions = self._lookup((1,), (type_,))
+        if positions is None:
+            positions = range(len(self._base))
+        for pos in positions:
+            if not self._removed[pos] and self._base[pos][1] == type_:
+                yield pos, self._base[pos]
+        for pos in range(len(self._base), len(self._removed)):
+            line = self._line(pos)
+            if not self._removed[pos] and line[1] == type_:
+                yield pos, line
+
+    def _index(self, kind):
+        indexes = self._shared[1]
+        index = indexes.get(kind)
+        if index is None:
+            index = {}
+            for pos, line in enumerate(self._base):
+                try:
+                    key = tuple(line[idx] for idx in kind)
+                    index.setdefault(key, []).append(pos)
+                except (IndexError, TypeError):
+                    # unhashable or short lines are always candidates
+                    index.setdefault(None, []).append(pos)
+            indexes[kind] = index
+        return index
+
+    def _lookup(self, kind, key):
+        """Return the positions of the lines having key, None if unknown."""
+        index = self._index(kind)
+        try:
+            positions = index.get(key, [])
+        except TypeError:
+            return None
+        unindexed = index.get(None)
+        if unindexed:
+            positions = sorted(positions + unindexed)
+        return positions
+
+    def positions(self, literals):
+        """Yield the positions of the remaining lines that can match.
+
+        :param literals: dict of the literal fields of the spec by index
+        """
+        positions = None
+        for kind in self._KINDS:
+            if all(idx in literals for idx in kind):
+                positions = self._lookup(kind,
+                                         tuple(literals[idx] for idx in kind))
+                break
+        if positions is None:
+            positions = range(len(self._base))
+        removed = self._removed
+        for pos in positions:
+            if not removed[pos]:
+                yield pos
+        for pos in range(len(self._base), len(removed)):
+            if not removed[pos]:
+                yield pos
+
+    def find(self, line):
+        """Return the position of the first remaining line equal to line."""
+        try:
+            literals = {0: line[0], 1: line[1]}
+        except (IndexError, TypeError):
+            literals = {}
+        for pos in self.positions(literals):
+            if self._line(pos) == line:
+                return pos
+        return None
+
+    def get(self, pos):
+        return self._line(pos)
+
+
 def match_spec(spec, lines, arr, adder=_adder):
-    """Match a line according to a spec and store variables in <var>."""
+    """Match a line according to a spec and store variables in <var>.
+
+    :param spec: spec tuple or CompiledSpec
+    :param lines: list of lines or LineIndex
+    """
+    spec = compile_spec(spec)
+    if isinstance(lines, LineIndex):
+        return _match_index(spec, lines, arr, adder)
     # match a line without variable
-    for idx in range(len(lines)):
-        if lines[idx] == spec:
-            res = lines[idx]
-            del lines[idx]
-            return res
+    try:
+        idx = lines.index(spec.spec)
+    except ValueError:
+        pass
+    else:
+        return lines.pop(idx)
     # match a line with a variable, a function or both
+    check_vars = adder == _adder
     for lidx in range(len(lines)):
         line = lines[lidx]
-        varidx = []
-        for idx in range(4):
-            # try to split the variable and function parts if we have both
-            if spec[idx][0] == '$':
-                parts = spec[idx].split('=')
-                if len(parts) == 2:
-                    var, func = parts
-                    matched = False
-                else:
-                    var = func = spec[idx]
-            else:
-                var = func = spec[idx]
-            # Match a function
-            if func[-1] == ')':
-                res = _FUNC_REGEXP.search(func)
-                if res:
-                    func_name = '_' + res.group(1)
-                    if func_name in globals():
-                        if not _call_func(globals()[func_name],
-                                          line[idx], res):
-                            if var == func:
-                                break
-                        else:
-                            if var == func:
-                                continue
-                            matched = True
-                    else:
-                        if var == func:
-                            break
-            # Match a variable
-            if ((var == func) or (var != func and matched)) and var[0] == '$':
-                if adder == _adder and var[1:] in arr:
-                    if arr[var[1:]] != line[idx]:
-                        break
-                varidx.append((idx, var[1:]))
-            # Match the full string
-            elif line[idx] != spec[idx]:
-                break
-        else:
+        varidx = spec.match(line, arr, check_vars)
+        if varidx is not None:
             for i, var in varidx:
                 adder(arr, var, line[i])
-            res = lines[lidx]
             del lines[lidx]
-            return res
+            return line
+    return False
+
+
+def _match_index(spec, lines, arr, adder):
+    """match_spec on the candidate lines of a LineIndex."""
+    pos = lines.find(spec.spec)
+    if pos is not None:
+        return lines.pop(pos)
+    check_vars = adder == _adder
+    for pos in lines.positions(spec.literals):
+        line = lines.get(pos)
+        varidx = spec.match(line, arr, check_vars)
+        if varidx is not None:
+            for i, var in varidx:
+                adder(arr, var, line[i])
+            lines.pop(pos)
+            return line
     return False
 
 
-def match_all(lines, specs, arr, arr2, debug=False, level=0):
+def _match_line(spec, line, arr, check_vars=True):
+    """Return spec.match() or None when an operator fails on the line."""
+    try:
+        return spec.match(line, arr, check_vars)
+    except Exception:
+        return None
+
+
+class _Frame(object):
+    """Choice of a line for a spec during the search of match_all."""
+
+    __slots__ = ('idx', 'candidates', 'mark', 'pos', 'device', 'failed')
+
+    def __init__(self, idx, candidates, mark):
+        self.idx = idx
+        self.candidates = candidates
+        # length of the trail before the choice
+        self.mark = mark
+        self.pos = None
+        self.device = None
+        # signatures of the devices already tried without success
+        self.failed = set()
+
+
+class _Search(object):
+    """Depth-first search of the lines matching specs.
+
+    The matched lines are removed from the LineIndex and the variables
+    bound in arr are recorded on a trail, both are undone when
+    backtracking, so nothing is copied.
+
+    A choice binding a new variable in the type field to a device which
+    is the same as a device already tried, for the remaining specs, is
+    skipped: hosts with many identical disks do not try every order of
+    the disks before failing.
+    """
+
+    def __init__(self, lines, specs, arr, debug, finish=None):
+        self.lines = lines
+        self.specs = specs
+        self.arr = arr
+        self.debug = debug
+        # called when all the specs match, returns False to backtrack
+        self.finish = finish
+        self.trail = []
+        self.bound = collections.Counter(arr.values())
+        self._last_use = None
+        self._fixed = None
+        # a function on the type field can tell identical devices apart
+        self.symmetric = not any(
+            spec.fields[1].kind in (_FUNCTION, _VARIABLE_FUNCTION)
+            for spec in specs)
+
+    def _candidates(self, idx):
+        spec = self.specs[idx]
+        lines = self.lines
+        exact = []
+        for pos in lines.positions({0: spec.spec[0], 1: spec.spec[1]}):
+            if lines.get(pos) == spec.spec:
+                exact.append(pos)
+                yield pos, []
+        for pos in lines.positions(spec.literals):
+            if pos in exact:
+                continue
+            varidx = _match_line(spec, lines.get(pos), self.arr)
+            if varidx is not None:
+                yield pos, varidx
+
+    def _prepare(self):
+        """Compute the last spec using each line and the fixed values."""
+        lines = self.lines
+        self._last_use = [-1] * lines.size()
+        self._fixed = set()
+        for idx, spec in enumerate(self.specs):
+            for pos in lines.positions(spec.literals):
+                line = lines.get(pos)
+                try:
+                    used = (line == spec.spec
+                            or spec.match(line, {}, False) is not None)
+                except Exception:
+                    # without the variables bound, an operator can get
+                    # values it is never called with, the line is kept
+                    used = True
+                if used:
+                    self._last_use[pos] = idx
+            for field in spec.fields:
+                if field.kind == _LITERAL:
+                    self._add_fixed(field.value)
+        for line in lines.all():
+            for idx in (0, 2, 3):
+                self._add_fixed(line[idx])
+
+    def _add_fixed(self, value):
+        try:
+            self._fixed.add(value)
+        except TypeError:
+            pass
+
+    def _device(self, frame, pos, varidx):
+        """Return the signature of the device bound by a choice or None."""
+        if not self.symmetric or not varidx or varidx[0][0] != 1:
+            return None
+        if varidx[0][1] in self.arr:
+            return None
+        if self._last_use is None:
+            self._prepare()
+        lines = self.lines
+        value = lines.get(pos)[1]
+        try:
+            if value in self._fixed or self.bound[value]:
+                return None
+        except TypeError:
+            return None
+        entries = sorted((repr((line[0], line[2], line[3]))
+                          for line_pos, line in lines.of_type(value)
+                          if self._last_use[line_pos] >= frame.idx))
+        line = lines.get(pos)
+        # the line chosen matters, not only the device
+        chosen = repr((line[0], line[2], line[3]))
+        others = tuple(repr(line[idx]) for idx, _ in varidx[1:])
+        return chosen, others, tuple(entries)
+
+    def _undo(self, mark):
+        while len(self.trail) > mark:
+            var = self.trail.pop()
+            self.bound[self.arr.pop(var)] -= 1
+
+    def _choose(self, frame):
+        """Choose the next line of a frame, return False when none."""
+        for pos, varidx in frame.candidates:
+            device = None
+            if frame.failed:
+                device = self._device(frame, pos, varidx)
+                if device is not None and device in frame.failed:
+                    continue
+            line = self.lines.pop(pos)
+            for idx, var in varidx:
+                if var in self.arr:
+                    self.bound[self.arr[var]] -= 1
+                else:
+                    self.trail.append(var)
+                self.arr[var] = line[idx]
+                self.bound[line[idx]] += 1
+            frame.pos = pos
+            frame.device = (pos, varidx)
+            if self.debug:
+                sys.stderr.write('match_spec: %s %s\n'
+                                 % (line, self.specs[frame.idx]))
+                if varidx:
+                    sys.stderr.write('new var: %s %s\n' % (self.arr, line))
+            return True
+        return False
+
+    def _backtrack(self, frame):
+        """Undo the choice of a frame."""
+        self._undo(frame.mark)
+        self.lines.restore(frame.pos)
+        device = self._device(frame, *frame.device)
+        if device is not None:
+            frame.failed.add(device)
+        frame.pos = None
+        if self.debug:
+            sys.stderr.write('retrying with: %s\n' % (self.arr,))
+
+    def _finished(self):
+        return self.finish is None or self.finish()
+
+    def run(self):
+        if not self.specs:
+            return self._finished()
+        stack = [_Frame(0, self._candidates(0), 0)]
+        while stack:
+            frame = stack[-1]
+            if frame.pos is not None:
+                self._backtrack(frame)
+            if not self._choose(frame):
+                stack.pop()
+                if self.debug and not stack:
+                    sys.stderr.write('spec: %s not matched\n'
+                                     % str(self.specs[frame.idx]))
+                continue
+            if frame.idx + 1 == len(self.specs):
+                if self._finished():
+                    return True
+                continue
+            stack.append(_Frame(frame.idx + 1,
+                                self._candidates(frame.idx + 1),
+                                len(self.trail)))
+        return False
+
+
+def _max_matching(adjacency):
+    """Return a maximum matching of a bipartite graph (Hopcroft-Karp).
+
+    :param adjacency: list of the lists of the right nodes of each left
+        node, in order of preference
+    :returns: list of the right node of each left node or None
+    """
+    match_left = [None] * len(adjacency)
+    match_right = {}
+    while True:
+        # layers of the left nodes by alternating paths from the free ones
+        dist = {node: 0 for node in range(len(adjacency))
+                if match_left[node] is None}
+        queue = list(dist)
+        found = False
+        for node in queue:
+            for right in adjacency[node]:
+                other = match_right.get(right)
+                if other is None:
+                    found = True
+                elif other not in dist:
+                    dist[other] = dist[node] + 1
+                    queue.append(other)
+        if not found:
+            return match_left
+        # augment along vertex disjoint shortest paths
+        for root in range(len(adjacency)):
+            if match_left[root] is not None:
+                continue
+            stack = [root]
+            chosen = []
+            iters = {root: iter(adjacency[root])}
+            while stack:
+                node = stack[-1]
+                for right in iters[node]:
+                    other = match_right.get(right)
+                    if other is None:
+                        chosen.append(right)
+                        for left, right in zip(stack, chosen):
+                            match_left[left] = right
+                            match_right[right] = left
+                        stack = []
+                        break
+                    if dist.get(other) == dist[node] + 1:
+                        chosen.append(right)
+                        stack.append(other)
+                        iters[other] = iter(adjacency[other])
+                        break
+                else:
+                    # dead end, removed from the layers
+                    dist[node] = None
+                    stack.pop()
+                    if chosen:
+                        chosen.pop()
+
+
+def _shape(specs):
+    """Return specs with their variables renamed in order of appearance."""
+    names = {}
+    shape = []
+    for spec in specs:
+        fields = []
+        for field in spec.fields:
+            if field.name is None:
+                fields.append(field.value)
+            else:
+                names.setdefault(field.name, len(names))
+                fields.append((names[field.name], field.kind,
+                               field.value.partition('=')[2]))
+        shape.append(tuple(fields))
+    return tuple(shape)
+
+
+class _Group(object):
+    """Specs of a device: they share a variable bound to the type field."""
+
+    __slots__ = ('var', 'specs', 'shape')
+
+    def __init__(self, var, specs):
+        self.var = var
+        self.specs = specs
+        self.shape = _shape(specs)
+        try:
+            hash(self.shape)
+        except TypeError:
+            self.shape = None
+
+
+def _split_groups(specs, arr):
+    """Split specs in device groups and the other specs."""
+    parent = list(range(len(specs)))
+
+    def find(idx):
+        while parent[idx] != idx:
+            parent[idx] = parent[parent[idx]]
+            idx = parent[idx]
+        return idx
+
+    first = {}
+    for idx, spec in enumerate(specs):
+        for name in spec.variables:
+            if name in first:
+                parent[find(idx)] = find(first[name])
+            else:
+                first[name] = idx
+    components = collections.OrderedDict()
+    for idx in range(len(specs)):
+        components.setdefault(find(idx), []).append(specs[idx])
+    groups = []
+    others = []
+    for component in components.values():
+        var = component[0].fields[1].name
+        names = set(name for spec in component for name in spec.variables)
+        if (var is not None
+                and not any(name in arr for name in names)
+                and all(spec.fields[1].kind == _VARIABLE
+                        and spec.fields[1].name == var
+                        and var not in [field.name
+                                        for field in spec.fields[2:]]
+                        and spec.fields[0].name is None
+                        for spec in component)):
+            groups.append(_Group(var, component))
+        else:
+            others.extend(component)
+    others.sort(key=specs.index)
+    return groups, others
+
+
+def _assign(lines, groups, arr):
+    """Bind the groups to different devices, return False if impossible."""
+    cache = {}
+
+    def device_match(group, device, bind=False):
+        key = (group.shape, device)
+        if not bind and group.shape is not None and key in cache:
+            return cache[key]
+        local = {group.var: device}
+        ret = _Search(LineIndex([line for _, line
+                                 in lines.of_type(device)]),
+                      group.specs, local, False).run()
+        if group.shape is not None:
+            cache[key] = ret
+        if bind and ret:
+            arr.update(local)
+        return ret
+
+    adjacency = []
+    for group in groups:
+        spec = group.specs[0]
+        devices = []
+        for pos in lines.positions(spec.literals):
+            device = lines.get(pos)[1]
+            if (device not in devices
+                    and _match_line(spec, lines.get(pos), {},
+                                    False) is not None
+                    and device_match(group, device)):
+                devices.append(device)
+        adjacency.append(devices)
+    matching = _max_matching(adjacency)
+    if any(device is None for device in matching):
+        return False
+    for group, device in zip(groups, matching):
+        device_match(group, device, bind=True)
+    return True
+
+
+SEARCH = 'search'
+ASSIGNMENT = 'assignment'
+
+
+def match_all(lines, specs, arr, arr2, debug=False, level=0, mode=SEARCH):
     """Match all lines according to a spec.
 
     Store variables starting with a $ in <arr>. Variables starting with
-    2 $ like $$vda are stored in arr and arr2.
+    2 $ like $$vda are stored in arr and arr2. specs can be the result of
+    compile_specs() to parse them once for several matches. arr is left
+    unchanged when the lines do not match. A line on which an operator
+    raises an exception, like gt() on a string, does not match the spec.
+
+    With mode=ASSIGNMENT, the specs sharing a variable of the type field,
+    like ('disk', '$disk1', 'size', 'gt(100)'), are matched as the
+    devices of the inventory by a maximum bipartite matching instead of
+    trying the devices in turn. The other specs are matched first, as
+    with mode=SEARCH. The bindings are stricter than with mode=SEARCH:
+    each of these variables binds a different device, while mode=SEARCH
+    lets two of them bind the same device when their specs match
+    different lines of it, so some inventories matching with
+    mode=SEARCH do not match with mode=ASSIGNMENT.
+
+    The level argument is not used anymore, the search has no depth limit.
     """
     # Work on a copy of lines to avoid changing the real lines because
-    # match_spec removes the matched line to not match it again on next
-    # calls.
-    lines = list(lines)
-    specs = list(specs)
-    copy_arr = dict(arr)
-    points = []
-    # Prevent infinite loops
-    if level == 50:
+    # the matched lines are removed to not match them again on next
+    # specs.
+    if isinstance(lines, LineIndex):
+        lines = lines.copy()
+    else:
+        lines = LineIndex(lines)
+    specs = compile_specs(specs)
+    if mode == ASSIGNMENT:
+        groups, specs = _split_groups(specs, arr)
+        search = _Search(lines, specs, arr, debug,
+                         finish=lambda: _assign(lines, groups, arr))
+    elif mode == SEARCH:
+        search = _Search(lines, specs, arr, debug)
+    else:
+        raise ValueError('Unknown match mode %s' % mode)
+    if not search.run():
         return False
-    # Match lines using specs
-    while specs:
-        copy_specs = list(specs)
-        spec = specs.pop(0)
-        line = match_spec(spec, lines, arr)
-        if debug:
-            sys.stderr.write('match_spec: %s %s\n' % (line, spec))
-        # No match
-        if not line:
-            # Backtrack on the backtracking points
-            while points:
-                lines, specs, new_arr = points.pop()
-                if debug:
-                    sys.stderr.write('retrying with: %s\n' %
-                                     (new_arr,))
-                if match_all(lines, specs, new_arr, arr2, debug, level + 1):
-                    # Copy arr back
-                    for k in new_arr:
-                        arr[k] = new_arr[k]
-                    if debug:
-                        sys.stderr.write('success: %d\n' % level)
-                    return True
-            if level == 0 and debug:
-                sys.stderr.write('spec: %s not matched\n' % str(spec))
-            return False
-        else:
-            # Store backtraking points when we find a new variable
-            if arr != copy_arr:
-                copy_lines = list(lines)
-                # Put the matching line at the end of the lines
-                copy_lines.append(line)
-                points.append((copy_lines, copy_specs, copy_arr))
-                copy_arr = dict(arr)
-                if debug:
-                    sys.stderr.write('new var: %s %s\n' % (arr, line))
 
     # Manage $$ variables
     for key in list(arr):
@@ -244,7 +1050,8 @@ def match_all(lines, specs, arr, arr2, debug=False, level=0):
 def match_multiple(lines, spec, arr):
     """Use spec to find all the matching lines and gather variables."""
     ret = False
-    lines = list(lines)
+    lines = LineIndex(lines)
+    spec = compile_spec(spec)
     while match_spec(spec, lines, arr, adder=_appender):
         ret = True
     return ret
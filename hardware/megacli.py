@@ -16,11 +16,13 @@
 
 import os
 import re
-from subprocess import PIPE
-from subprocess import Popen
+import shlex
 import sys
 
 from hardware import detect_utils
+from hardware import memo
+from hardware import replay
+from hardware import runner
 
 
 SEP_REGEXP = re.compile(r'\s*:\s*')
@@ -79,6 +81,12 @@ def which(cmd, mode=os.F_OK | os.X_OK, path=None):
 
 
 def search_exec(possible_names):
+    key = ' '.join(possible_names)
+    return memo.call('which', key, replay.call, 'which', key, _search_exec,
+                     possible_names)
+
+
+def _search_exec(possible_names):
     prog_path = None
     for prog_name in possible_names:
         prog_path = which(prog_name)
@@ -126,9 +134,8 @@ def run_megacli(*args):
     """Run the megacli command in a subprocess and return the output."""
     prog_exec = search_exec(["megacli", "MegaCli", "MegaCli64"])
     if prog_exec:
-        cmd = prog_exec + ' - ' + ' '.join(args)
-        proc = Popen(cmd, shell=True, stdout=PIPE, universal_newlines=True)
-        return proc.communicate()[0]
+        cmd = [prog_exec, '-'] + shlex.split(' '.join(args))
+        return runner.run(cmd, cached=True).text
 
     sys.stderr.write('Cannot find megacli on the system\n')
     return ""
@@ -0,0 +1,147 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Run the read-only queries once per detection run.
+
+Between start() and stop(), the results of the idempotent commands run
+through runner and of the lookups done with call() are kept: the same
+query made again by any probe gets the first result. A query made while
+the first one is still running waits for it.
+
+Hits and misses are counted in the ProbeStats of the running probe.
+"""
+
+import asyncio
+from concurrent import futures
+import contextlib
+import threading
+
+from hardware import probe
+
+_MEMO = None
+
+
+class Memo(object):
+    """Results of the queries of a run."""
+
+    def __init__(self):
+        self.entries = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, key):
+        """Return the future holding the result of key.
+
+        :returns: (future, owner), owner is True when the caller has to
+            compute the result and to set it with future.set_result().
+            The result is a (success, value) tuple.
+        """
+        with self._lock:
+            future = self.entries.get(key)
+            if future is not None:
+                return future, False
+            future = self.entries[key] = futures.Future()
+            return future, True
+
+    def discard(self, key, future):
+        """Forget a failed query so that the next one runs again."""
+        with self._lock:
+            if self.entries.get(key) is future:
+                del self.entries[key]
+        future.set_result((False, None))
+
+
+def start():
+    """Start keeping the results of the queries."""
+    global _MEMO
+    _MEMO = Memo()
+
+
+def stop():
+    """Forget the results of the queries."""
+    global _MEMO
+    _MEMO = None
+
+
+def active():
+    return _MEMO is not None
+
+
+@contextlib.contextmanager
+def run():
+    """Keep the results of the queries made in the block."""
+    start()
+    try:
+        yield
+    finally:
+        stop()
+
+
+def call(kind, key, func, *args):
+    """Call func(*args) once per run for the given kind and key.
+
+    Exceptions raised by func are not kept. Waiting for the same query
+    made by another probe raises probe.ProbeTimeout at the deadline of
+    the running probe.
+    """
+    memo = _MEMO
+    if memo is None:
+        return func(*args)
+    future, owner = memo.reserve((kind, key))
+    if not owner:
+        try:
+            success, value = future.result(probe.time_left())
+        except futures.TimeoutError:
+            raise probe.ProbeTimeout('waiting for %s %s' % (kind, key))
+        if success:
+            probe.count_memo(hit=True)
+            return value
+        return func(*args)
+    probe.count_memo(hit=False)
+    try:
+        value = func(*args)
+    except BaseException:
+        memo.discard((kind, key), future)
+        raise
+    future.set_result((True, value))
+    return value
+
+
+async def call_async(kind, key, func, *args):
+    """Await func(*args) once per run for the given kind and key.
+
+    See call(), func is a coroutine function.
+    """
+    memo = _MEMO
+    if memo is None:
+        return await func(*args)
+    future, owner = memo.reserve((kind, key))
+    if not owner:
+        # do not cancel the query of the owner when the caller is
+        # cancelled or runs out of time
+        try:
+            success, value = await asyncio.wait_for(
+                asyncio.shield(asyncio.wrap_future(future)),
+                probe.time_left())
+        except asyncio.TimeoutError:
+            raise probe.ProbeTimeout('waiting for %s %s' % (kind, key))
+        if success:
+            probe.count_memo(hit=True)
+            return value
+        return await func(*args)
+    probe.count_memo(hit=False)
+    try:
+        value = await func(*args)
+    except BaseException:
+        memo.discard((kind, key), future)
+        raise
+    future.set_result((True, value))
+    return value
@@ -0,0 +1,333 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Binary archive of the inventories of many hosts.
+
+The file is made of:
+
+- a header: the magic, the format version and the flags,
+- the inventory of each host: the codes of the class, type, key and value
+  of each entry as varints,
+- the table of the values of all the inventories, each value stored once
+  with its type,
+- the index: the name, offset, size and number of entries of each host,
+- a trailer with the offsets of the table and of the index.
+
+With the COMPRESSED flag, each inventory and the table are compressed
+with zlib. The Reader maps the file in memory and only decodes the
+inventories it reads. Scanning the archive for a (class, type, key)
+compares the codes of the entries, no value is built for the other
+entries.
+"""
+
+import mmap
+import struct
+import zlib
+
+from hardware import inventory
+
+MAGIC = b'HWPK'
+FORMAT_VERSION = 1
+COMPRESSED = 1
+
+_HEADER = struct.Struct('<4sBBH')
+_TRAILER = struct.Struct('<QQ4s')
+_FLOAT = struct.Struct('<d')
+
+_STR = 0
+_INT = 1
+_FLOAT_TAG = 2
+_TRUE = 3
+_FALSE = 4
+_NONE = 5
+_TYPES = (str, int, float, type(None))
+
+
+class PackedError(Exception):
+    """Exception raised when an archive cannot be read."""
+
+
+def _varint(value, out):
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(buf, pos):
+    ret = 0
+    shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        ret |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return ret, pos
+        shift += 7
+
+
+def _encode_value(value, out):
+    if value is True:
+        out.append(_TRUE)
+    elif value is False:
+        out.append(_FALSE)
+    elif value is None:
+        out.append(_NONE)
+    elif isinstance(value, str):
+        data = value.encode('utf-8', 'surrogatepass')
+        out.append(_STR)
+        _varint(len(data), out)
+        out.extend(data)
+    elif isinstance(value, int):
+        out.append(_INT)
+        _varint(value * 2 if value >= 0 else -value * 2 - 1, out)
+    elif isinstance(value, float):
+        out.append(_FLOAT_TAG)
+        out.extend(_FLOAT.pack(value))
+    else:
+        raise ValueError('Unsupported inventory value: %r' % (value,))
+
+
+def _decode_values(buf, pos):
+    values = []
+    count, pos = _read_varint(buf, pos)
+    for _ in range(count):
+        tag = buf[pos]
+        pos += 1
+        if tag == _STR:
+            size, pos = _read_varint(buf, pos)
+            values.append(bytes(buf[pos:pos + size]).decode('utf-8',
+                                                            'surrogatepass'))
+            pos += size
+        elif tag == _INT:
+            number, pos = _read_varint(buf, pos)
+            values.append(number // 2 if not number & 1
+                          else -(number + 1) // 2)
+        elif tag == _FLOAT_TAG:
+            values.append(_FLOAT.unpack_from(buf, pos)[0])
+            pos += _FLOAT.size
+        elif tag in (_TRUE, _FALSE, _NONE):
+            values.append({_TRUE: True, _FALSE: False, _NONE: None}[tag])
+        else:
+            raise PackedError('Invalid value type %d' % tag)
+    return values
+
+
+class Writer(object):
+    """Write the inventories of hosts to a binary archive.
+
+    :param fileobj: file object opened in binary mode
+    :param compress: True to compress the inventories and the table
+    """
+
+    def __init__(self, fileobj, compress=False):
+        self.fileobj = fileobj
+        self.flags = COMPRESSED if compress else 0
+        self.vocabulary = inventory.Vocabulary()
+        self.hosts = []
+        self.offset = fileobj.write(_HEADER.pack(MAGIC, FORMAT_VERSION,
+                                                 self.flags, 0))
+
+    def _write(self, data):
+        if self.flags & COMPRESSED:
+            data = zlib.compress(bytes(data))
+        offset = self.offset
+        self.offset += self.fileobj.write(data)
+        return offset, len(data)
+
+    def add(self, name, hw_lst):
+        """Add the inventory of a host.
+
+        :param hw_lst: list of (class, type, key, value) tuples
+        """
+        code = self.vocabulary.code
+        out = bytearray()
+        count = 0
+        for entry in hw_lst:
+            if len(entry) != 4:
+                raise ValueError('Invalid inventory entry: %r' % (entry,))
+            for value in entry:
+                if not isinstance(value, _TYPES):
+                    raise ValueError('Unsupported inventory value: %r'
+                                     % (value,))
+                _varint(code(value), out)
+            count += 1
+        offset, size = self._write(out)
+        self.hosts.append((name, offset, size, count))
+
+    def close(self):
+        """Write the table and the index, the file object is not closed."""
+        out = bytearray()
+        _varint(len(self.vocabulary), out)
+        for value in self.vocabulary.values:
+            _encode_value(value, out)
+        table_offset, table_size = self._write(out)
+        out = bytearray()
+        _varint(table_size, out)
+        _varint(len(self.hosts), out)
+        for name, offset, size, count in self.hosts:
+            data = name.encode('utf-8', 'surrogatepass')
+            for number in (len(data), offset, size, count):
+                _varint(number, out)
+            out.extend(data)
+        index_offset = self.offset
+        self.offset += self.fileobj.write(out)
+        self.offset += self.fileobj.write(_TRAILER.pack(table_offset,
+                                                        index_offset, MAGIC))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if exc_info[0] is None:
+            self.close()
+
+
+def write(filename, hosts, compress=False):
+    """Write a binary archive.
+
+    :param hosts: iterable of (name, list of (class, type, key, value)
+        tuples)
+    """
+    with open(filename, 'wb') as fileobj:
+        with Writer(fileobj, compress) as writer:
+            for name, hw_lst in hosts:
+                writer.add(name, hw_lst)
+
+
+class Reader(object):
+    """Read a binary archive mapped in memory.
+
+    :param filename: path of the archive
+    """
+
+    def __init__(self, filename):
+        with open(filename, 'rb') as fileobj:
+            try:
+                self._map = mmap.mmap(fileobj.fileno(), 0,
+                                      access=mmap.ACCESS_READ)
+            except ValueError:
+                raise PackedError('%s is empty' % filename)
+        self._values = None
+        self._codes = None
+        try:
+            self._load_index(filename)
+        except (IndexError, struct.error, zlib.error, UnicodeError):
+            self.close()
+            raise PackedError('%s is not a valid archive' % filename)
+        except PackedError:
+            self.close()
+            raise
+
+    def _load_index(self, filename):
+        magic, version, self.flags, _ = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise PackedError('%s is not an inventory archive' % filename)
+        if version != FORMAT_VERSION:
+            raise PackedError('Unsupported archive version %d in %s'
+                              % (version, filename))
+        table_offset, index_offset, magic = _TRAILER.unpack_from(
+            self._map, len(self._map) - _TRAILER.size)
+        if magic != MAGIC:
+            raise PackedError('%s is truncated' % filename)
+        table_size, pos = _read_varint(self._map, index_offset)
+        self._table = (table_offset, table_size)
+        count, pos = _read_varint(self._map, pos)
+        self.hosts = {}
+        for _ in range(count):
+            numbers = []
+            for _ in range(4):
+                number, pos = _read_varint(self._map, pos)
+                numbers.append(number)
+            name = self._map[pos:pos + numbers[0]].decode('utf-8',
+                                                          'surrogatepass')
+            pos += numbers[0]
+            self.hosts[name] = tuple(numbers[1:])
+
+    def _data(self, offset, size):
+        """Return the buffer holding a section and its offset in it."""
+        if self.flags & COMPRESSED:
+            return zlib.decompress(self._map[offset:offset + size]), 0
+        return self._map, offset
+
+    @property
+    def values(self):
+        """The table of the values, decoded on first use."""
+        if self._values is None:
+            self._values = _decode_values(*self._data(*self._table))
+        return self._values
+
+    def _code(self, value):
+        if self._codes is None:
+            vocabulary = inventory.Vocabulary()
+            for item in self.values:
+                vocabulary.code(item)
+            self._codes = vocabulary
+        return self._codes.find(value)
+
+    def _codes_of(self, name):
+        offset, size, count = self.hosts[name]
+        data, pos = self._data(offset, size)
+        for _ in range(count):
+            codes = []
+            for _ in range(4):
+                code, pos = _read_varint(data, pos)
+                codes.append(code)
+            yield codes
+
+    def __len__(self):
+        return len(self.hosts)
+
+    def __iter__(self):
+        return iter(self.hosts)
+
+    def __contains__(self, name):
+        return name in self.hosts
+
+    def load(self, name):
+        """Return the inventory of a host as a list of tuples.
+
+        :raises: KeyError when the host is not in the archive
+        """
+        values = self.values
+        return [tuple(values[code] for code in codes)
+                for codes in self._codes_of(name)]
+
+    def select(self, cls, type_=None, key=None):
+        """Yield (host, entry) for the entries of all the hosts matching.
+
+        :param cls: class of the entries
+        :param type_: type of the entries, any type when None
+        :param key: key of the entries, any key when None
+        """
+        wanted = []
+        for column, value in enumerate((cls, type_, key)):
+            if value is None:
+                continue
+            code = self._code(value)
+            if code is None:
+                return
+            wanted.append((column, code))
+        values = self.values
+        for name in self.hosts:
+            for codes in self._codes_of(name):
+                if all(codes[column] == code for column, code in wanted):
+                    yield name, tuple(values[code] for code in codes)
+
+    def close(self):
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,511 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Run hardware detection probes concurrently."""
+
+import collections
+from concurrent import futures
+import contextlib
+import contextvars
+import fnmatch
+import importlib
+import resource
+import sys
+import threading
+import time
+
+from hardware import inventory
+from hardware import typed as typed_values
+
+DEFAULT_JOBS = 8
+# Extra time given to a probe to notice its deadline by itself before
+# the executor stops waiting for it.
+GRACE_PERIOD = 1.0
+
+_DEADLINE = contextvars.ContextVar('hardware_probe_deadline', default=None)
+_STATS = contextvars.ContextVar('hardware_probe_stats', default=None)
+_COMMAND = contextvars.ContextVar('hardware_probe_command', default=None)
+
+
+class ProbeError(Exception):
+    """Exception raised when probes cannot be scheduled."""
+
+
+class ProbeTimeout(Exception):
+    """Exception raised when a probe runs past its deadline."""
+
+
+def time_left():
+    """Return the number of seconds left to the running probe.
+
+    :returns: None when the probe has no deadline, 0 when the deadline
+        has already expired.
+    """
+    deadline = _DEADLINE.get()
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+
+class ProbeStats(object):
+    """Timing information gathered while a probe runs.
+
+    cpu is the CPU time of the thread running the probe, the CPU time of
+    its subprocesses is not accounted for.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.nbytes = 0
+        self.commands = []
+        self.memo_hits = 0
+        self.memo_misses = 0
+        self.timeout = False
+
+    @property
+    def subprocesses(self):
+        return len(self.commands)
+
+    def to_dict(self):
+        return {'wall_ms': _ms(self.wall),
+                'cpu_ms': _ms(self.cpu),
+                'subprocesses': self.subprocesses,
+                'bytes': self.nbytes,
+                'memo_hits': self.memo_hits,
+                'memo_misses': self.memo_misses,
+                'timeout': self.timeout,
+                'commands': [{'cmd': cmdline,
+                              'wall_ms': _ms(wall),
+                              'bytes': nbytes}
+                             for cmdline, wall, nbytes in self.commands]}
+
+
+def _ms(seconds):
+    return int(round(seconds * 1000))
+
+
+@contextlib.contextmanager
+def command(cmdline):
+    """Account an external command to the running probe.
+
+    Commands are recorded in the ProbeStats of the probe together with
+    the bytes reported by add_bytes() while they run in the same thread or
+    asyncio task.
+    """
+    stats = _STATS.get()
+    if stats is None:
+        yield
+        return
+    if not isinstance(cmdline, str):
+        cmdline = ' '.join(cmdline)
+    entry = [cmdline, 0.0, 0]
+    stats.commands.append(entry)
+    token = _COMMAND.set(entry)
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        entry[1] = time.monotonic() - start
+        _COMMAND.reset(token)
+
+
+def add_bytes(nbytes):
+    """Account bytes of command output parsed by the running probe."""
+    stats = _STATS.get()
+    if stats is not None:
+        stats.nbytes += nbytes
+        entry = _COMMAND.get()
+        if entry is None and stats.commands:
+            entry = stats.commands[-1]
+        if entry is not None:
+            entry[2] += nbytes
+
+
+def count_memo(hit):
+    """Account a memoized query of the running probe, see memo."""
+    stats = _STATS.get()
+    if stats is not None:
+        if hit:
+            stats.memo_hits += 1
+        else:
+            stats.memo_misses += 1
+
+
+# (class, type, key) patterns of the entries reporting on the run, see
+# timing_result() and timeout_result().
+REPORT_ENTRIES = [('hw', 'timing', '*'), ('hw', 'probe', '*')]
+
+
+def timing_result(stats):
+    """Return the inventory reporting the wall time of probes in ms."""
+    return [('hw', 'timing', name, _ms(stat.wall))
+            for name, stat in stats.items()]
+
+
+def timing_report(stats, wall=None):
+    """Return a JSON serializable report of the probes statistics."""
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    report = {'probes': {name: stat.to_dict()
+                         for name, stat in stats.items()},
+              'children_cpu_ms': _ms(children.ru_utime + children.ru_stime),
+              'memo_hits': sum(stat.memo_hits for stat in stats.values()),
+              'memo_misses': sum(stat.memo_misses
+                                 for stat in stats.values())}
+    if wall is not None:
+        report['wall_ms'] = _ms(wall)
+    return report
+
+
+def timeout_result(name):
+    """Return the inventory reported for a probe that timed out."""
+    return [('hw', 'probe', name, 'timeout')]
+
+
+def strip_refreshed(hw_lst, patterns):
+    """Return hw_lst without the entries matching one of the patterns.
+
+    :param patterns: list of (class, type, key) shell-style patterns, see
+        the refreshes attribute of Probe
+    """
+    if not patterns:
+        return list(hw_lst)
+    return [entry for entry in hw_lst
+            if not any(all(fnmatch.fnmatchcase(str(field), part)
+                           for field, part in zip(entry, pattern))
+                       for pattern in patterns)]
+
+
+class Probe(object):
+    """A detection routine returning a list of hardware tuples.
+
+    :param name: unique name of the probe
+    :param func: callable returning a list of tuples, or its 'module:name'
+        path to import it only when the probe runs. When the probe
+        requires other probes, it is called with the concatenated output
+        of these probes.
+    :param requires: names of the probes that must complete first
+    :param timeout: maximum number of seconds the probe may run, None to
+        use the default of the run
+    :param volatile: True if the output of the probe can change without a
+        reboot
+    :param refreshes: (class, type, key) patterns of the volatile entries
+        of the required probes that this probe collects again
+    :param volatile_entries: (class, type, key) patterns of the entries
+        of a volatile probe changing without any change of the hardware
+    :param fields: (class, type, key, kind, unit) declarations of the
+        numeric values collected by the probe, see typed.normalize()
+    """
+
+    def __init__(self, name, func, requires=(), timeout=None,
+                 volatile=False, refreshes=(), fields=(),
+                 volatile_entries=()):
+        self.name = name
+        self.func = func
+        self.requires = tuple(requires)
+        self.timeout = timeout
+        self.volatile = volatile
+        self.refreshes = tuple(refreshes)
+        self.fields = tuple(fields)
+        self.volatile_entries = tuple(volatile_entries)
+
+    def __repr__(self):
+        return 'Probe(%r)' % self.name
+
+    def resolve(self):
+        """Return the detection routine, importing its module if needed."""
+        if isinstance(self.func, str):
+            module, _, name = self.func.partition(':')
+            self.func = getattr(importlib.import_module(module), name)
+        return self.func
+
+    def run(self, results, deadline=None, stats=None, typed=False):
+        func = self.resolve()
+        token = _DEADLINE.set(deadline)
+        stats_token = _STATS.set(stats)
+        start = time.monotonic()
+        start_cpu = time.thread_time()
+        try:
+            if self.requires:
+                hw_lst = inventory.Inventory()
+                for name in self.requires:
+                    hw_lst.extend(results.get(name, []))
+                ret = func(hw_lst)
+            else:
+                ret = func()
+        finally:
+            if stats is not None:
+                stats.wall = time.monotonic() - start
+                stats.cpu = time.thread_time() - start_cpu
+            _STATS.reset(stats_token)
+            _DEADLINE.reset(token)
+        # some detection routines return None when nothing is found
+        if typed and self.fields:
+            return typed_values.normalize(ret or [], self.fields)
+        return list(ret or [])
+
+
+# The probes run by hardware-detect.
+PROBES = [
+    Probe('areca', 'hardware.areca:detect'),
+    Probe('hpacucli', 'hardware.hpacucli:detect'),
+    Probe('megacli', 'hardware.megacli:detect'),
+    Probe('diskinfo', 'hardware.diskinfo:detect',
+          fields=[('disk', '*', 'size', int, 'GB'),
+                  ('disk', 'logical', 'count', int, None)]),
+    Probe('system', 'hardware.system:detect',
+          fields=[('memory', '*', 'size', int, 'B'),
+                  ('memory', 'bank*', 'clock', int, 'Hz'),
+                  ('memory', 'banks', 'count', int, None),
+                  ('network', '*', 'size', int, 'bit/s')]),
+    Probe('ipmi', 'hardware.ipmi:detect'),
+    Probe('infiniband', 'hardware.infiniband:detect'),
+    Probe('sensors', 'hardware.sensors:detect_temperatures',
+          volatile=True,
+          fields=[('cpu', 'physical_*', '*/temperature', int, 'mC'),
+                  ('cpu', 'physical_*', '*/max', int, 'mC'),
+                  ('cpu', 'physical_*', '*/critical', int, 'mC')],
+          volatile_entries=[('cpu', 'physical_*', '*/temperature'),
+                            ('cpu', 'physical_*', '*/critical_alarm')]),
+    Probe('ipmi_sdr', 'hardware.ipmi:get_ipmi_sdr', volatile=True,
+          volatile_entries=[('ipmi', '*', '*')]),
+    Probe('rtc', 'hardware.rtc:detect_rtc_clock', volatile=True,
+          volatile_entries=[('system', 'rtc', '*')]),
+    Probe('auxv', 'hardware.detect_utils:detect_auxv'),
+    Probe('dmesg', 'hardware.detect_utils:parse_dmesg'),
+    Probe('bios_hp', 'hardware.bios_hp:dump_hp_bios',
+          requires=('system',)),
+]
+PROBE_NAMES = [entry.name for entry in PROBES]
+
+# Probes collecting again the volatile entries of cached static probes.
+REFRESH_PROBES = [
+    Probe('smart', 'hardware.diskinfo:detect_smart',
+          requires=('diskinfo',), volatile=True,
+          refreshes=[('disk', '*', 'SMART/*')]),
+    Probe('link', 'hardware.system:detect_links',
+          requires=('system',), volatile=True,
+          refreshes=[('network', '*', 'link'),
+                     ('network', '*', 'speed'),
+                     ('network', '*', 'duplex')]),
+]
+
+# Cheap probes sampled again by the daemon mode.
+SAMPLERS = [entry for entry in PROBES
+            if entry.name in ('sensors', 'ipmi_sdr')] + [
+    REFRESH_PROBES[1],
+    Probe('disk_state', 'hardware.diskinfo:detect_disk_states',
+          requires=('diskinfo',), volatile=True,
+          refreshes=[('disk', '*', 'state')]),
+]
+SAMPLER_NAMES = [entry.name for entry in SAMPLERS]
+
+# (class, type, key, kind, unit) declarations of the numeric values
+# collected by the probes, see typed.normalize().
+FIELDS = [field for entry in PROBES + REFRESH_PROBES
+          for field in entry.fields]
+
+# (class, type, key) patterns of the entries changing without any change
+# of the hardware: the volatile entries of the probes, the entries
+# collected again by the refresh probes and the samplers, and the report
+# of the run.
+VOLATILE = list(collections.OrderedDict.fromkeys(
+    [pattern for entry in PROBES + REFRESH_PROBES + SAMPLERS
+     for pattern in entry.volatile_entries + entry.refreshes]
+    + REPORT_ENTRIES))
+
+
+def select(probes, only=None, skip=None):
+    """Select probes by name.
+
+    The requirements of the selected probes are selected too, unless they
+    are explicitly skipped.
+
+    :param probes: list of Probe objects
+    :param only: names of the probes to run, None to run all of them
+    :param skip: names of the probes not to run
+    :returns: list of the selected Probe objects, ordered like probes
+    """
+    by_name = {probe.name: probe for probe in probes}
+    skip = set(skip or [])
+    unknown = (set(only or []) | skip) - set(by_name)
+    if unknown:
+        raise ProbeError('Unknown probes: %s' % ', '.join(sorted(unknown)))
+
+    if only is None:
+        wanted = set(by_name)
+    else:
+        wanted = set()
+        todo = list(only)
+        while todo:
+            name = todo.pop()
+            if name not in wanted:
+                wanted.add(name)
+                todo.extend(req for req in by_name[name].requires
+                            if req in by_name)
+    return [probe for probe in probes
+            if probe.name in wanted and probe.name not in skip]
+
+
+def _deadline(start, timeout, budget_end):
+    deadline = None
+    if timeout is not None:
+        deadline = start + timeout
+    if budget_end is not None:
+        deadline = budget_end if deadline is None else min(deadline,
+                                                           budget_end)
+    return deadline
+
+
+def _start(probe, *args):
+    """Run probe.run(*args) on a daemon thread, return its Future.
+
+    Unlike the workers of a ThreadPoolExecutor, a daemon thread does not
+    delay the exit of the interpreter if the probe never returns.
+    """
+    future = futures.Future()
+    future.set_running_or_notify_cancel()
+
+    def target():
+        try:
+            result = probe.run(*args)
+        except BaseException as excpt:
+            future.set_exception(excpt)
+        else:
+            future.set_result(result)
+
+    threading.Thread(target=target, name='probe-%s' % probe.name,
+                     daemon=True).start()
+    return future
+
+
+def run_probes(probes, jobs=DEFAULT_JOBS, timeout=None, timeouts=None,
+               time_budget=None, stats=None, callback=None, typed=False,
+               keep=()):
+    """Run probes on a bounded number of threads.
+
+    Probes without pending requirements run concurrently. A requirement
+    that is not part of probes is considered satisfied without data.
+
+    A probe still running at its deadline has its commands killed and
+    is reported as timed out, see timeout_result(). The requirements of
+    a probe that timed out are considered satisfied without data. Its
+    thread is left behind and does not prevent the process from exiting.
+
+    :param probes: list of Probe objects
+    :param jobs: maximum number of probes running at the same time
+    :param timeout: default number of seconds each probe may run
+    :param timeouts: dict of probe name to number of seconds overriding
+        the timeout of the probe
+    :param time_budget: number of seconds all the probes may run
+    :param stats: dict filled with probe name to ProbeStats when not None
+    :param callback: callable called from the calling thread with the
+        name and the results of each probe as soon as it completes, the
+        results are then not kept
+    :param typed: True to parse the numeric values declared in the
+        fields of the probes, see typed.normalize()
+    :param keep: names of the probes whose results are returned even
+        when callback is given
+    :returns: dict of probe name to list of tuples, ordered like probes,
+        only holding the probes of keep when callback is given
+    """
+    names = [probe.name for probe in probes]
+    if len(set(names)) != len(names):
+        raise ProbeError('Duplicate probe names in %s' % names)
+    timeouts = timeouts or {}
+    unknown = set(timeouts) - set(names)
+    if unknown:
+        raise ProbeError('Timeout set for unknown probes: %s' %
+                         ', '.join(sorted(unknown)))
+
+    budget_end = None
+    if time_budget is not None:
+        budget_end = time.monotonic() + time_budget
+
+    # the results of the probes are only kept when they are returned or
+    # required by another probe
+    required = set(req for probe in probes for req in probe.requires)
+    keep = set(keep)
+    finished = set()
+    results = {}
+    data = {}
+    pending = list(probes)
+    running = {}
+    jobs = max(1, jobs)
+    if stats is None:
+        stats = {}
+
+    def _finished(name, hw_lst, required_data):
+        finished.add(name)
+        if name in required:
+            data[name] = required_data
+        if callback is None or name in keep:
+            results[name] = hw_lst
+        if callback is not None:
+            callback(name, hw_lst)
+
+    def _timed_out(name, reason):
+        sys.stderr.write('Info: probe %s %s\n' % (name, reason))
+        stats.setdefault(name, ProbeStats(name)).timeout = True
+        _finished(name, timeout_result(name), [])
+
+    while pending or running:
+        for probe in list(pending):
+            if len(running) >= jobs:
+                break
+            if all(req in finished or req not in names
+                   for req in probe.requires):
+                pending.remove(probe)
+                now = time.monotonic()
+                probe_timeout = timeouts.get(probe.name, probe.timeout)
+                if probe_timeout is None:
+                    probe_timeout = timeout
+                deadline = _deadline(now, probe_timeout, budget_end)
+                if deadline is not None and deadline <= now:
+                    _timed_out(probe.name, 'has no time left to run')
+                    continue
+                stats[probe.name] = ProbeStats(probe.name)
+                future = _start(probe, dict(data), deadline,
+                                stats[probe.name], typed)
+                running[future] = (probe, deadline)
+        if not running:
+            if pending:
+                raise ProbeError('Circular requirements between %s' %
+                                 pending)
+            break
+        deadlines = [deadline for _, deadline in running.values()
+                     if deadline is not None]
+        wait_time = None
+        if deadlines:
+            wait_time = max(0.0, min(deadlines) + GRACE_PERIOD
+                            - time.monotonic())
+        done, _ = futures.wait(running, timeout=wait_time,
+                               return_when=futures.FIRST_COMPLETED)
+        now = time.monotonic()
+        for future, (probe, deadline) in list(running.items()):
+            if future in done:
+                del running[future]
+                try:
+                    hw_lst = future.result()
+                except ProbeTimeout as excpt:
+                    _timed_out(probe.name, 'timed out: %s' % excpt)
+                else:
+                    _finished(probe.name, hw_lst, hw_lst)
+            elif deadline is not None and now >= deadline + GRACE_PERIOD:
+                # the thread cannot be interrupted: leave it behind,
+                # the commands it runs through runner are killed at
+                # the deadline, other blocking calls are not.
+                del running[future]
+                _timed_out(probe.name, 'timed out')
+
+    return {name: results[name] for name in names if name in results}
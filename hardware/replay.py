@@ -0,0 +1,226 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Record and replay the commands and the files read by the probes.
+
+When recording, the argv, exit status, stdout and stderr of the commands
+run through runner and the results of the filesystem functions of this
+module are saved in a directory. When replaying, they are served from
+this directory and nothing touches the hardware.
+
+The archive is made of an index.json file and of the outputs of the
+commands stored as raw files in the outputs directory.
+"""
+
+import builtins
+import errno
+import hashlib
+import io
+import json
+import os
+import shlex
+import threading
+
+RECORD = 'record'
+REPLAY = 'replay'
+FORMAT_VERSION = 1
+
+_ARCHIVE = None
+
+
+class ReplayError(Exception):
+    """Exception raised when an archive cannot be used."""
+
+
+class Archive(object):
+    """Commands and filesystem accesses recorded in a directory."""
+
+    def __init__(self, directory, mode):
+        self.directory = directory
+        self.mode = mode
+        self.commands = {}
+        self.calls = {}
+        self._cursors = {}
+        self._lock = threading.Lock()
+        if mode == REPLAY:
+            self.load()
+
+    @property
+    def _index(self):
+        return os.path.join(self.directory, 'index.json')
+
+    def _output_path(self, name):
+        return os.path.join(self.directory, 'outputs', name)
+
+    def load(self):
+        try:
+            with builtins.open(self._index) as index:
+                content = json.load(index)
+        except (IOError, ValueError) as excpt:
+            raise ReplayError('Cannot load %s: %s' % (self._index, excpt))
+        if content.get('version') != FORMAT_VERSION:
+            raise ReplayError('Unsupported archive version in %s' %
+                              self._index)
+        self.commands = content['commands']
+        self.calls = content['calls']
+
+    def save(self):
+        with self._lock:
+            content = {'version': FORMAT_VERSION,
+                       'commands': self.commands,
+                       'calls': self.calls}
+        with builtins.open(self._index, 'w') as index:
+            json.dump(content, index, indent=1, sort_keys=True)
+
+    def _write_output(self, data):
+        name = hashlib.sha1(data).hexdigest()
+        path = self._output_path(name)
+        if not os.path.exists(path):
+            with builtins.open(path, 'wb') as output:
+                output.write(data)
+        return name
+
+    def _read_output(self, name):
+        with builtins.open(self._output_path(name), 'rb') as output:
+            return output.read()
+
+    def add_command(self, key, returncode, stdout, stderr):
+        entry = {'returncode': returncode,
+                 'stdout': self._write_output(stdout),
+                 'stderr': self._write_output(stderr)}
+        with self._lock:
+            self.commands.setdefault(key, []).append(entry)
+
+    def add_call(self, kind, key, entry):
+        with self._lock:
+            self.calls.setdefault(kind, {})[key] = entry
+
+    def command(self, key):
+        """Return the next recorded (returncode, stdout, stderr) of key.
+
+        The last run is replayed again when a command ran more times than
+        recorded.
+        """
+        with self._lock:
+            entries = self.commands.get(key)
+            if not entries:
+                return None
+            idx = self._cursors.get(key, 0)
+            self._cursors[key] = idx + 1
+            entry = entries[min(idx, len(entries) - 1)]
+        return (entry['returncode'], self._read_output(entry['stdout']),
+                self._read_output(entry['stderr']))
+
+
+def start(directory, mode):
+    """Start recording to or replaying from directory."""
+    global _ARCHIVE
+    if mode == RECORD:
+        os.makedirs(os.path.join(directory, 'outputs'), exist_ok=True)
+    _ARCHIVE = Archive(directory, mode)
+
+
+def stop():
+    """Stop recording or replaying, saving the recorded archive."""
+    global _ARCHIVE
+    archive, _ARCHIVE = _ARCHIVE, None
+    if archive is not None and archive.mode == RECORD:
+        archive.save()
+
+
+def replaying():
+    return _ARCHIVE is not None and _ARCHIVE.mode == REPLAY
+
+
+def command_key(cmdline):
+    """Return the string identifying a command in the archive."""
+    if isinstance(cmdline, str):
+        return cmdline
+    return shlex.join(cmdline)
+
+
+def replay_command(cmdline):
+    """Return the recorded (returncode, stdout, stderr) of a command.
+
+    A command missing from the archive is reported like a missing
+    executable.
+    """
+    ret = _ARCHIVE.command(command_key(cmdline))
+    if ret is None:
+        return 127, b'', b'not recorded\n'
+    return ret
+
+
+def record_command(cmdline, returncode, stdout, stderr):
+    """Save the outcome of a command when recording."""
+    archive = _ARCHIVE
+    if archive is not None and archive.mode == RECORD:
+        archive.add_command(command_key(cmdline), returncode, stdout, stderr)
+
+
+def call(kind, key, func, *args):
+    """Call func(*args), recording or replaying its result.
+
+    :param kind: name of the kind of call, e.g. 'listdir'
+    :param key: string identifying the call among the calls of this kind
+    :param func: function returning a JSON serializable value or raising
+        OSError
+    """
+    archive = _ARCHIVE
+    if archive is None:
+        return func(*args)
+    if archive.mode == REPLAY:
+        entry = archive.calls.get(kind, {}).get(key)
+        if entry is None:
+            raise FileNotFoundError(errno.ENOENT, 'not recorded', key)
+        if 'errno' in entry:
+            raise OSError(entry['errno'], os.strerror(entry['errno']), key)
+        return entry['value']
+    try:
+        value = func(*args)
+    except OSError as excpt:
+        archive.add_call(kind, key, {'errno': excpt.errno or errno.EIO})
+        raise
+    archive.add_call(kind, key, {'value': value})
+    return value
+
+
+def _read(path):
+    with builtins.open(path) as content:
+        return content.read()
+
+
+def open(path):
+    """Open a text file for reading, see call()."""
+    if _ARCHIVE is None:
+        return builtins.open(path)
+    return io.StringIO(call('read', path, _read, path))
+
+
+def listdir(path):
+    return call('listdir', path, os.listdir, path)
+
+
+def exists(path):
+    return call('exists', path, os.path.exists, path)
+
+
+def isfile(path):
+    return call('isfile', path, os.path.isfile, path)
+
+
+def readlink(path):
+    return call('readlink', path, os.readlink, path)
+
+
+def realpath(path):
+    return call('realpath', path, os.path.realpath, path)
@@ -14,21 +14,22 @@
 
 import logging
 import re
-import subprocess
+
+from hardware import runner
 
 LOG = logging.getLogger('hardware.rtc')
 
 
 def get_rtc():
     cmd = ['timedatectl', 'status', '--no-pager']
-    try:
-        stdout = subprocess.check_output(cmd).decode("utf-8")
-    except OSError:
+    result = runner.run(cmd)
+    if result.returncode == 127:
         LOG.warning('Unable to determine RTC timezone (no timedatectl)')
         return 'unknown'
-    except subprocess.CalledProcessError as excpt:
-        LOG.warning('RTC timezone command failed - %s' % excpt.output)
+    if result.returncode != 0:
+        LOG.warning('RTC timezone command failed - %s' % result.stdout)
         return 'unknown'
+    stdout = result.text
     if stdout:
         match = re.search(r'RTC in local TZ: ([a-z]+)$', stdout)
         if match:
@@ -0,0 +1,180 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Run external commands with asyncio.
+
+Commands run in their own process group, their stdout and stderr are
+captured and they are killed at the deadline of the running probe, see
+probe.time_left(). run_many() overlaps independent commands in a single
+event loop.
+"""
+
+import asyncio
+import collections
+import contextlib
+import os
+import shutil
+import signal
+import subprocess
+
+from hardware import memo
+from hardware import probe
+from hardware import replay
+
+DEFAULT_CONCURRENCY = 8
+
+
+class Result(collections.namedtuple('Result', ['args', 'returncode',
+                                               'stdout', 'stderr'])):
+    """Outcome of a command, stdout and stderr are bytes."""
+
+    __slots__ = ()
+
+    @property
+    def text(self):
+        """Return stdout decoded, undecodable bytes are replaced."""
+        return self.stdout.decode('utf-8', 'replace')
+
+    def lines(self):
+        """Return the lines of stdout decoded."""
+        return self.text.splitlines()
+
+
+def _kill(proc):
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except OSError:
+        pass
+
+
+def _resolve(cmdline, env):
+    """Return the arguments to execute, the program is looked up once."""
+    if (isinstance(cmdline, str) or env is not None or not memo.active()
+            or os.sep in cmdline[0]):
+        return cmdline
+    path = memo.call('executable', cmdline[0], shutil.which, cmdline[0])
+    if path is None:
+        return None
+    return [path] + list(cmdline[1:])
+
+
+def _memo_key(cmdline, env):
+    if env is None:
+        return replay.command_key(cmdline), None
+    return replay.command_key(cmdline), tuple(sorted(env.items()))
+
+
+async def run_async(cmdline, timeout=None, limit=None, env=None,
+                    cached=False):
+    """Run a command and capture its output.
+
+    :param cmdline: list of arguments executed directly, or string run
+        by the shell for compatibility with external callers. A missing
+        executable is reported with the 127 exit status like the shell
+        does.
+    :param timeout: maximum number of seconds the command may run
+    :param limit: asyncio.Semaphore limiting the number of commands
+        running at the same time
+    :param env: environment of the command
+    :param cached: True when the command only reads data that does not
+        change during a run: it then runs once per run, see memo
+    :returns: a Result
+    :raises: subprocess.TimeoutExpired when timeout expires,
+        probe.ProbeTimeout when the deadline of the probe expires first
+    """
+    if cached:
+        return await memo.call_async('command', _memo_key(cmdline, env),
+                                     _run_async, cmdline, timeout, limit,
+                                     env)
+    return await _run_async(cmdline, timeout, limit, env)
+
+
+async def _run_async(cmdline, timeout, limit, env):
+    if replay.replaying():
+        with probe.command(cmdline):
+            returncode, stdout, stderr = replay.replay_command(cmdline)
+            probe.add_bytes(len(stdout))
+        return Result(cmdline, returncode, stdout, stderr)
+
+    async with (limit or contextlib.nullcontext()):
+        time_left = probe.time_left()
+        wait = timeout
+        if time_left is not None and (timeout is None or time_left < timeout):
+            wait = time_left
+        with probe.command(cmdline):
+            kwargs = dict(stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          stdin=subprocess.DEVNULL, start_new_session=True,
+                          env=env)
+            args = _resolve(cmdline, env)
+            try:
+                if args is None:
+                    raise FileNotFoundError('%s: command not found' %
+                                            cmdline[0])
+                if isinstance(args, str):
+                    proc = await asyncio.create_subprocess_shell(args,
+                                                                 **kwargs)
+                else:
+                    proc = await asyncio.create_subprocess_exec(*args,
+                                                                **kwargs)
+            except OSError as excpt:
+                replay.record_command(cmdline, 127, b'', str(excpt).encode())
+                return Result(cmdline, 127, b'', str(excpt).encode())
+            try:
+                stdout, stderr = await asyncio.wait_for(proc.communicate(),
+                                                        wait)
+            except asyncio.TimeoutError:
+                _kill(proc)
+                await proc.wait()
+                if wait is timeout:
+                    raise subprocess.TimeoutExpired(cmdline, timeout)
+                raise probe.ProbeTimeout('killed %s' % (cmdline,))
+            except BaseException:
+                # cancelled: do not leave the command behind
+                _kill(proc)
+                raise
+            probe.add_bytes(len(stdout))
+    replay.record_command(cmdline, proc.returncode, stdout, stderr)
+    return Result(cmdline, proc.returncode, stdout, stderr)
+
+
+def run(cmdline, timeout=None, env=None, cached=False):
+    """Run a command and capture its output, see run_async()."""
+    return asyncio.run(run_async(cmdline, timeout=timeout, env=env,
+                                 cached=cached))
+
+
+async def gather(coros, concurrency=DEFAULT_CONCURRENCY):
+    """Run coroutine functions taking a limit argument concurrently.
+
+    :param coros: list of callables taking the asyncio.Semaphore to pass
+        to run_async() and returning a coroutine
+    :returns: the list of their results
+    """
+    limit = asyncio.Semaphore(max(1, concurrency))
+    return await asyncio.gather(*[coro(limit) for coro in coros])
+
+
+def run_many(cmdlines, concurrency=DEFAULT_CONCURRENCY, timeout=None,
+             env=None, cached=False):
+    """Run commands concurrently in one event loop.
+
+    :param cmdlines: list of commands, see run_async()
+    :param concurrency: maximum number of commands running at the same
+        time
+    :returns: the list of Result objects, ordered like cmdlines
+    """
+    def _bind(cmdline):
+        return lambda limit: run_async(cmdline, timeout=timeout,
+                                       limit=limit, env=env, cached=cached)
+
+    return asyncio.run(gather([_bind(cmdline) for cmdline in cmdlines],
+                              concurrency))
@@ -14,21 +14,22 @@
 
 """Functions to read data from hardware sensors."""
 
-import os
 import sys
 
+from hardware import replay
+
 
 def read_hwmon(hwlst, entry, sensor, label_name, appendix, processor_num,
                entry_name):
     try:
         hwmon = "%s_%s" % (sensor, appendix)
         filename = "/sys/devices/platform/%s/%s" % (entry, hwmon)
-        if not os.path.isfile(filename):
+        if not replay.isfile(filename):
             if len(hwmon) > 16:
                 # Some kernels are shortening the filename to 17 chars
                 # Let's try to find if we are in this case
                 filename = "/sys/devices/platform/%s/%s" % (entry, hwmon[:16])
-                if not os.path.isfile(filename):
+                if not replay.isfile(filename):
                     sys.stderr.write("read_hwmon: No entry found for %s/%s\n" %
                                      (label_name, entry_name))
                     return
@@ -37,7 +38,8 @@ def read_hwmon(hwlst, entry, sensor, label_name, appendix, processor_num,
                                  (label_name, entry_name))
                 return
 
-        value = open(filename, 'r').readline().strip()
+        with replay.open(filename) as hwmon_file:
+            value = hwmon_file.readline().strip()
         hwlst.append(('cpu', 'physical_%d' % processor_num, "%s/%s" %
                       (label_name, entry_name), value))
     except Exception:
@@ -46,15 +48,15 @@ def read_hwmon(hwlst, entry, sensor, label_name, appendix, processor_num,
 
 def detect_temperatures():
     hwlst = []
-    for entry in os.listdir("/sys/devices/platform/"):
+    for entry in replay.listdir("/sys/devices/platform/"):
         if entry.startswith("coretemp."):
             processor_num = int(entry.split(".")[1])
-            for label in os.listdir("/sys/devices/platform/%s" % entry):
+            for label in replay.listdir("/sys/devices/platform/%s" % entry):
                 if label.startswith("temp") and label.endswith("_label"):
                     sensor = label.split("_")[0]
                     try:
-                        with open("/sys/devices/platform/%s/%s_label" %
-                                  (entry, sensor), 'r') as fsensor:
+                        with replay.open("/sys/devices/platform/%s/%s_label"
+                                         % (entry, sensor)) as fsensor:
                             label_name = fsensor.readline()
                             label_name = label_name.strip().replace(" ", "_")
                     except Exception:
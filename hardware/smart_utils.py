@@ -10,10 +10,12 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import asyncio
 import os
-import subprocess
 import sys
 
+from hardware import replay
+from hardware import runner
 from hardware import smart_utils_info
 
 
@@ -57,7 +59,18 @@ def read_smart_scsi_error_log(hwlst, line, device_name, error_log):
                       result[7].strip()))
 
 
+async def _smartctl(cmdline, limit):
+    result = await runner.run_async(cmdline, limit=limit, cached=True)
+    return result.stdout.splitlines()
+
+
 def read_smart_scsi(hwlst, device, optional_flag="", mode=""):
+    return asyncio.run(read_smart_scsi_async(hwlst, device, optional_flag,
+                                             mode))
+
+
+async def read_smart_scsi_async(hwlst, device, optional_flag="", mode="",
+                                limit=None):
     optional_string = ""
     if optional_flag:
         optional_string = " with %s" % optional_flag
@@ -66,13 +79,11 @@ def read_smart_scsi(hwlst, device, optional_flag="", mode=""):
     if mode:
         device_name = "%s{%s}" % (device_name, optional_flag.split()[1])
 
-    sdparm_cmd = subprocess.Popen("smartctl -a %s %s" %
-                                  (device, optional_flag),
-                                  shell=True,
-                                  stdout=subprocess.PIPE)
+    stdout = await _smartctl(
+        ['smartctl', '-a', device] + optional_flag.split(), limit)
     vendor = ""
     product = ""
-    for line in sdparm_cmd.stdout:
+    for line in stdout:
         line = _parse_line(line)
 
         # This disk doesn't exists or doesn't support SMART
@@ -81,7 +92,8 @@ def read_smart_scsi(hwlst, device, optional_flag="", mode=""):
 
         # Being a SCSI raid controller, we can have ATA devices
         if line.startswith("ID#"):
-            return read_smart_ata(hwlst, device, optional_flag, mode)
+            return await read_smart_ata_async(hwlst, device, optional_flag,
+                                              mode, limit)
 
         temp = read_smart_field(hwlst, line, device_name, "Vendor:", "vendor")
         if temp:
@@ -101,15 +113,22 @@ def read_smart_scsi(hwlst, device, optional_flag="", mode=""):
             # Device is said no to support smart but on some RAID arrays
             # we can bypass it
             if optional_flag == "":
+                pdisks = []
                 if (vendor == "DELL") and ("PERC" in product):
-                    for pdisk_number in range(0, 24):
-                        read_smart_scsi(hwlst, device,
-                                        "-d megaraid,%d" % pdisk_number,
-                                        "megaraid")
+                    pdisks.extend(("-d megaraid,%d" % pdisk_number,
+                                   "megaraid")
+                                  for pdisk_number in range(0, 24))
                 if (vendor == "HP") and ("LOGICAL VOLUME" in product):
-                    for pdisk_number in range(0, 24):
-                        read_smart_scsi(hwlst, device,
-                                        "-d cciss,%d" % pdisk_number, "cciss")
+                    pdisks.extend(("-d cciss,%d" % pdisk_number, "cciss")
+                                  for pdisk_number in range(0, 24))
+                # query the physical disks concurrently
+                pdisk_lsts = [[] for _ in pdisks]
+                await asyncio.gather(*[
+                    read_smart_scsi_async(pdisk_lst, device, flag, pmode,
+                                          limit)
+                    for pdisk_lst, (flag, pmode) in zip(pdisk_lsts, pdisks)])
+                for pdisk_lst in pdisk_lsts:
+                    hwlst.extend(pdisk_lst)
             return hwlst
 
         for smart_info, hwlst_value in smart_utils_info.SMART_FIELDS.items():
@@ -123,6 +142,12 @@ def read_smart_scsi(hwlst, device, optional_flag="", mode=""):
 
 
 def read_smart_ata(hwlst, device, optional_flag="", mode=""):
+    return asyncio.run(read_smart_ata_async(hwlst, device, optional_flag,
+                                            mode))
+
+
+async def read_smart_ata_async(hwlst, device, optional_flag="", mode="",
+                               limit=None):
     foundid = False
     device_name = os.path.basename(device)
     optional_string = ""
@@ -133,10 +158,9 @@ def read_smart_ata(hwlst, device, optional_flag="", mode=""):
     if mode:
         device_name = "%s{%s}" % (device_name, optional_flag.split()[1])
 
-    sdparm_cmd = subprocess.Popen("smartctl -a %s %s" % (device,
-                                                         optional_flag),
-                                  shell=True, stdout=subprocess.PIPE)
-    for line in sdparm_cmd.stdout:
+    stdout = await _smartctl(
+        ['smartctl', '-a', device] + optional_flag.split(), limit)
+    for line in stdout:
         line = _parse_line(line)
 
         if read_smart_field(hwlst, line, device_name, "Device Model:",
@@ -200,43 +224,52 @@ def read_smart_ata(hwlst, device, optional_flag="", mode=""):
 
 
 def read_smart(hwlst, device, optional_flag=""):
+    return asyncio.run(read_smart_async(hwlst, device, optional_flag))
+
+
+async def read_smart_async(hwlst, device, optional_flag="", limit=None):
     optional_string = ""
     if optional_flag:
         optional_string = " with %s" % optional_flag
 
-    if os.path.exists(device):
+    if replay.exists(device):
         sys.stderr.write(
             "read_smart: Reading S.M.A.R.T information on %s%s\n" %
             (device, optional_string))
-        sdparm_cmd = subprocess.Popen("smartctl -a %s %s" %
-                                      (device,
-                                       optional_flag),
-                                      shell=True,
-                                      stdout=subprocess.PIPE)
-        for line in sdparm_cmd.stdout:
+        stdout = await _smartctl(
+            ['smartctl', '-a', device] + optional_flag.split(), limit)
+        for line in stdout:
             line = _parse_line(line)
 
             if (line.startswith("Device does not support SMART")
                     or ("Unavailable - device lacks SMART capability" in line)
                     or line.startswith(
                         "Device supports SMART and is Enabled")):
-                return read_smart_scsi(hwlst, device, optional_flag)
+                return await read_smart_scsi_async(hwlst, device,
+                                                   optional_flag,
+                                                   limit=limit)
 
             if line.startswith("ID#"):
-                return read_smart_ata(hwlst, device, optional_flag)
+                return await read_smart_ata_async(hwlst, device,
+                                                  optional_flag,
+                                                  limit=limit)
 
         # If no ID# was found, let's retry with "-d ata"
         if optional_flag == "":
-            return read_smart(hwlst, device, "-d ata")
+            return await read_smart_async(hwlst, device, "-d ata", limit)
 
     sys.stderr.write("read_smart: no device %s\n" % device)
     return
 
 
 def read_smart_nvme(hwlst, device_name):
+    return asyncio.run(read_smart_nvme_async(hwlst, device_name))
+
+
+async def read_smart_nvme_async(hwlst, device_name, limit=None):
     device_path = '/dev/%s' % device_name
 
-    if os.path.exists(device_path):
+    if replay.exists(device_path):
         sys.stderr.write(
             "read_smart_nvme: Reading S.M.A.R.T information on %s\n" %
             device_path)
@@ -244,11 +277,10 @@ def read_smart_nvme(hwlst, device_name):
         # to be compatible with smart tools version < 7.x we need
         # to specify the broadcast namespace
         # see https://www.smartmontools.org/ticket/1134 for details
-        sdparm_cmd = subprocess.Popen(
-            "smartctl -d nvme,0xffffffff -a %s" % device_path,
-            shell=True, stdout=subprocess.PIPE)
+        stdout = await _smartctl(
+            ['smartctl', '-d', 'nvme,0xffffffff', '-a', device_path], limit)
 
-        for line in sdparm_cmd.stdout:
+        for line in stdout:
             line = line.strip().decode(errors='ignore')
             for disk_info, info_tag in smart_utils_info.NVME_INFOS.items():
                 read_smart_field(hwlst, line, device_name, disk_info, info_tag)
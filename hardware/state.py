@@ -31,6 +31,8 @@ import time
 
 from hardware import cmdb
 from hardware import matcher
+from hardware import probe
+from hardware import typed
 
 _INVALID_SPECS = [('<unknown>', '<unknown>', '<unknown>', '<unknown>')]
 
@@ -49,6 +51,8 @@ class State(object):
         self._cfg_dir = cfg_dir
         self._lockname = lockname
         self._lock_fd = None
+        # compiled specs by profile name with the mtime of their file
+        self._compiled = {}
 
     def load(self, cfg_dir):
         'Load a state file from the given directory'
@@ -101,6 +105,24 @@ Returns True if the state is modified and needs to be saved.
 
         return _INVALID_SPECS
 
+    def _compiled_specs(self, name):
+        '''Return the compiled specs of a profile.
+
+Specs are compiled again only when the profile file changes.
+'''
+        mtime = None
+        if self._cfg_dir:
+            try:
+                mtime = os.stat(os.path.join(self._cfg_dir,
+                                             name + '.specs')).st_mtime_ns
+            except OSError:
+                pass
+        cached = self._compiled.get(name)
+        if cached is None or cached[0] != mtime:
+            cached = (mtime, matcher.compile_specs(self._load_specs(name)))
+            self._compiled[name] = cached
+        return cached[1]
+
     def _validate_lockname(self):
         if not self._lockname:
             self._lockname = os.path.join(self._cfg_dir, 'lock')
@@ -116,11 +138,14 @@ Returns the name of the matching profile.
         times = '*'
         name = None
         valid_roles = []
+        # parse the numbers and index the lines once for all the profiles
+        hw_items = matcher.LineIndex(typed.normalize(hw_items,
+                                                     probe.FIELDS))
         for name, times in self._data:
             LOG.info('testing %s' % name)
             if times == '*' or int(times) > 0:
                 valid_roles.append(name)
-                specs = self._load_specs(name)
+                specs = self._compiled_specs(name)
                 var = {}
                 var2 = {}
                 if matcher.match_all(hw_items, specs, var, var2):
@@ -0,0 +1,219 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Write the .specs of a hardware profile from inventories of its hosts.
+
+The specs only use the entries describing the hardware model, see
+fingerprint.IDENTITY. The devices matched by a type pattern (disks,
+NICs, memory banks...) get a $variable instead of their name and their
+entries share it. The values differing between the inventories become a
+range() of the values when they are numbers and are left out otherwise.
+
+The specs are ordered for matcher.match_all: the entries without
+variable first, then the devices, the ones with the fewest candidate
+entries first.
+"""
+
+import argparse
+import collections
+import pprint
+import re
+import sys
+
+from hardware import fingerprint
+from hardware import inventory
+from hardware import typed
+
+
+def _number(value):
+    try:
+        return typed.number(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _format(number):
+    if number == int(number):
+        return '%d' % number
+    # every digit is kept so the bounds still accept the values
+    return repr(number)
+
+
+def _condition(values, tolerance, at_least):
+    """Return the (operator, arguments) matching all the values."""
+    numbers = [_number(value) for value in values]
+    if any(number is None for number in numbers):
+        if all(value == values[0] for value in values):
+            return ('eq', values[0])
+        return None
+    low = min(numbers) * (1 - tolerance)
+    high = max(numbers) * (1 + tolerance)
+    if at_least:
+        return ('ge', low)
+    if low == high and all(value == values[0] for value in values):
+        return ('eq', values[0])
+    return ('range', low, high)
+
+
+def _literal(value):
+    """Return a spec matching value only.
+
+    The strings the matcher would take for a variable or a function are
+    matched by an anchored regexp instead, with the commas escaped so
+    they do not split its argument.
+    """
+    if not isinstance(value, str) or not (value.startswith('$')
+                                          or value.endswith(')')):
+        return value
+    return 'regexp(^%s$)' % re.escape(value).replace(',', r'\x2c')
+
+
+def _render(condition):
+    if condition[0] == 'eq':
+        return _literal(condition[1])
+    return '%s(%s)' % (condition[0],
+                       ', '.join(_format(arg) for arg in condition[1:]))
+
+
+def _accepts(condition, value):
+    if condition[0] == 'eq':
+        return value == condition[1]
+    number = _number(value)
+    if number is None:
+        return False
+    if condition[0] == 'ge':
+        return number >= condition[1]
+    return condition[1] <= number <= condition[2]
+
+
+def _sort_key(device):
+    return [(key, 0, _number(value), '') if _number(value) is not None
+            else (key, 1, 0, str(value))
+            for key, value in sorted(device.items())]
+
+
+def _devices(hw_lst, rules):
+    """Return the devices of hw_lst as a list by rule of {key: value}."""
+    by_class = fingerprint.compile_rules(rules)
+    devices = [collections.OrderedDict() for _ in rules]
+    for entry in hw_lst:
+        for idx, regexp, keys in by_class.get(entry[0], ()):
+            if entry[2] in keys and regexp.match(str(entry[1])):
+                device = devices[idx].setdefault(entry[1], {})
+                device.setdefault(entry[2], entry[3])
+                break
+    return [sorted(rule_devices.values(), key=_sort_key)
+            for rule_devices in devices]
+
+
+def _candidates(hw_lsts, cls, type_, key, condition):
+    """Return the maximum number of entries matching in an inventory."""
+    ret = 0
+    for hw_lst in hw_lsts:
+        ret = max(ret, sum(1 for entry in hw_lst
+                           if entry[0] == cls and entry[2] == key
+                           and (type_ is None or entry[1] == type_)
+                           and _accepts(condition, entry[3])))
+    return ret
+
+
+def synthesize(hw_lsts, tolerance=0.0, at_least=False, rules=None):
+    """Return the specs matching all the inventories.
+
+    :param hw_lsts: list of inventories, lists of (class, type, key,
+        value) tuples, of hosts of the same hardware model
+    :param tolerance: relative margin added to the ranges of numbers,
+        e.g. 0.05
+    :param at_least: True to accept bigger numbers with ge() instead of
+        range()
+    :param rules: list of (class, type, keys) tuples selecting the
+        entries, fingerprint.IDENTITY when None
+    :returns: list of (class, type, key, value) specs
+    """
+    if not hw_lsts:
+        raise ValueError('No inventory to synthesize the specs from')
+    if rules is None:
+        rules = fingerprint.IDENTITY
+    devices = [_devices(hw_lst, rules) for hw_lst in hw_lsts]
+    fixed = []
+    groups = []
+    for idx, (cls, type_, _) in enumerate(rules):
+        per_unit = any(char in type_ for char in '*?[')
+        count = min(len(devices[host][idx]) for host in range(len(hw_lsts)))
+        for unit in range(count):
+            units = [devices[host][idx][unit]
+                     for host in range(len(hw_lsts))]
+            keys = [key for key in sorted(units[0])
+                    if all(key in other for other in units)]
+            name = None if per_unit else type_
+            lines = []
+            for key in keys:
+                condition = _condition([other[key] for other in units],
+                                       tolerance, at_least)
+                if condition is None:
+                    continue
+                candidates = _candidates(hw_lsts, cls, name, key, condition)
+                lines.append((candidates, (cls, name, key,
+                                           _render(condition))))
+            if not lines:
+                continue
+            if not per_unit:
+                fixed.extend(lines)
+                continue
+            # the most selective entry binds the variable of the device
+            lines.sort(key=lambda line: line[0])
+            groups.append((lines[0][0], cls, lines))
+    specs = [spec for _, spec in sorted(fixed, key=lambda line: line[0])]
+    names = collections.Counter()
+    for _, cls, lines in sorted(groups, key=lambda group: group[0]):
+        var = '$%s%d' % (cls, names[cls])
+        names[cls] += 1
+        specs.extend((spec[0], var, spec[2], spec[3]) for _, spec in lines)
+    return specs
+
+
+def parse_args(arguments):
+    """Parse the arguments of hardware-synthesize."""
+    parser = argparse.ArgumentParser(
+        description=('Write the specs of a hardware profile matching the '
+                     'inventories of its hosts'))
+    parser.add_argument('inventories',
+                        help='JSON inventories written by hardware-detect',
+                        nargs='+',
+                        metavar='INVENTORY')
+    parser.add_argument('--tolerance',
+                        help=('Relative margin of the ranges of numbers, '
+                              'e.g. 0.05 (default: %(default)s)'),
+                        type=float,
+                        default=0.0)
+    parser.add_argument('--at-least',
+                        help=('Accept bigger numbers than the ones of the '
+                              'inventories'),
+                        action='store_true',
+                        default=False)
+    return parser.parse_args(arguments)
+
+
+def main():
+    """Command line entry point."""
+    args = parse_args(sys.argv[1:])
+    hw_lsts = []
+    for filename in args.inventories:
+        try:
+            with open(filename) as fileobj:
+                hw_lsts.append(inventory.load(fileobj))
+        except (IOError, ValueError) as excpt:
+            sys.stderr.write('Error: cannot load %s: %s\n'
+                             % (filename, excpt))
+            sys.exit(2)
+    pprint.pprint(synthesize(hw_lsts, tolerance=args.tolerance,
+                             at_least=args.at_least))
@@ -19,15 +19,33 @@ import sys
 import xml.etree.ElementTree as ET
 
 from hardware import detect_utils
+from hardware import inventory
+from hardware import replay
 
 
 SIOCGIFNETMASK = 0x891b
 
 
+def _link_address(output):
+    """Return the address of the first link line of ip addr show."""
+    for line in output.split('\n'):
+        if 'link' in line:
+            fields = line.split()
+            return fields[1] if len(fields) > 1 else ''
+    return ''
+
+
+def _get_netmask(name):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    return socket.inet_ntoa(
+        fcntl.ioctl(sock, SIOCGIFNETMASK,
+                    struct.pack('256s', name.encode('utf-8')))[20:24])
+
+
 def detect(output=None):
     """Detect system characteristics from the output of lshw."""
 
-    hw_lst = []
+    hw_lst = inventory.Inventory()
 
     def _find_element(xml, xml_spec, sys_subtype,
                       sys_type='product', sys_cls='system',
@@ -49,7 +67,7 @@ def detect(output=None):
     if output:
         status = 0
     else:
-        status, output = detect_utils.cmd('lshw -xml')
+        status, output = detect_utils.cmd(['lshw', '-xml'])
     if status == 0:
         mobo_id = ''
         nic_id = ''
@@ -122,6 +140,7 @@ def detect(output=None):
         if bank_count > 0:
             hw_lst.append(('memory', 'banks', 'count', str(bank_count)))
 
+        nics = []
         for elt in xml.findall(".//node[@class='network']"):
             name = elt.find('logicalname')
             if name is not None:
@@ -135,13 +154,9 @@ def detect(output=None):
                                      'ipv4',
                                      name.text, 'network', 'value')
                 if ipv4 is not None:
-                    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
                     try:
-                        netmask = socket.inet_ntoa(
-                            fcntl.ioctl(
-                                sock, SIOCGIFNETMASK,
-                                struct.pack('256s',
-                                            name.text.encode('utf-8')))[20:24])
+                        netmask = replay.call('netmask', name.text,
+                                              _get_netmask, name.text)
                         hw_lst.append(
                             ('network', name.text, 'ipv4-netmask', netmask))
                         cidr = detect_utils.get_cidr(netmask)
@@ -172,13 +187,13 @@ def detect(output=None):
                 # lshw is not able to get the complete mac addr for ib
                 # devices Let's workaround it with an ip command.
                 if name.text.startswith('ib'):
-                    cmds = "ip addr show %s | grep link | awk '{print $2}'"
-                    status_ip, output_ip = detect_utils.cmd(cmds % name.text)
+                    status_ip, output_ip = detect_utils.cmd(
+                        ['ip', 'addr', 'show', name.text])
                     if status_ip == 0:
                         hw_lst.append(('network',
                                        name.text,
                                        'serial',
-                                       output_ip.split('\n')[0].lower()))
+                                       _link_address(output_ip).lower()))
                 else:
                     _find_element(elt, 'serial', 'serial', name.text,
                                   'network', transform=lambda x: x.lower())
@@ -188,8 +203,13 @@ def detect(output=None):
                         hw_lst, 'network', name.text, 'serial')
                     nic_id = nic_id.replace(':', '')
 
-                detect_utils.get_ethtool_status(hw_lst, name.text)
-                detect_utils.get_lld_status(hw_lst, name.text)
+                nics.append((name.text, len(hw_lst)))
+
+        # ethtool and lldptool run concurrently for all the interfaces,
+        # their results are inserted after the lshw data of each one.
+        status = detect_utils.get_network_status([nic for nic, _ in nics])
+        for (_, position), nic_lst in reversed(list(zip(nics, status))):
+            hw_lst[position:position] = nic_lst
 
         detect_utils.fix_bad_serial(hw_lst, uuid, mobo_id, nic_id)
 
@@ -199,25 +219,79 @@ def detect(output=None):
 
     detect_utils.get_cpus(hw_lst)
 
-    osvendor_cmd = detect_utils.output_lines("lsb_release -is")
+    osvendor_cmd = detect_utils.output_lines(['lsb_release', '-is'])
     for line in osvendor_cmd:
         hw_lst.append(('system', 'os', 'vendor', line.rstrip('\n').strip()))
 
-    osinfo_cmd = detect_utils.output_lines("lsb_release -ds | tr -d '\"'")
+    osinfo_cmd = detect_utils.output_lines(['lsb_release', '-ds'])
     for line in osinfo_cmd:
-        hw_lst.append(('system', 'os', 'version', line.rstrip('\n').strip()))
+        hw_lst.append(('system', 'os', 'version',
+                       line.replace('"', '').strip()))
 
-    uname_cmd = detect_utils.output_lines("uname -r")
+    uname_cmd = detect_utils.output_lines(['uname', '-r'])
     for line in uname_cmd:
         hw_lst.append(('system', 'kernel', 'version',
                        line.rstrip('\n').strip()))
 
-    arch_cmd = detect_utils.output_lines("uname -i")
+    arch_cmd = detect_utils.output_lines(['uname', '-i'])
     for line in arch_cmd:
         hw_lst.append(('system', 'kernel', 'arch', line.rstrip('\n').strip()))
 
-    cmdline_cmd = detect_utils.output_lines("cat /proc/cmdline")
-    for line in cmdline_cmd:
+    try:
         hw_lst.append(('system', 'kernel', 'cmdline',
-                       line.rstrip('\n').strip()))
+                       detect_utils.from_file('/proc/cmdline').strip()))
+    except IOError:
+        pass
+    return hw_lst
+
+
+def _decimalkilos(value):
+    """Format a number like lshw does, e.g. 1000000000 -> 1G."""
+    prefixes = 'KMGTPEZY'
+    idx = 0
+    while idx <= len(prefixes) and (value > 10000 or value % 1000 == 0):
+        value = value // 1000
+        idx += 1
+    if 0 < idx <= len(prefixes):
+        return '%d%s' % (value, prefixes[idx - 1])
+    return '%d' % value
+
+
+def detect_links(system_lst):
+    """Read the link state of the network interfaces found by detect().
+
+    The values are read from sysfs and formatted like lshw does.
+
+    :param system_lst: the output of detect()
+    """
+    hw_lst = []
+    names = []
+    for entry in system_lst:
+        if entry[0] == 'network' and entry[1] not in names:
+            names.append(entry[1])
+
+    for name in names:
+        sysfs = '/sys/class/net/%s/' % name
+        if not replay.exists(sysfs):
+            continue
+        try:
+            carrier = detect_utils.from_file(sysfs + 'carrier')
+        except IOError:
+            # reading the carrier of an interface down fails
+            carrier = '0'
+        hw_lst.append(('network', name, 'link',
+                       'yes' if carrier == '1' else 'no'))
+        try:
+            speed = int(detect_utils.from_file(sysfs + 'speed'))
+        except (IOError, ValueError):
+            speed = -1
+        if speed > 0:
+            hw_lst.append(('network', name, 'speed',
+                           _decimalkilos(speed * 1000000) + 'bit/s'))
+        try:
+            duplex = detect_utils.from_file(sysfs + 'duplex')
+        except IOError:
+            duplex = None
+        if duplex in ('full', 'half'):
+            hw_lst.append(('network', name, 'duplex', duplex))
     return hw_lst
@@ -15,12 +15,12 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-import subprocess
 import unittest
 from unittest import mock
 
 from hardware.benchmark import cpu
 from hardware.benchmark import utils
+from hardware import runner
 
 
 SYSBENCH_OUTPUT = """Test execution summary:
@@ -40,7 +40,7 @@ Threads fairness:
 
 @mock.patch.object(cpu, 'search_cpuinfo')
 @mock.patch.object(utils, 'get_one_cpu_per_socket')
-@mock.patch.object(subprocess, 'Popen')
+@mock.patch.object(runner, 'run')
 class TestBenchmarkCPU(unittest.TestCase):
 
     def setUp(self):
@@ -88,13 +88,23 @@ class TestBenchmarkCPU(unittest.TestCase):
 
     def test_run_sysbench_cpu_bytes(self, mock_popen, mock_cpu_socket,
                                     mock_search_info):
-        mock_popen.return_value = mock.Mock(
-            stdout=SYSBENCH_OUTPUT.encode().splitlines())
+        mock_popen.return_value = runner.Result(
+            [], 0, SYSBENCH_OUTPUT.encode(), b'')
         hw_data = []
         cpu.run_sysbench_cpu(hw_data, 10, 1)
-        mock_popen.assert_called_once_with(' sysbench --max-time=10 '
-                                           '--max-requests=10000000 '
-                                           '--num-threads=1 --test=cpu '
-                                           '--cpu-max-prime=15000 run',
-                                           shell=True, stdout=subprocess.PIPE)
+        mock_popen.assert_called_once_with(['sysbench', '--max-time=10',
+                                            '--max-requests=10000000',
+                                            '--num-threads=1', '--test=cpu',
+                                            '--cpu-max-prime=15000', 'run'])
         self.assertEqual([('cpu', 'logical', 'loops_per_sec', '123')], hw_data)
+
+    def test_run_sysbench_cpu_taskset(self, mock_popen, mock_cpu_socket,
+                                      mock_search_info):
+        mock_popen.return_value = runner.Result(
+            [], 0, SYSBENCH_OUTPUT.encode(), b'')
+        hw_data = []
+        cpu.run_sysbench_cpu(hw_data, 10, 1, 3)
+        self.assertEqual(mock_popen.call_args[0][0][:3],
+                         ['taskset', '0x8', 'sysbench'])
+        self.assertEqual([('cpu', 'logical_3', 'loops_per_sec', '123')],
+                         hw_data)
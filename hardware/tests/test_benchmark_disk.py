@@ -20,6 +20,7 @@ import unittest
 from unittest import mock
 
 from hardware.benchmark import disk
+from hardware import runner
 
 
 FIO_OUTPUT_READ = """{
@@ -66,7 +67,14 @@ DISK_PERF_EXPECTED = [
 ]
 
 
-@mock.patch.object(subprocess, 'check_output')
+FIO_RESULT = runner.Result([], 0, FIO_OUTPUT_READ.encode('utf-8'), b'')
+
+MOUNTS = """/dev/sda1 / ext4 rw,relatime 0 0
+/dev/sdb2 /ahcexport ext4 rw,relatime 0 0
+"""
+
+
+@mock.patch.object(runner, 'run', return_value=FIO_RESULT)
 class TestBenchmarkDisk(unittest.TestCase):
 
     def setUp(self):
@@ -74,21 +82,36 @@ class TestBenchmarkDisk(unittest.TestCase):
         self.hw_data = [('disk', 'fake-disk', 'size', '10'),
                         ('disk', 'fake-disk2', 'size', '15')]
 
-    def test_disk_perf_bytes(self, mock_check_output):
-        mock_check_output.return_value = FIO_OUTPUT_READ.encode('utf-8')
+    def test_disk_perf_bytes(self, mock_run):
         disk.disk_perf(self.hw_data)
         self.assertEqual(sorted(DISK_PERF_EXPECTED), sorted(self.hw_data))
 
-    def test_get_disks_name(self, mock_check_output):
+    def test_get_disks_name(self, mock_run):
         result = disk.get_disks_name(self.hw_data)
         self.assertEqual(sorted(['fake-disk', 'fake-disk2']), sorted(result))
 
-    def test_run_fio(self, mock_check_output):
-        mock_check_output.return_value = FIO_OUTPUT_READ.encode('utf-8')
+    def test_is_booted_storage_device(self, mock_run):
+        with mock.patch('builtins.open', mock.mock_open(read_data=MOUNTS)):
+            self.assertTrue(disk.is_booted_storage_device('sdb'))
+            self.assertFalse(disk.is_booted_storage_device('/dev/sda'))
+
+    def test_run_fio(self, mock_run):
         hw_data = []
         disks_list = ['fake-disk', 'fake-disk2']
         disk.run_fio(hw_data, disks_list, "read", 123, 10, 5)
+        mock_run.assert_any_call(['hdparm', '-f', '/dev/fake-disk'])
+        fio = mock_run.call_args[0][0]
+        self.assertEqual(fio[0], 'fio')
+        self.assertEqual(fio[-4:], ['--name=MYJOB-fake-disk',
+                                    '--filename=/dev/fake-disk',
+                                    '--name=MYJOB-fake-disk2',
+                                    '--filename=/dev/fake-disk2'])
         self.assertEqual(sorted(
             [('disk', 'fake-disk', 'simultaneous_read_123_KBps', '123456'),
              ('disk', 'fake-disk', 'simultaneous_read_123_IOps', '123')]),
             sorted(hw_data))
+
+    def test_run_fio_error(self, mock_run):
+        mock_run.return_value = runner.Result([], 1, b'', b'no libaio')
+        self.assertRaises(subprocess.CalledProcessError, disk.run_fio, [],
+                          ['fake-disk'], "read", 123, 10, 5)
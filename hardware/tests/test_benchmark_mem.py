@@ -15,12 +15,12 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-import subprocess
 import unittest
 from unittest import mock
 
 from hardware.benchmark import mem
 from hardware.benchmark import utils
+from hardware import runner
 
 
 SYSBENCH_OUTPUT = """Operations performed: 1957354 (391412.04 ops/sec)
@@ -42,6 +42,8 @@ Threads fairness:
     events (avg/stddev):           1957354.0000/0.00
     execution time (avg/stddev):   3.0686/0.00"""
 
+RESULT = runner.Result([], 0, SYSBENCH_OUTPUT.encode(), b'')
+
 EXPECTED_RESULT = [
     ('cpu', 'logical', 'number', 2),
     ('cpu', 'physical', 'number', 2),
@@ -66,19 +68,20 @@ EXPECTED_RESULT = [
     ('cpu', 'logical', 'threaded_bandwidth_128M', '382'),
     ('cpu', 'logical', 'threaded_bandwidth_1G', '382'),
     ('cpu', 'logical', 'threaded_bandwidth_2G', '382'),
-    ('cpu', 'logical', 'forked_bandwidth_1K', '382'),
-    ('cpu', 'logical', 'forked_bandwidth_4K', '382'),
-    ('cpu', 'logical', 'forked_bandwidth_1M', '382'),
-    ('cpu', 'logical', 'forked_bandwidth_16M', '382'),
-    ('cpu', 'logical', 'forked_bandwidth_128M', '382'),
-    ('cpu', 'logical', 'forked_bandwidth_1G', '382'),
-    ('cpu', 'logical', 'forked_bandwidth_2G', '382')
+    ('cpu', 'logical', 'forked_bandwidth_1K', '764'),
+    ('cpu', 'logical', 'forked_bandwidth_4K', '764'),
+    ('cpu', 'logical', 'forked_bandwidth_1M', '764'),
+    ('cpu', 'logical', 'forked_bandwidth_16M', '764'),
+    ('cpu', 'logical', 'forked_bandwidth_128M', '764'),
+    ('cpu', 'logical', 'forked_bandwidth_1G', '764'),
+    ('cpu', 'logical', 'forked_bandwidth_2G', '764')
 ]
 
 
 @mock.patch.object(mem, 'get_available_memory')
 @mock.patch.object(utils, 'get_one_cpu_per_socket')
-@mock.patch.object(subprocess, 'Popen')
+@mock.patch.object(runner, 'run_many')
+@mock.patch.object(runner, 'run')
 class TestBenchmarkMem(unittest.TestCase):
 
     def setUp(self):
@@ -86,18 +89,19 @@ class TestBenchmarkMem(unittest.TestCase):
         self.hw_data = [('cpu', 'logical', 'number', 2),
                         ('cpu', 'physical', 'number', 2)]
 
-    def test_mem_perf_bytes(self, mock_popen, mock_cpu_socket,
+    def test_mem_perf_bytes(self, mock_run, mock_run_many, mock_cpu_socket,
                             mock_get_memory):
         mock_get_memory.return_value = 123456789012
-        mock_popen.return_value = mock.Mock(
-            stdout=SYSBENCH_OUTPUT.encode().splitlines())
+        mock_run.return_value = RESULT
+        mock_run_many.side_effect = lambda cmdlines, concurrency: (
+            [RESULT] * len(cmdlines))
         mock_cpu_socket.return_value = range(2)
         mem.mem_perf(self.hw_data)
 
         expected = EXPECTED_RESULT
         self.assertEqual(sorted(expected), sorted(self.hw_data))
 
-    def test_check_mem_size(self, mock_popen, mock_cpu_socket,
+    def test_check_mem_size(self, mock_run, mock_run_many, mock_cpu_socket,
                             mock_get_memory):
         block_size_list = ('1K', '4K', '1M', '16M', '128M', '1G', '2G')
 
@@ -110,24 +114,31 @@ class TestBenchmarkMem(unittest.TestCase):
         for block_size in block_size_list:
             self.assertFalse(mem.check_mem_size(block_size, 2))
 
-    def test_run_sysbench_memory_forked_bytes(self, mock_popen,
+    def test_run_sysbench_memory_forked_bytes(self, mock_run, mock_run_many,
                                               mock_cpu_socket,
                                               mock_get_memory):
         mock_get_memory.return_value = 123456789012
-        mock_popen.return_value = mock.Mock(
-            stdout=SYSBENCH_OUTPUT.encode().splitlines())
+        mock_run.return_value = RESULT
+        mock_run_many.side_effect = lambda cmdlines, concurrency: (
+            [RESULT] * len(cmdlines))
 
         hw_data = []
         mem.run_sysbench_memory_forked(hw_data, 10, '1K', 2)
-        self.assertEqual([('cpu', 'logical', 'forked_bandwidth_1K', '382')],
+        self.assertEqual([('cpu', 'logical', 'forked_bandwidth_1K', '764')],
                          hw_data)
+        cmdline = ['sysbench', '--max-time=10', '--max-requests=100000000',
+                   '--num-threads=1', '--test=memory',
+                   '--memory-block-size=1K', 'run']
+        mock_run_many.assert_called_once_with([cmdline, cmdline],
+                                              concurrency=2)
 
-    def test_run_sysbench_memory_threaded_bytes(self, mock_popen,
+    def test_run_sysbench_memory_threaded_bytes(self, mock_run, mock_run_many,
                                                 mock_cpu_socket,
                                                 mock_get_memory):
         mock_get_memory.return_value = 123456789012
-        mock_popen.return_value = mock.Mock(
-            stdout=SYSBENCH_OUTPUT.encode().splitlines())
+        mock_run.return_value = RESULT
+        mock_run_many.side_effect = lambda cmdlines, concurrency: (
+            [RESULT] * len(cmdlines))
 
         hw_data = []
         mem.run_sysbench_memory_threaded(hw_data, 10, '1K', 2)
@@ -0,0 +1,73 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from hardware import cache
+from hardware import probe
+
+
+class TestCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'sub', 'detect.json')
+        self.keys = {'boot_id': 'abc', 'extra': []}
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_cache_keys(self):
+        keys = cache.cache_keys(['rack1'])
+        self.assertEqual(keys['extra'], ['rack1'])
+        self.assertEqual(keys, cache.cache_keys(['rack1']))
+
+    def test_load_missing(self):
+        self.assertEqual(cache.load(self.filename, self.keys), {})
+
+    def test_save_load(self):
+        probes = [probe.Probe('disk', list),
+                  probe.Probe('sensors', list, volatile=True),
+                  probe.Probe('hung', list)]
+        results = {'disk': [('disk', 'sda', 'size', '100')],
+                   'sensors': [('cpu', 'temp', '0', '40')],
+                   'hung': probe.timeout_result('hung')}
+        cache.save(self.filename, self.keys, probes, results,
+                   {'system': [('system', 'product', 'name', 'x')]})
+        self.assertEqual(cache.load(self.filename, self.keys),
+                         {'disk': [('disk', 'sda', 'size', '100')],
+                          'system': [('system', 'product', 'name', 'x')]})
+        self.assertEqual(
+            cache.load(self.filename, {'boot_id': 'def', 'extra': []}), {})
+
+    def test_apply(self):
+        cached = {'disk': [('disk', 'sda', 'size', '100'),
+                           ('disk', 'sda', 'SMART/power_on_hours', '3')],
+                  'sensors': [('cpu', 'temp', '0', '40')]}
+        sensors = probe.Probe('sensors', list, volatile=True)
+        system = probe.Probe('system', list)
+        refresh_probes = [
+            probe.Probe('smart', list, requires=('disk',),
+                        refreshes=[('disk', '*', 'SMART/*')]),
+            probe.Probe('link', list, requires=('system',))]
+        probes = cache.apply([probe.Probe('disk', list), sensors, system],
+                             cached, refresh_probes)
+        self.assertEqual([entry.name for entry in probes],
+                         ['disk', 'sensors', 'system', 'smart'])
+        self.assertIs(probes[1], sensors)
+        self.assertIs(probes[2], system)
+        self.assertIs(probes[3], refresh_probes[0])
+        self.assertEqual(probe.run_probes(probes[:1]),
+                         {'disk': [('disk', 'sda', 'size', '100')]})
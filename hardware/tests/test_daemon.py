@@ -0,0 +1,98 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import unittest
+
+from hardware import daemon
+from hardware import probe
+
+
+def _links(hw_lst):
+    return [('network', entry[1], 'link', 'no') for entry in hw_lst
+            if entry[2] == 'link']
+
+
+class TestDaemon(unittest.TestCase):
+
+    def setUp(self):
+        self.results = {
+            'system': [('network', 'eth0', 'link', 'yes'),
+                       ('network', 'eth0', 'serial', 'aa')],
+            'sensors': [('cpu', 'temp', '0', '40')],
+        }
+        self.samples = []
+
+        def sensors():
+            self.samples.append(time.monotonic())
+            return [('cpu', 'temp', '0', str(40 + len(self.samples)))]
+
+        self.samplers = [
+            probe.Probe('sensors', sensors),
+            probe.Probe('ipmi_sdr', list),
+            probe.Probe('link', _links, requires=('system',),
+                        refreshes=[('network', '*', 'link')]),
+        ]
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_collector(self):
+        collector = daemon.Collector(self.results, self.samplers)
+        self.assertEqual([sampler.name for sampler in collector.samplers],
+                         ['sensors', 'link'])
+        self.assertEqual(collector.inventory(),
+                         [('network', 'eth0', 'link', 'yes'),
+                          ('network', 'eth0', 'serial', 'aa'),
+                          ('cpu', 'temp', '0', '40')])
+        probe.run_probes(collector.probes(['sensors', 'link']),
+                         callback=collector.update)
+        self.assertEqual(collector.inventory(),
+                         [('network', 'eth0', 'serial', 'aa'),
+                          ('cpu', 'temp', '0', '41'),
+                          ('network', 'eth0', 'link', 'no')])
+
+    def test_serve(self):
+        output = os.path.join(self.tmpdir, 'inventory.json')
+        socket_path = os.path.join(self.tmpdir, 'inventory.sock')
+        collector = daemon.Collector(self.results, self.samplers)
+        stop = threading.Event()
+        thread = threading.Thread(
+            target=daemon.serve, args=(collector, {'sensors': 0.05}),
+            kwargs={'output': output, 'socket_path': socket_path,
+                    'stop': stop})
+        thread.start()
+        try:
+            deadline = time.monotonic() + 5
+            while len(self.samples) < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            client.connect(socket_path)
+            with client.makefile() as response:
+                hrdw = json.loads(response.read())
+            client.close()
+        finally:
+            stop.set()
+            thread.join(5)
+        self.assertGreaterEqual(len(self.samples), 2)
+        self.assertIn(['network', 'eth0', 'serial', 'aa'], hrdw)
+        with open(output) as inventory:
+            self.assertIn(['network', 'eth0', 'serial', 'aa'],
+                          json.load(inventory))
+        self.assertFalse(os.path.exists(socket_path))
@@ -0,0 +1,114 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from hardware import delta
+
+BASE = [('disk', 'sda', 'size', '500'),
+        ('disk', 'sda', 'SMART/temperature', '30'),
+        ('cpu', 'logical', 'number', 4),
+        ('system', 'product', 'serial', '0123')]
+
+
+class TestDelta(unittest.TestCase):
+
+    def test_hash(self):
+        self.assertEqual(delta.inventory_hash(BASE),
+                         delta.inventory_hash([list(entry)
+                                               for entry in BASE]))
+        self.assertNotEqual(delta.inventory_hash(BASE),
+                            delta.inventory_hash(BASE[1:]))
+
+    def test_round_trip(self):
+        new = list(BASE)
+        new[1] = ('disk', 'sda', 'SMART/temperature', '35')
+        new.insert(3, ('disk', 'sdb', 'size', '500'))
+        result = delta.make_delta(BASE, new)
+        self.assertEqual(result['base'], delta.inventory_hash(BASE))
+        self.assertEqual(result['ops'],
+                         [[0, 1],
+                          [('disk', 'sda', 'SMART/temperature', '35')],
+                          [2, 1],
+                          [('disk', 'sdb', 'size', '500')],
+                          [3, 1]])
+        # as received by the collector
+        received = json.loads(json.dumps(result))
+        self.assertEqual(delta.reconstruct(BASE, received), new)
+
+    def test_same(self):
+        result = delta.make_delta(BASE, BASE)
+        self.assertEqual(result['ops'], [[0, len(BASE)]])
+        self.assertEqual(result['base'], result['hash'])
+
+    def test_no_base(self):
+        result = delta.make_delta(None, BASE)
+        self.assertIsNone(result['base'])
+        self.assertEqual(delta.reconstruct(None, result), BASE)
+
+    def test_wrong_base(self):
+        result = delta.make_delta(BASE, BASE[1:])
+        self.assertRaises(delta.DeltaError, delta.reconstruct, BASE[1:],
+                          result)
+        self.assertRaises(delta.DeltaError, delta.reconstruct, None, result)
+        result['ops'] = [[2, 10]]
+        self.assertRaises(delta.DeltaError, delta.reconstruct, BASE, result)
+
+    def test_large(self):
+        base = [('disk', 'sd%d' % idx, 'SMART/attr%d' % attr, str(attr))
+                for idx in range(200) for attr in range(100)]
+        new = list(base)
+        for idx in range(0, len(new), 1000):
+            new[idx] = new[idx][0:3] + ('changed',)
+        start = time.monotonic()
+        result = delta.make_delta(base, new)
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertLess(len(json.dumps(result)), len(json.dumps(new)) / 50)
+        self.assertEqual(delta.reconstruct(base, result), new)
+
+    def test_save_load_base(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        directory = os.path.join(tmpdir.name, 'delta')
+        first = delta.inventory_hash(BASE)
+        delta.save(directory, BASE, first)
+        self.assertEqual(delta.load_base(directory, first), BASE)
+        self.assertIsNone(delta.load_base(directory, 'unknown'))
+        self.assertIsNone(delta.load_base(directory, None))
+        second = delta.inventory_hash(BASE[1:])
+        delta.save(directory, BASE[1:], second, keep=[first])
+        third = delta.inventory_hash(BASE[2:])
+        delta.save(directory, BASE[2:], third, keep=[second])
+        self.assertEqual(sorted(os.listdir(directory)),
+                         sorted([second + '.json', third + '.json']))
+
+    def test_save_concurrent(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        first = delta.inventory_hash(BASE)
+        # temporary file of another writer of the same inventory
+        other = os.path.join(tmpdir.name, first + '.json.1')
+        with open(other, 'w') as fileobj:
+            fileobj.write('[')
+        delta.save(tmpdir.name, BASE, first)
+        delta.save(tmpdir.name, BASE, first)
+        self.assertEqual(delta.load_base(tmpdir.name, first), BASE)
+        self.assertEqual(sorted(os.listdir(tmpdir.name)),
+                         [first + '.json', first + '.json.1'])
+
+
+if __name__ == "__main__":
+    unittest.main()
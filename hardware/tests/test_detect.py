@@ -0,0 +1,78 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import io
+import unittest
+from unittest import mock
+
+from hardware import detect
+
+
+class TestDetect(unittest.TestCase):
+
+    def test_write_stream(self):
+        output = io.StringIO()
+        detect.write_stream([('disk', 'sda', 'model', b'ST\xff'),
+                             (),
+                             ('disk', 'sda', 'size', 100)], output)
+        self.assertEqual(output.getvalue(),
+                         '["disk", "sda", "model", "ST\\ufffd"]\n'
+                         '["disk", "sda", "size", 100]\n')
+
+    def test_parse_args_probe_timeout(self):
+        args = detect.parse_args(['--probe-timeout', 'ipmi_sdr=30'])
+        self.assertEqual(args.probe_timeout, [('ipmi_sdr', 30.0)])
+        with self.assertRaises(SystemExit):
+            detect.parse_args(['--probe-timeout', 'ipmi_sdrs=30'])
+
+    @mock.patch('hardware.probe.run_probes',
+                return_value={'system': [('system', 'product', 'name',
+                                          'S1')]})
+    def test_main_probe_timeout_not_selected(self, run_probes):
+        with mock.patch('sys.argv', ['hardware-detect', '--only', 'system',
+                                     '--probe-timeout', 'ipmi_sdr=30',
+                                     '--probe-timeout', 'system=5']), \
+                mock.patch('sys.stdout', io.StringIO()) as output:
+            detect.main()
+        self.assertEqual(run_probes.call_args[1]['timeouts'],
+                         {'system': 5.0})
+        self.assertEqual(output.getvalue(),
+                         '[["system", "product", "name", "S1"]]\n')
+
+    def test_parse_args_stream(self):
+        self.assertTrue(detect.parse_args(['--stream']).stream)
+        with self.assertRaises(SystemExit):
+            detect.parse_args(['--stream', '-H'])
+
+    def test_parse_args_daemon(self):
+        args = detect.parse_args(['--daemon', '--socket', '/run/hw.sock',
+                                  '--sample-interval', 'ipmi_sdr=300'])
+        self.assertEqual(args.sample_interval, [('ipmi_sdr', 300.0)])
+        with self.assertRaises(SystemExit):
+            detect.parse_args(['--daemon'])
+        with self.assertRaises(SystemExit):
+            detect.parse_args(['--daemon', '--output', 'hw.json',
+                               '--sample-interval', 'system=10'])
+
+    def test_parse_args_delta(self):
+        args = detect.parse_args(['--delta', '/var/lib/hw', '--delta-ack',
+                                  'abc'])
+        self.assertEqual((args.delta, args.delta_ack), ('/var/lib/hw', 'abc'))
+        with self.assertRaises(SystemExit):
+            detect.parse_args(['--delta-ack', 'abc'])
+        with self.assertRaises(SystemExit):
+            detect.parse_args(['--delta', '/var/lib/hw', '--stream'])
+
+    def test_parse_args_fingerprint(self):
+        self.assertTrue(detect.parse_args(['--fingerprint']).fingerprint)
+        with self.assertRaises(SystemExit):
+            detect.parse_args(['--fingerprint', '--stream'])
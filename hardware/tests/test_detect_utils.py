@@ -10,11 +10,11 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
-import subprocess
 import unittest
 from unittest import mock
 
 from hardware import detect_utils
+from hardware import runner
 from hardware.tests.results import detect_utils_results
 from hardware.tests.utils import sample
 
@@ -42,21 +42,16 @@ class TestDetectUtils(unittest.TestCase):
                                         b'h\xc3\xa9llo', 1)]),
             [(u'\ufffd' * 4, u'\ufffd' * 4, u'h\xe9llo', 1)])
 
-    @mock.patch.object(subprocess, 'Popen')
+    @mock.patch.object(detect_utils, 'output_lines',
+                       return_value=['System Information',
+                                     '\tManufacturer: Dell Inc.',
+                                     '\tUUID: 83462C81-52BA-11CB-870F',
+                                     '\tWake-up Type: Power Switch'])
     @mock.patch('os.uname', return_value=('', '', '', '', 'x86_64'))
-    def test_get_uuid_x86_64(self, mock_uname, mock_popen):
-        # This is more complex and 'magic' than I'd like :/
-        process_mock = mock.Mock()
-        attrs = {'communicate.return_value': ('83462C81-52BA-11CB-870F', '')}
-        process_mock.configure_mock(**attrs)
-        mock_popen.return_value = process_mock
-
+    def test_get_uuid_x86_64(self, mock_uname, mock_output_lines):
         hw_list = []
         system_uuid = detect_utils.get_uuid(hw_list)
-        mock_popen.assert_has_calls([
-            mock.call("dmidecode -t 1 | grep UUID | " "awk '{print $2}'",
-                      shell=True, stdout=subprocess.PIPE,
-                      universal_newlines=True)])
+        mock_output_lines.assert_called_once_with(['dmidecode', '-t', '1'])
         self.assertEqual('83462C81-52BA-11CB-870F', system_uuid)
 
     @mock.patch('os.uname', return_value=('', '', '', '', 'ppc64le'))
@@ -230,9 +225,9 @@ class TestDetectUtils(unittest.TestCase):
                                '64bit apst clo ems led '
                                'ncq part pio slum sntf')])
 
-    @mock.patch.object(detect_utils, 'Popen')
+    @mock.patch.object(runner, 'run')
     @mock.patch('os.environ.copy')
-    def test_detect_auxv_x86_succeed(self, mock_environ_copy, mock_popen):
+    def test_detect_auxv_x86_succeed(self, mock_environ_copy, mock_run):
         test_data = {
             'AT_HWCAP': ('hwcap', 'bfebfbff'),
             'AT_HWCAP2': ('hwcap2', '0x0'),
@@ -241,11 +236,8 @@ class TestDetectUtils(unittest.TestCase):
             'AT_PLATFORM': ('platform', 'x86_64'),
         }
 
-        process_mock = mock.Mock()
-        attrs = {'communicate.return_value': (
-            sample('auxv_x86').encode('utf-8'), None)}
-        process_mock.configure_mock(**attrs)
-        mock_popen.return_value = process_mock
+        mock_run.return_value = runner.Result(
+            ['/bin/true'], 0, sample('auxv_x86').encode('utf-8'), b'')
 
         hw = detect_utils.detect_auxv()
 
@@ -254,9 +246,9 @@ class TestDetectUtils(unittest.TestCase):
             t = ('hw', 'auxv', test_data[k][0], test_data[k][1])
             self.assertIn(t, hw)
 
-    @mock.patch.object(detect_utils, 'Popen')
+    @mock.patch.object(runner, 'run')
     @mock.patch('os.environ.copy')
-    def test_detect_auxv_ppc8_succeed(self, mock_environ_copy, mock_popen):
+    def test_detect_auxv_ppc8_succeed(self, mock_environ_copy, mock_run):
         test_data = {
             'AT_HWCAP': ('hwcap',
                          'true_le archpmu vsx arch_2_06 dfp ic_snoop smt '
@@ -269,11 +261,8 @@ class TestDetectUtils(unittest.TestCase):
             'AT_BASE_PLATFORM': ('base_platform', 'power8'),
         }
 
-        process_mock = mock.Mock()
-        attrs = {'communicate.return_value': (
-            sample('auxv_ppc8').encode('utf-8'), None)}
-        process_mock.configure_mock(**attrs)
-        mock_popen.return_value = process_mock
+        mock_run.return_value = runner.Result(
+            ['/bin/true'], 0, sample('auxv_ppc8').encode('utf-8'), b'')
 
         hw = detect_utils.detect_auxv()
 
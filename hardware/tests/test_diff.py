@@ -0,0 +1,114 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import io
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from hardware import diff
+
+OLD = [('disk', 'sda', 'size', '500'),
+       ('disk', 'sda', 'model', 'X1'),
+       ('disk', 'sda', 'SMART/temperature', '30'),
+       ('disk', 'sdb', 'size', '500'),
+       ('network', 'eth0', 'serial', 'aa:bb'),
+       ('cpu', 'physical_0', 'flags', 'fpu'),
+       ('cpu', 'physical_0', 'flags', 'sse')]
+NEW = [('disk', 'sda', 'size', '1000'),
+       ('disk', 'sda', 'model', 'X1'),
+       ('disk', 'sda', 'SMART/temperature', '35'),
+       ('disk', 'sdc', 'size', '500'),
+       ('network', 'eth0', 'serial', 'aa:bb'),
+       ('cpu', 'physical_0', 'flags', 'sse'),
+       ('cpu', 'physical_0', 'flags', 'fpu'),
+       ('cpu', 'physical_0', 'flags', 'avx')]
+
+
+class TestDiff(unittest.TestCase):
+
+    def test_same(self):
+        self.assertEqual(diff.diff(OLD, list(reversed(OLD))), {})
+
+    def test_diff(self):
+        self.assertEqual(
+            diff.diff(OLD, NEW),
+            {('cpu', 'physical_0'): {'added': [('flags', 'avx')],
+                                     'removed': [], 'changed': []},
+             ('disk', 'sda'): {'added': [], 'removed': [],
+                               'changed': [('size', '500', '1000'),
+                                           ('SMART/temperature', '30',
+                                            '35')]},
+             ('disk', 'sdb'): {'added': [], 'removed': [('size', '500')],
+                               'changed': []},
+             ('disk', 'sdc'): {'added': [('size', '500')], 'removed': [],
+                               'changed': []}})
+
+    def test_ignore_volatile(self):
+        result = diff.diff(OLD, NEW, ignore_volatile=True,
+                           ignore=[('disk', 'sd[bc]', '*')])
+        self.assertEqual(list(result), [('cpu', 'physical_0'),
+                                        ('disk', 'sda')])
+        self.assertEqual(result[('disk', 'sda')]['changed'],
+                         [('size', '500', '1000')])
+
+    def test_volatile_declared_by_probes(self):
+        self.assertIn(('ipmi', '*', '*'), diff.VOLATILE)
+        self.assertIn(('disk', '*', 'SMART/*'), diff.VOLATILE)
+        self.assertIn(('hw', 'timing', '*'), diff.VOLATILE)
+        self.assertEqual(len(set(diff.VOLATILE)), len(diff.VOLATILE))
+
+    def test_format_diff(self):
+        self.assertEqual(diff.format_diff(diff.diff(OLD[:2], NEW[:1])),
+                         'disk/sda\n'
+                         '  - model: X1\n'
+                         '  ~ size: 500 -> 1000')
+
+    def test_large(self):
+        old = [('disk', 'sd%d' % idx, 'SMART/attr%d' % attr, str(attr))
+               for idx in range(200) for attr in range(100)]
+        new = list(old)
+        new[1234] = new[1234][0:3] + ('changed',)
+        start = time.monotonic()
+        result = diff.diff(old, new)
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(result[('disk', 'sd12')]['changed'],
+                         [('SMART/attr34', '34', 'changed')])
+
+    def test_main(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        names = []
+        for name, hw_lst in (('old', OLD), ('new', NEW)):
+            names.append(os.path.join(tmpdir.name, name))
+            with open(names[-1], 'w') as fileobj:
+                json.dump(hw_lst, fileobj)
+        output = io.StringIO()
+        with mock.patch('sys.argv', ['hardware-diff', '--json',
+                                     '--ignore', 'cpu/*/*'] + names), \
+                mock.patch('sys.stdout', output):
+            self.assertRaises(SystemExit, diff.main)
+        self.assertEqual([[group['class'], group['type']]
+                          for group in json.loads(output.getvalue())],
+                         [['disk', 'sda'], ['disk', 'sdb'],
+                          ['disk', 'sdc']])
+
+    def test_parse_args_invalid_ignore(self):
+        self.assertRaises(SystemExit, diff.parse_args,
+                          ['old', 'new', '--ignore', 'disk'])
+
+
+if __name__ == "__main__":
+    unittest.main()
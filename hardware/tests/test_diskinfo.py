@@ -65,6 +65,31 @@ class TestDiskinfo(unittest.TestCase):
                               ('disk', 'fake', 'nr_requests', '1023'),
                               ('disk', 'fake', 'scheduler', 'none')])
 
+    @mock.patch('hardware.detect_utils.from_file',
+                side_effect=['running', IOError()])
+    def test_detect_disk_states(self, mock_from_file):
+        self.assertEqual(
+            diskinfo.detect_disk_states([('disk', 'sda', 'size', '100'),
+                                         ('disk', 'sda', 'model', 'x'),
+                                         ('disk', 'nvme0n1', 'size', '200')]),
+            [('disk', 'sda', 'state', 'running')])
+        mock_from_file.assert_called_with('/sys/block/nvme0n1/device/state')
+
+    @mock.patch.object(diskinfo, 'get_disk_smart_async')
+    def test_detect_smart(self, mock_get_disk_smart):
+        async def smart(name, hw_lst, limit):
+            hw_lst.append(('disk', name, 'SMART/power_on_hours', '4'))
+
+        mock_get_disk_smart.side_effect = smart
+        result = diskinfo.detect_smart(
+            [('disk', 'logical', 'count', '2'),
+             ('disk', 'sda', 'size', '100'),
+             ('disk', 'sda', 'SMART/power_on_hours', '3'),
+             ('disk', 'nvme0n1', 'size', '200')])
+        self.assertEqual(result,
+                         [('disk', 'sda', 'SMART/power_on_hours', '4'),
+                          ('disk', 'nvme0n1', 'SMART/power_on_hours', '4')])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,74 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import unittest
+
+from hardware import fingerprint
+
+HW_LST = [('system', 'product', 'name', 'R640'),
+          ('system', 'product', 'serial', 'ABC123'),
+          ('cpu', 'physical', 'number', '2'),
+          ('cpu', 'physical_0', 'product', 'Xeon 6130'),
+          ('cpu', 'physical_0', 'current_Mhz', '2100'),
+          ('cpu', 'physical_1', 'product', 'Xeon 6130'),
+          ('memory', 'bank:0', 'size', '17179869184'),
+          ('memory', 'bank:0', 'slot', 'A1'),
+          ('memory', 'bank:0', 'serial', '1234'),
+          ('disk', 'sda', 'model', 'ST1000'),
+          ('disk', 'sda', 'size', '1000'),
+          ('disk', 'sda', 'SMART/temperature', '30'),
+          ('disk', 'sdb', 'model', 'MZ7 '),
+          ('disk', 'sdb', 'size', '480'),
+          ('network', 'eth0', 'product', 'X710'),
+          ('network', 'eth0', 'serial', 'aa:bb:cc:dd:ee:ff'),
+          ('network', 'tap0', 'serial', '11:22:33:44:55:66')]
+
+
+class TestFingerprint(unittest.TestCase):
+
+    def test_identity(self):
+        self.assertEqual(
+            fingerprint.identity(HW_LST),
+            [['system', 'product', [[['name', 'R640']]]],
+             ['cpu', 'physical', [[['number', '2']]]],
+             ['cpu', 'physical_*', [[['product', 'Xeon 6130']],
+                                    [['product', 'Xeon 6130']]]],
+             ['memory', 'bank:*', [[['size', '17179869184'],
+                                    ['slot', 'A1']]]],
+             ['disk', '*', [[['model', 'MZ7'], ['size', '480']],
+                            [['model', 'ST1000'], ['size', '1000']]]],
+             ['network', '*', [[['product', 'X710']]]]])
+
+    def test_same_model(self):
+        other = [(cls, type_.replace('sda', 'sdc'), key,
+                  value if key not in ('serial', 'SMART/temperature')
+                  else value + '0')
+                 for cls, type_, key, value in reversed(HW_LST)]
+        self.assertEqual(fingerprint.fingerprint(HW_LST),
+                         fingerprint.fingerprint(other))
+
+    def test_different_model(self):
+        other = [entry if entry[2:] != ('size', '480')
+                 else entry[0:3] + ('960',) for entry in HW_LST]
+        self.assertNotEqual(fingerprint.fingerprint(HW_LST),
+                            fingerprint.fingerprint(other))
+        self.assertNotEqual(fingerprint.fingerprint(HW_LST),
+                            fingerprint.fingerprint(HW_LST[:-4]))
+
+    def test_rules(self):
+        self.assertEqual(
+            fingerprint.identity(HW_LST, [('disk', 'sd*', ('model',))]),
+            [['disk', 'sd*', [[['model', 'MZ7']], [['model', 'ST1000']]]]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -46,6 +46,20 @@ class TestInfiniband(unittest.TestCase):
                           'sm_lid': '0',
                           'state': 'Down'})
 
+    @mock.patch('hardware.detect_utils.output_lines',
+                return_value=['03:00.0 0200: 15b3:1015'])
+    def test_detect_no_infiniband(self, mock_lines, cmd_mock):
+        self.assertEqual(hardware.infiniband.detect(), [])
+        mock_lines.assert_called_once_with(['lspci', '-d', '15b3:', '-n'])
+        cmd_mock.assert_not_called()
+
+    @mock.patch.object(hardware.infiniband, 'ib_card_drv', return_value=[])
+    @mock.patch('hardware.detect_utils.output_lines',
+                return_value=['04:00.0 0280: 15b3:673c (rev b0)'])
+    def test_detect(self, mock_lines, mock_card_drv, cmd_mock):
+        self.assertEqual(hardware.infiniband.detect(), [])
+        mock_card_drv.assert_called_once_with()
+
 
 if __name__ == "__main__":
     unittest.main()
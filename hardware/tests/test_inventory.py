@@ -0,0 +1,147 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import io
+import json
+import unittest
+
+from hardware.benchmark import utils
+from hardware import detect_utils
+from hardware import inventory
+
+HW_LST = [('disk', 'sda', 'size', '500'),
+          ('disk', 'sda', 'vendor', 'ATA'),
+          ('disk', 'sdb', 'size', '1000'),
+          ('system', 'product', 'serial', '0123456789'),
+          ('disk', 'sda', 'size', '501')]
+
+
+class TestInventory(unittest.TestCase):
+
+    def test_list(self):
+        inv = inventory.Inventory(HW_LST)
+        self.assertEqual(inv, HW_LST)
+        self.assertEqual(list(inv), HW_LST)
+        self.assertEqual(json.dumps(inv), json.dumps(HW_LST))
+
+    def test_lookup(self):
+        inv = inventory.Inventory(HW_LST)
+        self.assertEqual(inv.lookup('disk', 'sda', 'size'),
+                         [('disk', 'sda', 'size', '500'),
+                          ('disk', 'sda', 'size', '501')])
+        self.assertEqual(inv.get('disk', 'sda', 'size'), '500')
+        self.assertIsNone(inv.get('disk', 'sdc', 'size'))
+
+    def test_select(self):
+        inv = inventory.Inventory(HW_LST)
+        self.assertEqual(inv.select('disk', key='size'),
+                         [('disk', 'sda', 'size', '500'),
+                          ('disk', 'sda', 'size', '501'),
+                          ('disk', 'sdb', 'size', '1000')])
+        self.assertEqual(inv.select('disk', 'sdb'),
+                         [('disk', 'sdb', 'size', '1000')])
+        self.assertEqual(inv.types('disk'), ['sda', 'sdb'])
+
+    def test_append_extend(self):
+        inv = inventory.Inventory()
+        self.assertIsNone(inv.get('disk', 'sdc', 'size'))
+        inv.append(('disk', 'sdc', 'size', '10'))
+        inv += [('disk', 'sdd', 'size', '20')]
+        self.assertEqual(inv.get('disk', 'sdc', 'size'), '10')
+        self.assertEqual(inv.types('disk'), ['sdc', 'sdd'])
+
+    def test_modified(self):
+        inv = inventory.Inventory(HW_LST)
+        self.assertEqual(inv.get('disk', 'sda', 'size'), '500')
+        inv.remove(('disk', 'sda', 'size', '500'))
+        self.assertEqual(inv.get('disk', 'sda', 'size'), '501')
+        inv[0:0] = [('disk', 'sda', 'size', '499')]
+        self.assertEqual(inv.get('disk', 'sda', 'size'), '499')
+        del inv[:]
+        self.assertEqual(inv.types('disk'), [])
+
+    def test_lookup_list(self):
+        self.assertEqual(inventory.lookup(HW_LST, 'disk', 'sdb', 'size'),
+                         [('disk', 'sdb', 'size', '1000')])
+
+    def test_get_value(self):
+        inv = inventory.Inventory(HW_LST)
+        self.assertEqual(detect_utils.get_value(inv, 'disk', 'sdb', 'size'),
+                         '1000')
+        self.assertEqual(detect_utils.get_value(inv, 'disk', 'sdc', 'size'),
+                         '')
+        self.assertEqual(utils.get_value(inv, 'disk', 'sdb', 'size'), '1000')
+        self.assertIsNone(utils.get_value(inv, 'disk', 'sdc', 'size'))
+
+    def test_fix_bad_serial(self):
+        inv = inventory.Inventory(HW_LST)
+        detect_utils.fix_bad_serial(inv, 'uuid', '', '')
+        self.assertEqual(inv.get('system', 'product', 'serial'), 'uuid')
+        self.assertEqual(len(inv), len(HW_LST))
+
+
+class TestCompactInventory(unittest.TestCase):
+
+    def test_round_trip(self):
+        inv = inventory.CompactInventory(HW_LST)
+        self.assertEqual(len(inv), len(HW_LST))
+        self.assertEqual(list(inv), HW_LST)
+        self.assertEqual(inv, HW_LST)
+        self.assertEqual(inv[-1], HW_LST[-1])
+        self.assertEqual(inv[1:3], HW_LST[1:3])
+
+    def test_shared_vocabulary(self):
+        vocabulary = inventory.Vocabulary()
+        first = inventory.CompactInventory(HW_LST, vocabulary)
+        size = len(vocabulary)
+        second = inventory.CompactInventory(HW_LST, vocabulary)
+        self.assertEqual(len(vocabulary), size)
+        self.assertEqual(first, second)
+        self.assertEqual(first.nbytes(), 4 * 4 * len(HW_LST))
+
+    def test_types_kept(self):
+        inv = inventory.CompactInventory([('cpu', 'logical', 'number', 1),
+                                          ('cpu', 'physical', 'number', '1'),
+                                          ('cpu', 'x', 'y', 1.0),
+                                          ('cpu', 'x', 'z', True)])
+        self.assertEqual([type(entry[3]) for entry in inv],
+                         [int, str, float, bool])
+
+    def test_select(self):
+        inv = inventory.CompactInventory(HW_LST)
+        self.assertEqual(inv.select('disk', key='size'),
+                         [('disk', 'sda', 'size', '500'),
+                          ('disk', 'sdb', 'size', '1000'),
+                          ('disk', 'sda', 'size', '501')])
+        self.assertEqual(inv.select('disk', 'sdc'), [])
+
+    def test_invalid_entry(self):
+        self.assertRaises(ValueError, inventory.CompactInventory,
+                          [('disk', 'sda', 'size')])
+
+    def test_load_compact(self):
+        inv = inventory.load_compact(io.StringIO(json.dumps(HW_LST)))
+        self.assertEqual(inv, HW_LST)
+        ndjson = ''.join(json.dumps(entry) + '\n' for entry in HW_LST)
+        self.assertEqual(inventory.load_compact(io.StringIO(ndjson)),
+                         HW_LST)
+
+    def test_load_single_entry(self):
+        for content in ('["disk", "sdab", "size", "100"]\n',
+                        '["disk", "sda", "size", "100"]'):
+            self.assertEqual(inventory.load(io.StringIO(content)),
+                             [tuple(json.loads(content))])
+        self.assertEqual(inventory.load(io.StringIO('[]')), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
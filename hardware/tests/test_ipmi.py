@@ -13,8 +13,10 @@
 # under the License.
 
 import unittest
+from unittest import mock
 
 from hardware import ipmi
+from hardware import runner
 from hardware.tests.results import ipmi_results
 from hardware.tests.utils import sample
 
@@ -28,3 +30,24 @@ class TestIpmi(unittest.TestCase):
         res = []
         ipmi.parse_lan_info(sample('ipmi_lan_info'), res)
         self.assertEqual(len(res), 19)
+
+    @mock.patch('hardware.detect_utils.cmd', return_value=(1, ''))
+    @mock.patch('hardware.replay.exists', return_value=True)
+    @mock.patch('hardware.runner.run_many')
+    def test_detect_channel(self, mock_run_many, mock_exists, mock_cmd):
+        mock_run_many.return_value = [
+            runner.Result([], 1, b'', b'Invalid channel'),
+            runner.Result([], 0, b'  Volatile(active) Settings\n', b'')]
+        self.assertEqual(ipmi.detect(),
+                         [('system', 'ipmi', 'channel', '1')])
+        self.assertEqual(mock_run_many.call_args[0][0][1],
+                         ['ipmitool', 'channel', 'info', '1'])
+
+    @mock.patch('hardware.detect_utils.from_file',
+                return_value='BOOT_IMAGE=/vmlinuz fakeipmi\n')
+    @mock.patch('hardware.detect_utils.cmd', return_value=(1, ''))
+    @mock.patch('hardware.replay.exists', return_value=False)
+    def test_detect_fake(self, mock_exists, mock_cmd, mock_from_file):
+        self.assertEqual(ipmi.detect(),
+                         [('system', 'ipmi-fake', 'channel', '0')])
+        mock_from_file.assert_called_once_with('/proc/cmdline')
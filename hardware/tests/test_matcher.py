@@ -12,6 +12,9 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import ipaddress
+import re
+import time
 import unittest
 
 from hardware import matcher
@@ -439,6 +442,390 @@ class TestMatcher(unittest.TestCase):
         self.assertEqual(result['eth'], ['eth0'])
 
 
+def _jbod(count, model=None):
+    lines = []
+    for idx in range(count):
+        disk = 'sd%d' % idx
+        lines.extend([('disk', disk, 'size', '1000'),
+                      ('disk', disk, 'model', 'ST1000'),
+                      ('disk', disk, 'serial', 'Z%d' % idx),
+                      ('disk', disk, 'SMART/temperature', str(30 + idx))])
+    if model:
+        lines[-3] = ('disk', 'sd%d' % (count - 1), 'model', model)
+    return lines
+
+
+class TestBacktracking(unittest.TestCase):
+
+    SPECS = [spec for idx in range(60)
+             for spec in (('disk', '$disk%d' % idx, 'size', '1000'),
+                          ('disk', '$disk%d' % idx, 'model', 'ST1000'))]
+
+    def test_jbod(self):
+        start = time.monotonic()
+        arr = {}
+        self.assertTrue(matcher.match_all(_jbod(60), self.SPECS, arr, {}))
+        self.assertEqual(len(set(arr.values())), 60)
+        for lines in (_jbod(59), _jbod(60, 'MZ7')):
+            arr = {'host': 'node1'}
+            self.assertFalse(matcher.match_all(lines, self.SPECS, arr, {}))
+            self.assertEqual(arr, {'host': 'node1'})
+        self.assertLess(time.monotonic() - start, 1)
+
+    def test_deep(self):
+        # the last spec only matches the last disk
+        specs = [('disk', '$disk%d' % idx, 'size', '1000')
+                 for idx in range(60)]
+        specs.append(('disk', '$disk0', 'model', 'MZ7'))
+        arr = {}
+        self.assertTrue(matcher.match_all(_jbod(60, 'MZ7'), specs, arr, {}))
+        self.assertEqual(arr['disk0'], 'sd59')
+        self.assertEqual(len(set(arr.values())), 60)
+
+    def test_operator_error_on_excluded_line(self):
+        # le() is never called on 'B' once $d2 is bound to net0
+        lines = [('net', 'net0', 'size', '10'),
+                 ('net', 'net0', 'model', '20'),
+                 ('net', 'net1', 'size', 'B')]
+        specs = [('net', '$d2', '$k', 'le(20)'),
+                 ('net', '$d2', 'size', '$v')]
+        arr = {}
+        self.assertTrue(matcher.match_all(lines, specs, arr, {}))
+        self.assertEqual(arr, {'d2': 'net0', 'k': 'model', 'v': '10'})
+
+    def test_operator_error_is_no_match(self):
+        lines = [('disk', 'eth1', 'size', '20'),
+                 ('net', 'eth1', 'vendor', 'B'),
+                 ('disk', 'sda', 'vendor', '30'),
+                 ('disk', 'eth1', 'model', 'B'),
+                 ('net', 'sda', 'size', '20'),
+                 ('net', 'sda', 'size', 'B'),
+                 ('disk', 'sda', 'model', 'X')]
+        specs = [('disk', '$d1', 'vendor', '$t'),
+                 ('net', '$d1', 'size', 'le(20)'),
+                 ('net', '$$x', 'vendor', '20')]
+        for mode in (matcher.SEARCH, matcher.ASSIGNMENT):
+            arr = {}
+            self.assertFalse(matcher.match_all(lines, specs, arr, {},
+                                               mode=mode))
+            self.assertEqual(arr, {})
+        lines[1] = ('net', 'eth1', 'vendor', '20')
+        self.assertTrue(matcher.match_all(lines, specs, {}, {}))
+
+    def test_other_line_of_failed_device(self):
+        lines = [('net', 'net0', 'size', '20'),
+                 ('net', 'net0', 'model', '10'),
+                 ('net', 'net2', 'size', '20'),
+                 ('net', 'net1', 'size', '20'),
+                 ('net', 'net2', 'size', '30')]
+        specs = [('net', '$d1', '$k', 'gt(15)'),
+                 ('net', '$d1', 'size', 'le(20)')]
+        arr = {}
+        self.assertTrue(matcher.match_all(lines, specs, arr, {}))
+        self.assertEqual(arr, {'d1': 'net2', 'k': 'size'})
+
+    def test_function_on_type(self):
+        specs = [('disk', '$disk', 'size', '1000'),
+                 ('disk', '$other=regexp(^sd1$)', 'size', '1000'),
+                 ('disk', '$disk', 'serial', 'Z0')]
+        arr = {}
+        self.assertTrue(matcher.match_all(_jbod(2), specs, arr, {}))
+        self.assertEqual(arr, {'disk': 'sd0', 'other': 'sd1'})
+
+
+class TestAssignment(unittest.TestCase):
+
+    SPECS = TestBacktracking.SPECS
+
+    def test_jbod(self):
+        start = time.monotonic()
+        arr = {}
+        self.assertTrue(matcher.match_all(_jbod(60), self.SPECS, arr, {},
+                                          mode=matcher.ASSIGNMENT))
+        self.assertEqual(arr, dict(('disk%d' % idx, 'sd%d' % idx)
+                                   for idx in range(60)))
+        for lines in (_jbod(59), _jbod(60, 'MZ7')):
+            arr = {'host': 'node1'}
+            self.assertFalse(matcher.match_all(lines, self.SPECS, arr, {},
+                                               mode=matcher.ASSIGNMENT))
+            self.assertEqual(arr, {'host': 'node1'})
+        self.assertLess(time.monotonic() - start, 0.2)
+
+    def test_deep(self):
+        specs = [('disk', '$disk%d' % idx, 'size', '1000')
+                 for idx in range(60)]
+        specs.append(('disk', '$disk0', 'model', 'MZ7'))
+        arr = {}
+        self.assertTrue(matcher.match_all(_jbod(60, 'MZ7'), specs, arr, {},
+                                          mode=matcher.ASSIGNMENT))
+        self.assertEqual(arr['disk0'], 'sd59')
+        self.assertEqual(len(set(arr.values())), 60)
+
+    def test_bindings(self):
+        specs = [('system', 'product', 'name', '$$name'),
+                 ('disk', '$disk1', 'model', 'MZ7'),
+                 ('disk', '$disk1', 'serial', '$serial1'),
+                 ('disk', '$disk0', 'size', 'ge(1000)'),
+                 ('disk', '$disk0', 'serial', '$serial0')]
+        lines = [('system', 'product', 'name', 'S1')] + _jbod(2, 'MZ7')
+        arr = {}
+        arr2 = {}
+        self.assertTrue(matcher.match_all(lines, specs, arr, arr2,
+                                          mode=matcher.ASSIGNMENT))
+        self.assertEqual(arr, {'name': 'S1',
+                               'disk0': 'sd0', 'serial0': 'Z0',
+                               'disk1': 'sd1', 'serial1': 'Z1'})
+        self.assertEqual(arr2, {'name': 'S1'})
+
+    def test_backtrack_other_specs(self):
+        # the regexp spec must leave the size of sd1 to $disk
+        specs = [('disk', '$other=regexp(^sd)', 'size', '1000'),
+                 ('disk', '$disk', 'size', '1000'),
+                 ('disk', '$disk', 'model', 'MZ7')]
+        lines = [('disk', 'sd1', 'size', '1000'),
+                 ('disk', 'sd1', 'model', 'MZ7'),
+                 ('disk', 'sd0', 'size', '1000')]
+        arr = {}
+        self.assertTrue(matcher.match_all(lines, specs, arr, {},
+                                          mode=matcher.ASSIGNMENT))
+        self.assertEqual(arr, {'other': 'sd0', 'disk': 'sd1'})
+
+    def test_bound_variable(self):
+        arr = {'disk': 'sd1'}
+        self.assertTrue(matcher.match_all(_jbod(2),
+                                          [('disk', '$disk', 'size', '1000')],
+                                          arr, {}, mode=matcher.ASSIGNMENT))
+        self.assertEqual(arr, {'disk': 'sd1'})
+
+    def test_distinct_devices(self):
+        # unlike the default mode, $d2 and $d3 cannot bind the same disk
+        lines = [('disk', 'sda', 'size', '20'),
+                 ('disk', 'sda', 'model', '30')]
+        specs = [('disk', '$d3', 'size', '$x=gt(15)'),
+                 ('disk', '$d2', 'model', 'gt(15)')]
+        self.assertTrue(matcher.match_all(lines, specs, {}, {}))
+        self.assertFalse(matcher.match_all(lines, specs, {}, {},
+                                           mode=matcher.ASSIGNMENT))
+        lines += [('disk', 'sdb', 'size', '20'),
+                  ('disk', 'sdb', 'model', '30')]
+        arr = {}
+        self.assertTrue(matcher.match_all(lines, specs, arr, {},
+                                          mode=matcher.ASSIGNMENT))
+        self.assertNotEqual(arr['d2'], arr['d3'])
+
+    def test_unknown_mode(self):
+        self.assertRaises(ValueError, matcher.match_all, [], [], {}, {},
+                          mode='greedy')
+
+    def test_max_matching(self):
+        self.assertEqual(matcher._max_matching([['a', 'b'], ['a'], ['c']]),
+                         ['b', 'a', 'c'])
+        self.assertEqual(matcher._max_matching([['a'], ['a']]), ['a', None])
+
+
+class TestOperators(unittest.TestCase):
+
+    def _register(self, name, func=None, **kwargs):
+        self.addCleanup(matcher.unregister_operator, name)
+        return matcher.register_operator(name, func, **kwargs)
+
+    def test_builtin(self):
+        operator = matcher.get_operator('range')
+        self.assertEqual((operator.min_args, operator.max_args), (2, 2))
+        operator = matcher.get_operator('in')
+        self.assertEqual((operator.min_args, operator.max_args), (0, None))
+        self.assertIsNone(matcher.get_operator('version_ge'))
+
+    def test_register(self):
+        spec = ('firmware', 'bios', 'version', 'version_ge(2.10)')
+        line = ('firmware', 'bios', 'version', '2.9')
+        self.assertFalse(matcher.match_spec(spec, [line], {}))
+
+        @self._register('version_ge', prepare={0: str})
+        def version_ge(value, minimum):
+            return ([int(part) for part in value.split('.')]
+                    >= [int(part) for part in minimum.split('.')])
+
+        self.assertFalse(matcher.match_spec(spec, [line], {}))
+        line = ('firmware', 'bios', 'version', '2.10')
+        self.assertTrue(matcher.match_spec(spec, [line], {}))
+        self.assertTrue(matcher.match_spec(
+            ('firmware', 'bios', 'version', 'not(version_ge(3.0))'),
+            [line], {}))
+
+    def test_arity(self):
+        self.assertRaises(ValueError, matcher.compile_spec,
+                          ('disk', '$disk', 'size', 'range(10)'))
+        self._register('between', lambda value, *bounds: True,
+                       arity=(1, 2))
+        matcher.compile_spec(('disk', '$disk', 'size', 'between(1, 2)'))
+        self.assertRaises(ValueError, matcher.compile_spec,
+                          ('disk', '$disk', 'size', 'between(1, 2, 3)'))
+        with self.assertRaisesRegex(ValueError,
+                                    r'^gt\(\) takes 1 argument, 2 given$'):
+            matcher.compile_spec(('disk', '$disk', 'size', 'gt(1, 2)'))
+        with self.assertRaisesRegex(ValueError,
+                                    r'takes 1 to 2 arguments, 3 given$'):
+            matcher.compile_spec(('disk', '$disk', 'size',
+                                  'between(1, 2, 3)'))
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, matcher.register_operator, 'a b',
+                          lambda value: True)
+        self.assertRaises(ValueError, matcher.register_operator, 'none',
+                          lambda: True)
+        self.assertRaises(KeyError, matcher.unregister_operator, 'none')
+
+
+class TestNetwork(unittest.TestCase):
+
+    def test_network_ipv6(self):
+        spec = ('network', '$eth', 'ipv6', 'network(2001:db8::/32)')
+        self.assertTrue(matcher.match_spec(
+            spec, [('network', 'eth0', 'ipv6', '2001:db8::1')], {}))
+        self.assertFalse(matcher.match_spec(
+            spec, [('network', 'eth0', 'ipv6', '2001:db9::1')], {}))
+        self.assertFalse(matcher.match_spec(
+            spec, [('network', 'eth0', 'ipv6', '10.0.0.1')], {}))
+        compiled = matcher.compile_spec(spec)
+        self.assertIsInstance(compiled.fields[3].call.args[0],
+                              ipaddress.IPv6Network)
+
+    def test_network_any(self):
+        prefixes = ['10.%d.0.0/16' % idx for idx in range(0, 100, 2)]
+        prefixes += ['10.4.1.0/24', '192.168.0.0/23', '192.168.1.0/24',
+                     '2001:db8::/32']
+        spec = ('network', '$eth', 'ipv4',
+                'network_any(%s)' % ', '.join(prefixes))
+        compiled = matcher.compile_spec(spec)
+        for address, result in (('10.4.1.7', True),
+                                ('10.98.255.255', True),
+                                ('10.3.0.1', False),
+                                ('10.100.0.1', False),
+                                ('9.255.255.255', False),
+                                ('192.168.1.200', True),
+                                ('192.168.2.1', False),
+                                ('2001:db8::1', True),
+                                ('::1', False)):
+            self.assertEqual(
+                compiled.match(('network', 'eth0', 'ipv4', address), {})
+                is not None, result, address)
+
+    def test_network_any_invalid(self):
+        spec = ('network', '$eth', 'ipv4', 'network_any(10.0.0.1/8)')
+        self.assertRaises(ValueError, matcher.match_spec, spec,
+                          [('network', 'eth0', 'ipv4', '10.0.0.1')], {})
+
+
+class TestCompiledSpec(unittest.TestCase):
+
+    def test_compile_spec(self):
+        spec = ('disk', '$disk', 'size', '$size=gt(10)')
+        compiled = matcher.compile_spec(spec)
+        self.assertIs(matcher.compile_spec(compiled), compiled)
+        self.assertIs(matcher.compile_spec(spec), compiled)
+        self.assertEqual(compiled.variables, ('disk', 'size'))
+        self.assertEqual(repr(compiled), repr(spec))
+
+    def test_operands(self):
+        compiled = matcher.compile_spec(
+            ('network', '$eth', 'serial', 'regexp(^28:d2:)'))
+        self.assertIsInstance(compiled.fields[3].call.args[0],
+                              type(re.compile('')))
+        compiled = matcher.compile_spec(('disk', '$disk', 'size', 'gt(10)'))
+        self.assertEqual(compiled.fields[3].call.args[0].number, 10)
+
+    def test_match_all_compiled(self):
+        specs = matcher.compile_specs([('disk', '$disk', 'size', 'gt(10)'),
+                                       ('disk', '$disk', 'type', 'b')])
+        lines = [('disk', 'vda', 'size', '20'),
+                 ('disk', 'vda', 'type', 'a'),
+                 ('disk', 'vdb', 'size', '20'),
+                 ('disk', 'vdb', 'type', 'b')]
+        for _ in range(2):
+            arr = {}
+            self.assertTrue(matcher.match_all(lines, specs, arr, {}))
+            self.assertEqual(arr, {'disk': 'vdb'})
+        arr = {}
+        self.assertTrue(matcher.match_multiple(lines, specs[0], arr))
+        self.assertEqual(arr, {'disk': ['vda', 'vdb']})
+
+    def test_unknown_function(self):
+        spec = ('disk', '$disk', 'model', 'foo(1)')
+        self.assertFalse(matcher.match_spec(
+            spec, [('disk', 'vda', 'model', 'foo(1)')], {}))
+        self.assertTrue(matcher.match_spec(
+            ('disk', 'vda', 'model', 'foo(1)'),
+            [('disk', 'vda', 'model', 'foo(1)')], {}))
+
+    def test_var_function_not_matching(self):
+        arr = {}
+        self.assertFalse(matcher.match_spec(
+            ('disk', '$disk', 'size', '$size=gt(10)'),
+            [('disk', 'vda', 'size', '5')], arr))
+        self.assertEqual(arr, {})
+
+
+class TestLineIndex(unittest.TestCase):
+
+    LINES = [('disk', 'sda', 'size', '100'),
+             ('disk', 'sda', 'type', 'a'),
+             ('disk', 'sdb', 'size', '100'),
+             ('network', 'eth0', 'size', '100'),
+             ['disk', 'sdc', 'size', '200']]
+
+    def test_consume(self):
+        lines = matcher.LineIndex(self.LINES)
+        arr = {}
+        self.assertEqual(matcher.match_spec(('disk', '$disk', 'size', '100'),
+                                            lines, arr),
+                         ('disk', 'sda', 'size', '100'))
+        self.assertEqual(matcher.match_spec(('disk', '$disk2', 'size',
+                                             '100'), lines, arr),
+                         ('disk', 'sdb', 'size', '100'))
+        self.assertFalse(matcher.match_spec(('disk', '$disk3', 'size',
+                                             '100'), lines, arr))
+        self.assertEqual(arr, {'disk': 'sda', 'disk2': 'sdb'})
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(list(lines), [self.LINES[1], self.LINES[3],
+                                       self.LINES[4]])
+
+    def test_copy_append(self):
+        lines = matcher.LineIndex(self.LINES)
+        line = matcher.match_spec(('disk', 'sda', 'size', '100'), lines, {})
+        copy = lines.copy()
+        copy.append(line)
+        self.assertEqual(len(lines), 4)
+        self.assertEqual(list(copy)[-1], line)
+        self.assertEqual(matcher.match_spec(('disk', '$disk', '$key', '100'),
+                                            copy, {}),
+                         ('disk', 'sdb', 'size', '100'))
+        self.assertEqual(matcher.match_spec(('disk', '$disk', '$key', '100'),
+                                            copy, {}), line)
+
+    def test_candidates(self):
+        lines = matcher.LineIndex(self.LINES)
+        self.assertEqual(
+            list(lines.positions(matcher.compile_spec(
+                ('disk', '$disk', 'size', 'gt(1)')).literals)),
+            [0, 2, 4])
+        self.assertEqual(list(lines.positions({0: 'disk', 1: 'sda'})),
+                         [0, 1])
+        self.assertEqual(lines.find(['disk', 'sdc', 'size', '200']), 4)
+        self.assertIsNone(lines.find(('disk', 'sdc', 'size', '200')))
+
+    def test_large(self):
+        lines = [('disk', 'sd%d' % (idx % 50), 'SMART/attr%d' % idx, str(idx))
+                 for idx in range(5000)]
+        specs = [('disk', '$disk%d' % (idx % 50), 'SMART/attr%d' % idx,
+                  'ge(0)') for idx in range(4800, 5000)]
+        start = time.monotonic()
+        arr = {}
+        self.assertTrue(matcher.match_all(lines, specs, arr, {}))
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(arr['disk0'], 'sd0')
+
+
 if __name__ == "__main__":
     unittest.main()
 
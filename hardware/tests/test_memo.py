@@ -0,0 +1,141 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import asyncio
+import threading
+import time
+import unittest
+from unittest import mock
+
+from hardware import memo
+from hardware import probe
+from hardware import runner
+
+
+class TestMemo(unittest.TestCase):
+
+    def test_call_inactive(self):
+        func = mock.Mock(return_value=1)
+        self.assertEqual(memo.call('kind', 'key', func, 'arg'), 1)
+        self.assertEqual(memo.call('kind', 'key', func, 'arg'), 1)
+        self.assertEqual(func.call_count, 2)
+
+    def test_call(self):
+        func = mock.Mock(return_value=None)
+        with memo.run():
+            self.assertIsNone(memo.call('which', 'ls', func, 'ls'))
+            self.assertIsNone(memo.call('which', 'ls', func, 'ls'))
+            memo.call('which', 'cat', func, 'cat')
+        func.assert_has_calls([mock.call('ls'), mock.call('cat')])
+        self.assertEqual(func.call_count, 2)
+
+    def test_call_error_not_kept(self):
+        func = mock.Mock(side_effect=[OSError(), 'value'])
+        with memo.run():
+            self.assertRaises(OSError, memo.call, 'kind', 'key', func)
+            self.assertEqual(memo.call('kind', 'key', func), 'value')
+
+    def test_call_async_concurrent(self):
+        calls = []
+
+        async def query(arg):
+            calls.append(arg)
+            await asyncio.sleep(0.05)
+            return arg
+
+        async def main():
+            return await asyncio.gather(
+                *[memo.call_async('kind', 'key', query, idx)
+                  for idx in range(3)])
+
+        with memo.run():
+            self.assertEqual(asyncio.run(main()), [0, 0, 0])
+        self.assertEqual(calls, [0])
+
+    def test_call_async_waiter_deadline(self):
+        async def query(arg):
+            await asyncio.sleep(0.5)
+            return arg
+
+        async def main():
+            owner = asyncio.ensure_future(
+                memo.call_async('kind', 'key', query, 0))
+            await asyncio.sleep(0)
+            token = probe._DEADLINE.set(time.monotonic() + 0.05)
+            try:
+                start = time.monotonic()
+                with self.assertRaises(probe.ProbeTimeout):
+                    await memo.call_async('kind', 'key', query, 1)
+                self.assertLess(time.monotonic() - start, 0.4)
+            finally:
+                probe._DEADLINE.reset(token)
+            # the query of the owner goes on
+            return await owner
+
+        with memo.run():
+            self.assertEqual(asyncio.run(main()), 0)
+
+    def test_call_waiter_deadline(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def query():
+            started.set()
+            release.wait(1)
+            return 'value'
+
+        with memo.run():
+            owner = threading.Thread(target=memo.call,
+                                     args=('kind', 'key', query))
+            owner.start()
+            started.wait(1)
+            token = probe._DEADLINE.set(time.monotonic() + 0.05)
+            try:
+                self.assertRaises(probe.ProbeTimeout, memo.call, 'kind',
+                                  'key', query)
+            finally:
+                probe._DEADLINE.reset(token)
+                release.set()
+                owner.join()
+            self.assertEqual(memo.call('kind', 'key', query), 'value')
+
+    def test_run_cached(self):
+        def run():
+            return [runner.run(['echo', 'once'], cached=True).text
+                    for _ in range(3)]
+
+        stats = {}
+        with memo.run():
+            results = probe.run_probes([probe.Probe('echo', run)],
+                                       stats=stats)
+        self.assertEqual(results, {'echo': ['once\n'] * 3})
+        self.assertEqual(stats['echo'].subprocesses, 1)
+        self.assertEqual(stats['echo'].memo_hits, 2)
+        report = probe.timing_report(stats)
+        self.assertEqual(report['memo_hits'], 2)
+        # the command and the lookup of echo
+        self.assertEqual(report['memo_misses'], 2)
+
+    def test_run_not_cached(self):
+        with memo.run():
+            first = runner.run(['date', '+%N'])
+            second = runner.run(['date', '+%N'])
+        self.assertNotEqual(first.stdout, second.stdout)
+
+    def test_run_missing_executable(self):
+        with memo.run():
+            result = runner.run(['nonexistent-hardware-tool', '-a'])
+        self.assertEqual(result.returncode, 127)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import json
+import os
+import tempfile
+import unittest
+
+from hardware import packed
+from hardware import typed
+
+HW_LST = [('cpu', 'logical', 'number', 4),
+          ('cpu', 'physical_0', 'frequency', 2.5),
+          ('cpu', 'physical_0', 'flags', 'fpu sse'),
+          ('disk', 'sda', 'size', '500'),
+          ('disk', 'sda', 'size', 500),
+          ('disk', 'sda', 'rotational', True),
+          ('disk', 'sda', 'smart', False),
+          ('disk', 'sda', 'vendor', None),
+          ('system', 'product', 'name', 'caf\xe9 \U0001f600'),
+          ('memory', 'total', 'offset', -3 * 2 ** 70)]
+
+
+class TestPacked(unittest.TestCase):
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.filename = os.path.join(tmpdir.name, 'fleet.hwpk')
+
+    def _check_round_trip(self, compress):
+        hosts = [('host1', HW_LST),
+                 ('host2', HW_LST[3:] + [('cpu', 'logical', 'number', 8)]),
+                 ('empty', [])]
+        packed.write(self.filename, hosts, compress=compress)
+        with packed.Reader(self.filename) as reader:
+            self.assertEqual(list(reader), ['host1', 'host2', 'empty'])
+            for name, hw_lst in hosts:
+                ret = reader.load(name)
+                self.assertEqual(ret, hw_lst)
+                self.assertEqual([list(map(type, entry)) for entry in ret],
+                                 [list(map(type, entry))
+                                  for entry in hw_lst])
+            self.assertEqual(
+                list(reader.select('cpu', 'logical', 'number')),
+                [('host1', ('cpu', 'logical', 'number', 4)),
+                 ('host2', ('cpu', 'logical', 'number', 8))])
+            self.assertEqual(list(reader.select('disk', key='size')),
+                             [('host1', ('disk', 'sda', 'size', '500')),
+                              ('host1', ('disk', 'sda', 'size', 500)),
+                              ('host2', ('disk', 'sda', 'size', '500')),
+                              ('host2', ('disk', 'sda', 'size', 500))])
+            self.assertEqual(list(reader.select('gpu')), [])
+            self.assertRaises(KeyError, reader.load, 'host3')
+
+    def test_round_trip(self):
+        self._check_round_trip(False)
+
+    def test_round_trip_compressed(self):
+        self._check_round_trip(True)
+
+    def test_json_output(self):
+        hw_lst = [tuple(entry) for entry in json.loads(json.dumps(HW_LST))]
+        hw_lst.append(('disk', 'sdb', 'size', typed.Number('1', 1)))
+        packed.write(self.filename, [('host', hw_lst)])
+        with packed.Reader(self.filename) as reader:
+            self.assertEqual(json.dumps(reader.load('host')),
+                             json.dumps(hw_lst))
+
+    def test_smaller_than_json(self):
+        hw_lst = [('disk', 'sd%d' % idx, 'SMART/attr%d' % attr, str(attr))
+                  for idx in range(20) for attr in range(100)]
+        packed.write(self.filename, [('host', hw_lst)])
+        self.assertLess(os.path.getsize(self.filename),
+                        len(json.dumps(hw_lst)) / 4)
+
+    def test_invalid_value(self):
+        with open(self.filename, 'wb') as fileobj:
+            writer = packed.Writer(fileobj)
+            self.assertRaises(ValueError, writer.add, 'host',
+                              [('disk', 'sda', 'model', b'X1')])
+            self.assertRaises(ValueError, writer.add, 'host',
+                              [('disk', 'sda', 'model')])
+
+    def test_invalid_archive(self):
+        with open(self.filename, 'wb') as fileobj:
+            fileobj.write(b'[["disk", "sda", "size", "500"]]')
+        self.assertRaises(packed.PackedError, packed.Reader, self.filename)
+        open(self.filename, 'wb').close()
+        self.assertRaises(packed.PackedError, packed.Reader, self.filename)
+        packed.write(self.filename, [('host', HW_LST)])
+        with open(self.filename, 'r+b') as fileobj:
+            fileobj.truncate(os.path.getsize(self.filename) - 2)
+        self.assertRaises(packed.PackedError, packed.Reader, self.filename)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,223 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import os
+import subprocess
+import sys
+import threading
+import time
+import unittest
+from unittest import mock
+
+from hardware import detect_utils
+from hardware import probe
+
+
+class TestProbe(unittest.TestCase):
+
+    def test_run_probes_order(self):
+        def slow():
+            time.sleep(0.05)
+            return [('a', 'b', 'c', 'd')]
+
+        probes = [probe.Probe('slow', slow),
+                  probe.Probe('fast', lambda: [('e', 'f', 'g', 'h')]),
+                  probe.Probe('none', lambda: None)]
+        results = probe.run_probes(probes)
+        self.assertEqual(list(results), ['slow', 'fast', 'none'])
+        self.assertEqual(results,
+                         {'slow': [('a', 'b', 'c', 'd')],
+                          'fast': [('e', 'f', 'g', 'h')],
+                          'none': []})
+
+    def test_run_probes_concurrent(self):
+        barrier = threading.Barrier(2, timeout=5)
+
+        def wait():
+            barrier.wait()
+            return []
+
+        probes = [probe.Probe('one', wait), probe.Probe('two', wait)]
+        self.assertEqual(probe.run_probes(probes, jobs=2),
+                         {'one': [], 'two': []})
+
+    def test_run_probes_requires(self):
+        system = [('system', 'product', 'vendor', 'HPE')]
+        probes = [probe.Probe('bios', lambda hw: [('hp', 'bios', 'x', hw)],
+                              requires=('system',)),
+                  probe.Probe('system', lambda: system)]
+        results = probe.run_probes(probes, jobs=1)
+        self.assertEqual(results['bios'], [('hp', 'bios', 'x', system)])
+
+    def test_run_probes_callback(self):
+        completed = []
+        probes = [probe.Probe('hung', lambda: detect_utils.cmd('sleep 10'),
+                              timeout=0.2),
+                  probe.Probe('fast', lambda: [('a', 'b', 'c', 'd')])]
+        results = probe.run_probes(probes, keep=['hung'],
+                                   callback=lambda name, hw_lst:
+                                   completed.append((name, hw_lst)))
+        self.assertEqual(completed,
+                         [('fast', [('a', 'b', 'c', 'd')]),
+                          ('hung', probe.timeout_result('hung'))])
+        self.assertEqual(results, {'hung': probe.timeout_result('hung')})
+
+    def test_run_probes_callback_requires(self):
+        system = [('system', 'product', 'vendor', 'HPE')]
+        probes = [probe.Probe('bios', lambda hw: [('hp', 'bios', 'x', hw)],
+                              requires=('system',)),
+                  probe.Probe('system', lambda: system)]
+        completed = {}
+        results = probe.run_probes(probes, jobs=1,
+                                   callback=completed.__setitem__)
+        self.assertEqual(results, {})
+        self.assertEqual(completed['bios'], [('hp', 'bios', 'x', system)])
+
+    def test_run_probes_missing_requirement(self):
+        probes = [probe.Probe('bios', lambda hw: [('hp', 'bios', 'x', hw)],
+                              requires=('system',))]
+        self.assertEqual(probe.run_probes(probes),
+                         {'bios': [('hp', 'bios', 'x', [])]})
+
+    def test_run_probes_circular(self):
+        probes = [probe.Probe('a', lambda hw: [], requires=('b',)),
+                  probe.Probe('b', lambda hw: [], requires=('a',))]
+        self.assertRaises(probe.ProbeError, probe.run_probes, probes)
+
+    def test_run_probes_duplicate(self):
+        probes = [probe.Probe('a', list), probe.Probe('a', list)]
+        self.assertRaises(probe.ProbeError, probe.run_probes, probes)
+
+    def test_resolve(self):
+        obj = probe.Probe('rtc', 'hardware.rtc:detect_rtc_clock')
+        from hardware import rtc
+        self.assertIs(obj.resolve(), rtc.detect_rtc_clock)
+        self.assertIs(obj.func, rtc.detect_rtc_clock)
+
+    def test_select(self):
+        probes = [probe.Probe('system', list),
+                  probe.Probe('disk', list),
+                  probe.Probe('bios', list, requires=('system',))]
+        self.assertEqual(probe.select(probes), probes)
+        self.assertEqual(probe.select(probes, only=['disk']), [probes[1]])
+        self.assertEqual(probe.select(probes, only=['bios']),
+                         [probes[0], probes[2]])
+        self.assertEqual(probe.select(probes, skip=['system', 'disk']),
+                         [probes[2]])
+        self.assertEqual(probe.select(probes, only=['bios'],
+                                      skip=['system']),
+                         [probes[2]])
+
+    def test_select_unknown(self):
+        self.assertRaises(probe.ProbeError, probe.select,
+                          [probe.Probe('system', list)], only=['raid'])
+
+    def test_run_probes_timeout(self):
+        start = time.monotonic()
+        probes = [probe.Probe('hung', lambda: detect_utils.cmd('sleep 10')),
+                  probe.Probe('fast', lambda: [('a', 'b', 'c', 'd')])]
+        results = probe.run_probes(probes, timeout=0.2)
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual(results,
+                         {'hung': [('hw', 'probe', 'hung', 'timeout')],
+                          'fast': [('a', 'b', 'c', 'd')]})
+
+    def test_run_probes_timeout_exit(self):
+        # a probe blocked outside of the runner does not delay the exit
+        code = ('import time\n'
+                'from hardware import probe\n'
+                'probe.GRACE_PERIOD = 0.1\n'
+                'hung = probe.Probe("hung", lambda: time.sleep(30))\n'
+                'print(probe.run_probes([hung], timeout=0.1))\n')
+        start = time.monotonic()
+        topdir = os.path.dirname(os.path.dirname(probe.__file__))
+        output = subprocess.check_output([sys.executable, '-c', code],
+                                         cwd=topdir,
+                                         stderr=subprocess.DEVNULL,
+                                         timeout=20)
+        self.assertLess(time.monotonic() - start, 10)
+        self.assertIn(b"'timeout'", output)
+
+    @mock.patch.object(probe, 'GRACE_PERIOD', 0.1)
+    def test_run_probes_timeout_frees_job(self):
+        event = threading.Event()
+        probes = [probe.Probe('hung', lambda: event.wait(5)),
+                  probe.Probe('fast', lambda: [('a', 'b', 'c', 'd')])]
+        try:
+            results = probe.run_probes(probes, jobs=1, timeout=0.2)
+        finally:
+            event.set()
+        self.assertEqual(results,
+                         {'hung': probe.timeout_result('hung'),
+                          'fast': [('a', 'b', 'c', 'd')]})
+
+    def test_run_probes_timeouts_override(self):
+        probes = [probe.Probe('hung', lambda: detect_utils.cmd('sleep 10'),
+                              timeout=30)]
+        results = probe.run_probes(probes, timeouts={'hung': 0.2})
+        self.assertEqual(results['hung'], probe.timeout_result('hung'))
+
+    def test_run_probes_timeouts_unknown(self):
+        self.assertRaises(probe.ProbeError, probe.run_probes, [],
+                          timeouts={'hung': 1})
+
+    @mock.patch.object(probe, 'GRACE_PERIOD', 0.1)
+    def test_run_probes_time_budget(self):
+        event = threading.Event()
+
+        def hung():
+            event.wait(5)
+            return [('a', 'b', 'c', 'd')]
+
+        probes = [probe.Probe('hung', hung),
+                  probe.Probe('next', lambda hw: [('e', 'f', 'g', hw)],
+                              requires=('hung',))]
+        try:
+            results = probe.run_probes(probes, time_budget=0.2)
+        finally:
+            event.set()
+        self.assertEqual(results,
+                         {'hung': probe.timeout_result('hung'),
+                          'next': probe.timeout_result('next')})
+
+    def test_time_left(self):
+        self.assertIsNone(probe.time_left())
+        probes = [probe.Probe('left', lambda: [probe.time_left()])]
+        left = probe.run_probes(probes, timeout=10)['left'][0]
+        self.assertTrue(0 < left <= 10)
+
+    def test_run_probes_stats(self):
+        def run():
+            detect_utils.cmd('echo hello')
+            return detect_utils.output_lines('echo world')
+
+        stats = {}
+        results = probe.run_probes([probe.Probe('echo', run)], stats=stats)
+        self.assertEqual(results, {'echo': ['world']})
+        self.assertEqual(stats['echo'].subprocesses, 2)
+        self.assertEqual(stats['echo'].nbytes, 12)
+        report = probe.timing_report(stats)
+        self.assertEqual(
+            [(cmd['cmd'], cmd['bytes'])
+             for cmd in report['probes']['echo']['commands']],
+            [('echo hello', 6), ('echo world', 6)])
+        self.assertFalse(report['probes']['echo']['timeout'])
+        self.assertEqual(probe.timing_result(stats),
+                         [('hw', 'timing', 'echo',
+                           report['probes']['echo']['wall_ms'])])
+
+    def test_run_probes_stats_timeout(self):
+        stats = {}
+        probes = [probe.Probe('hung', lambda: detect_utils.cmd('sleep 10'))]
+        probe.run_probes(probes, timeout=0.2, stats=stats)
+        self.assertTrue(stats['hung'].timeout)
+        self.assertEqual(stats['hung'].subprocesses, 1)
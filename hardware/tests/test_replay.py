@@ -0,0 +1,69 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from hardware import detect_utils
+from hardware import replay
+from hardware import runner
+
+
+class TestReplay(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.archive = os.path.join(self.tmpdir, 'archive')
+        self.sysfs = os.path.join(self.tmpdir, 'sysfs')
+        os.mkdir(self.sysfs)
+        with open(os.path.join(self.sysfs, 'model'), 'w') as model:
+            model.write('T1000\n')
+        self.addCleanup(replay.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _collect(self):
+        model = os.path.join(self.sysfs, 'model')
+        return (runner.run('echo hello; echo world >&2; exit 2'),
+                runner.run(['printf', '%s', 'a b']).text,
+                replay.listdir(self.sysfs),
+                replay.exists(model),
+                detect_utils.from_file(model))
+
+    def test_record_replay(self):
+        replay.start(self.archive, replay.RECORD)
+        recorded = self._collect()
+        self.assertRaises(IOError, detect_utils.from_file,
+                          os.path.join(self.sysfs, 'missing'))
+        replay.stop()
+
+        shutil.rmtree(self.sysfs)
+        replay.start(self.archive, replay.REPLAY)
+        self.assertEqual(self._collect(), recorded)
+        self.assertEqual(recorded[0], ('echo hello; echo world >&2; exit 2',
+                                       2, b'hello\n', b'world\n'))
+        self.assertRaises(IOError, detect_utils.from_file,
+                          os.path.join(self.sysfs, 'missing'))
+
+    def test_replay_not_recorded(self):
+        replay.start(self.archive, replay.RECORD)
+        replay.stop()
+        replay.start(self.archive, replay.REPLAY)
+        self.assertEqual(runner.run('echo hello').returncode, 127)
+        self.assertRaises(FileNotFoundError, replay.listdir, self.sysfs)
+
+    def test_replay_missing_archive(self):
+        self.assertRaises(replay.ReplayError, replay.start, self.archive,
+                          replay.REPLAY)
@@ -0,0 +1,68 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import subprocess
+import time
+import unittest
+
+from hardware import probe
+from hardware import runner
+
+
+class TestRunner(unittest.TestCase):
+
+    def test_run(self):
+        result = runner.run('echo out; echo err >&2; exit 3')
+        self.assertEqual(result, ('echo out; echo err >&2; exit 3', 3,
+                                  b'out\n', b'err\n'))
+        self.assertEqual(result.lines(), ['out'])
+
+    def test_run_argv(self):
+        result = runner.run(['echo', 'a b', '$HOME'])
+        self.assertEqual(result.text, 'a b $HOME\n')
+
+    def test_run_missing(self):
+        result = runner.run(['/nonexistent/tool', '-a'])
+        self.assertEqual(result.returncode, 127)
+        self.assertEqual(result.stdout, b'')
+
+    def test_run_timeout(self):
+        start = time.monotonic()
+        self.assertRaises(subprocess.TimeoutExpired, runner.run,
+                          'sleep 10', timeout=0.1)
+        self.assertLess(time.monotonic() - start, 5)
+
+    def test_run_many(self):
+        start = time.monotonic()
+        results = runner.run_many(['sleep 0.3; echo %d' % idx
+                                   for idx in range(4)], concurrency=4)
+        self.assertLess(time.monotonic() - start, 1.1)
+        self.assertEqual([result.text for result in results],
+                         ['0\n', '1\n', '2\n', '3\n'])
+
+    def test_run_many_stats(self):
+        stats = {}
+        probes = [probe.Probe('many', lambda: runner.run_many(
+            ['sleep 0.1; echo long', 'echo a']))]
+        probe.run_probes(probes, stats=stats)
+        self.assertEqual(stats['many'].nbytes, 7)
+        self.assertEqual(sorted((cmd, nbytes) for cmd, _, nbytes
+                                in stats['many'].commands),
+                         [('echo a', 2), ('sleep 0.1; echo long', 5)])
+
+    def test_run_probe_timeout(self):
+        probes = [probe.Probe('hung', lambda: runner.run_many(
+            ['sleep 10', 'sleep 10']), timeout=0.2)]
+        start = time.monotonic()
+        self.assertEqual(probe.run_probes(probes),
+                         {'hung': probe.timeout_result('hung')})
+        self.assertLess(time.monotonic() - start, 5)
@@ -10,15 +10,19 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
-import subprocess
 import unittest
 from unittest import mock
 
+from hardware import runner
 from hardware import smart_utils
 from hardware.tests.results import smart_utils_results
 from hardware.tests.utils import sample
 
 
+def _smartctl_result(name):
+    return runner.Result('smartctl', 0, sample(name, mode='rb'), b'')
+
+
 class TestSmartUtils(unittest.TestCase):
 
     def test_read_smart_field(self):
@@ -78,73 +82,65 @@ class TestSmartUtils(unittest.TestCase):
                           ('disk', 'fake',
                            'SMART/verify_total_uncorrected_errors', '0')])
 
-    @mock.patch.object(subprocess, 'Popen')
-    def test_read_smart_scsi(self, mock_popen):
+    @mock.patch.object(runner, 'run_async')
+    def test_read_smart_scsi(self, mock_run):
         hwlst = []
-        fake_output = sample('smartctl_scsi', mode='rb').splitlines()
-        mock_popen.return_value = mock.Mock(stdout=fake_output)
+        mock_run.return_value = _smartctl_result('smartctl_scsi')
         smart_utils.read_smart_scsi(hwlst, 'fake')
 
         self.assertEqual(hwlst, smart_utils_results.READ_SMART_SCSI_RESULT)
 
-    @mock.patch.object(subprocess, 'Popen')
-    def test_read_smart_ata(self, mock_popen):
+    @mock.patch.object(runner, 'run_async')
+    def test_read_smart_ata(self, mock_run):
         hwlst = []
-        fake_output = sample('smartctl_ata', mode='rb').splitlines()
-        mock_popen.return_value = mock.Mock(stdout=fake_output)
+        mock_run.return_value = _smartctl_result('smartctl_ata')
         smart_utils.read_smart_ata(hwlst, 'fake')
 
         self.assertEqual(hwlst, smart_utils_results.READ_SMART_ATA_RESULT)
 
-    @mock.patch.object(subprocess, 'Popen')
-    def test_read_smart_ata_hdd(self, mock_popen):
+    @mock.patch.object(runner, 'run_async')
+    def test_read_smart_ata_hdd(self, mock_run):
         hwlst = []
-        fake_output = sample('smartctl_ata_hdd', mode='rb').splitlines()
-        mock_popen.return_value = mock.Mock(stdout=fake_output)
+        mock_run.return_value = _smartctl_result('smartctl_ata_hdd')
         smart_utils.read_smart_ata(hwlst, 'fake')
 
         self.assertEqual(hwlst, smart_utils_results.READ_SMART_ATA_HDD_RESULT)
 
-    @mock.patch.object(subprocess, 'Popen')
-    def test_read_smart_ata_decode_ignore(self, mock_popen):
+    @mock.patch.object(runner, 'run_async')
+    def test_read_smart_ata_decode_ignore(self, mock_run):
         hwlst = []
-        fake_output = sample('smartctl_ata_decode_ignore',
-                             mode='rb').splitlines()
-        mock_popen.return_value = mock.Mock(stdout=fake_output)
+        mock_run.return_value = _smartctl_result('smartctl_ata_decode_ignore')
         smart_utils.read_smart_ata(hwlst, 'fake')
         self.assertEqual(
             hwlst, smart_utils_results.READ_SMART__ATA_DECODE_IGNORE_RESULT)
 
-    @mock.patch('hardware.smart_utils.read_smart_ata')
+    @mock.patch('hardware.smart_utils.read_smart_ata_async')
     @mock.patch('os.path.exists', return_value=True)
-    @mock.patch.object(subprocess, 'Popen')
-    def test_read_smart_call_smart_ata(self, mock_popen, mock_os_path_exists,
+    @mock.patch.object(runner, 'run_async')
+    def test_read_smart_call_smart_ata(self, mock_run, mock_os_path_exists,
                                        mock_ata):
         hwlst = []
-        fake_output = sample('smartctl_ata', mode='rb').splitlines()
-        mock_popen.return_value = mock.Mock(stdout=fake_output)
+        mock_run.return_value = _smartctl_result('smartctl_ata')
         smart_utils.read_smart(hwlst, 'fake')
 
         mock_ata.assert_called()
 
-    @mock.patch('hardware.smart_utils.read_smart_scsi')
+    @mock.patch('hardware.smart_utils.read_smart_scsi_async')
     @mock.patch('os.path.exists', return_value=True)
-    @mock.patch.object(subprocess, 'Popen')
-    def test_read_smart_call_smart_scsi(self, mock_popen, mock_os_path_exists,
+    @mock.patch.object(runner, 'run_async')
+    def test_read_smart_call_smart_scsi(self, mock_run, mock_os_path_exists,
                                         mock_scsi):
         hwlst = []
-        fake_output = sample('smartctl_scsi', mode='rb').splitlines()
-        mock_popen.return_value = mock.Mock(stdout=fake_output)
+        mock_run.return_value = _smartctl_result('smartctl_scsi')
         smart_utils.read_smart(hwlst, 'fake')
 
         mock_scsi.assert_called()
 
     @mock.patch('os.path.exists', return_value=True)
-    @mock.patch.object(subprocess, 'Popen')
-    def test_read_smart_nvme(self, mock_popen, mock_os_path_exists):
+    @mock.patch.object(runner, 'run_async')
+    def test_read_smart_nvme(self, mock_run, mock_os_path_exists):
         hwlst = []
-        fake_output = sample('smartctl_nvme', mode='rb').splitlines()
-        mock_popen.return_value = mock.Mock(stdout=fake_output)
+        mock_run.return_value = _smartctl_result('smartctl_nvme')
         smart_utils.read_smart_nvme(hwlst, 'fake_nvme')
 
         self.assertEqual(hwlst, smart_utils_results.READ_SMART_NVME_RESULT)
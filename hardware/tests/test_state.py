@@ -46,6 +46,27 @@ class TestState(unittest.TestCase):
         obj._load_specs = lambda x: items
         self.assertEqual(obj.find_match(items), ('hw', {}))
 
+    def test_compiled_specs_cached(self):
+        obj = state.State(data=[('hw', '*')], cfg_dir='/nowhere')
+        specs = [('disk', '$disk', 'size', 'gt(10)')]
+        with patch.object(obj, '_load_specs',
+                          return_value=specs) as load_specs:
+            compiled = obj._compiled_specs('hw')
+            self.assertIs(obj._compiled_specs('hw'), compiled)
+            self.assertEqual(obj.find_match([('disk', 'sda', 'size', '20')]),
+                             ('hw', {'disk': 'sda'}))
+        load_specs.assert_called_once_with('hw')
+
+    def test_find_match_fields(self):
+        obj = state.State(data=[('hw', '*')], cfg_dir='/nowhere')
+        specs = [('memory', 'total', 'size', '$size=ge(4096)')]
+        with patch.object(obj, '_load_specs', return_value=specs):
+            name, var = obj.find_match([('memory', 'total', 'size',
+                                         '0x1000')])
+        self.assertEqual((name, var), ('hw', {'size': '0x1000'}))
+        self.assertEqual(var['size'].number, 4096)
+        self.assertEqual(var['size'].unit, 'B')
+
     def test_lock(self):
         tmpdir = tempfile.mkdtemp()
         obj = state.State(data=[], cfg_dir=tmpdir)
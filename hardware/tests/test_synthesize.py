@@ -0,0 +1,132 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import ast
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from hardware import matcher
+from hardware import synthesize
+
+
+def _host(serial, memory, disks):
+    hw_lst = [('system', 'product', 'name', 'R640'),
+              ('system', 'product', 'serial', serial),
+              ('cpu', 'logical', 'number', '64'),
+              ('memory', 'total', 'size', memory)]
+    for idx, (model, size) in enumerate(disks):
+        name = 'sd%s' % chr(ord('a') + idx)
+        hw_lst.extend([('disk', name, 'model', model),
+                       ('disk', name, 'size', size),
+                       ('disk', name, 'SMART/temperature', '3%d' % idx)])
+    hw_lst.append(('network', 'eth0', 'serial', serial.lower()))
+    return hw_lst
+
+
+HOST1 = _host('AB1', '274877906944', [('ST1000', '1000'), ('ST1000', '1000'),
+                                      ('MZ7', '480')])
+HOST2 = _host('AB2', '274877902848', [('MZ7', '479'), ('ST1000', '1000'),
+                                      ('ST1000', '1000')])
+
+
+class TestSynthesize(unittest.TestCase):
+
+    def test_synthesize(self):
+        specs = synthesize.synthesize([HOST1, HOST2])
+        self.assertEqual(
+            specs,
+            [('system', 'product', 'name', 'R640'),
+             ('cpu', 'logical', 'number', '64'),
+             ('memory', 'total', 'size',
+              'range(274877902848, 274877906944)'),
+             ('disk', '$disk0', 'model', 'MZ7'),
+             ('disk', '$disk0', 'size', 'range(479, 480)'),
+             ('disk', '$disk1', 'model', 'ST1000'),
+             ('disk', '$disk1', 'size', '1000'),
+             ('disk', '$disk2', 'model', 'ST1000'),
+             ('disk', '$disk2', 'size', '1000')])
+        for hw_lst in (HOST1, HOST2):
+            arr = {}
+            self.assertTrue(matcher.match_all(hw_lst, specs, arr, {}))
+        self.assertEqual(sorted(arr.values()), ['sda', 'sdb', 'sdc'])
+        self.assertFalse(matcher.match_all(HOST1[:-4], specs, {}, {}))
+
+    def test_tolerance(self):
+        specs = synthesize.synthesize([HOST1], tolerance=0.1, at_least=True)
+        self.assertIn(('disk', '$disk0', 'size', 'ge(432)'), specs)
+        specs = synthesize.synthesize([HOST1], tolerance=0.1)
+        self.assertIn(('disk', '$disk0', 'size', 'range(432, 528)'), specs)
+
+    def test_tolerance_precision(self):
+        hosts = [_host('AB1', '17179869184', [('MZ7', '480')]),
+                 _host('AB2', '17179869185', [('MZ7', '480')])]
+        for at_least in (False, True):
+            specs = synthesize.synthesize(hosts, tolerance=1e-9,
+                                          at_least=at_least)
+            for hw_lst in hosts:
+                self.assertTrue(matcher.match_all(hw_lst, specs, {}, {}))
+
+    def test_different_values(self):
+        host = [('system', 'product', 'name', 'R650')] + HOST2[1:]
+        specs = synthesize.synthesize([HOST1, host])
+        self.assertNotIn('name', [spec[2] for spec in specs])
+
+    def test_no_inventory(self):
+        self.assertRaises(ValueError, synthesize.synthesize, [])
+
+    def test_main(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        names = []
+        for idx, hw_lst in enumerate((HOST1, HOST2)):
+            names.append(os.path.join(tmpdir.name, 'host%d.json' % idx))
+            with open(names[-1], 'w') as fileobj:
+                json.dump(hw_lst, fileobj)
+        output = io.StringIO()
+        with mock.patch('sys.argv', ['hardware-synthesize'] + names), \
+                mock.patch('sys.stdout', output):
+            synthesize.main()
+        self.assertEqual(ast.literal_eval(output.getvalue()),
+                         synthesize.synthesize([HOST1, HOST2]))
+
+    def test_escaped_values(self):
+        hw_lst = [('system', 'product', 'name', 'Server (1, 2)'),
+                  ('system', 'product', 'vendor', '$vendor')]
+        specs = synthesize.synthesize([hw_lst])
+        self.assertEqual(specs[0], ('system', 'product', 'name',
+                                    r'regexp(^Server\ \(1\x2c\ 2\)$)'))
+        self.assertTrue(matcher.match_all(hw_lst, specs, {}, {}))
+        self.assertFalse(matcher.match_all(
+            [('system', 'product', 'name', 'Server (1, 3)')] + hw_lst[1:],
+            specs, {}, {}))
+
+    def test_samples_round_trip(self):
+        directory = os.path.join(os.path.dirname(__file__),
+                                 'cardiff_samples')
+        hw_lsts = []
+        for name in sorted(os.listdir(directory)):
+            with open(os.path.join(directory, name)) as fileobj:
+                hw_lsts.append(ast.literal_eval(fileobj.read()))
+        for hw_lst in hw_lsts[:3]:
+            self.assertTrue(matcher.match_all(
+                hw_lst, synthesize.synthesize([hw_lst]), {}, {}))
+        specs = synthesize.synthesize(hw_lsts)
+        for hw_lst in hw_lsts:
+            self.assertTrue(matcher.match_all(hw_lst, specs, {}, {}))
+
+
+if __name__ == "__main__":
+    unittest.main()
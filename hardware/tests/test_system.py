@@ -18,12 +18,10 @@ from hardware.tests.results import system_results
 from hardware.tests.utils import sample
 
 
-@mock.patch('hardware.detect_utils.get_ethtool_status',
-            lambda *args, **kwargs: [])
+@mock.patch('hardware.detect_utils.get_network_status',
+            lambda names: [[] for name in names])
 @mock.patch('socket.inet_ntoa', lambda *args, **kwargs: '255.255.255.0')
 @mock.patch('fcntl.ioctl', lambda *args, **kwargs: [])
-@mock.patch('hardware.detect_utils.get_lld_status',
-            lambda *args, **kwargs: [])
 class TestSystem(unittest.TestCase):
 
     @mock.patch('hardware.detect_utils.cmd', return_value=(0, 4))
@@ -35,10 +33,11 @@ class TestSystem(unittest.TestCase):
                     ('Ubuntu',),
                     ('Ubuntu 14.04 LTS',),
                     ('3.13.0-24-generic',),
-                    ('x86_64',),
-                    ('BOOT_IMAGE=/boot/vmlinuz',)])
+                    ('x86_64',)])
+    @mock.patch('hardware.detect_utils.from_file',
+                return_value='BOOT_IMAGE=/boot/vmlinuz\n')
     def test_detect_system_3(self, mock_cmd, mock_get_uuid, mock_get_cpus,
-                             mock_output_lines):
+                             mock_output_lines, mock_from_file):
         result = system.detect(sample('lshw3'))
         self.assertEqual(result, system_results.DETECT_SYSTEM3_RESULT)
 
@@ -51,10 +50,11 @@ class TestSystem(unittest.TestCase):
                     ('Ubuntu',),
                     ('Ubuntu 14.04 LTS',),
                     ('3.13.0-24-generic',),
-                    ('x86_64',),
-                    ('BOOT_IMAGE=/boot/vmlinuz',)])
+                    ('x86_64',)])
+    @mock.patch('hardware.detect_utils.from_file',
+                return_value='BOOT_IMAGE=/boot/vmlinuz\n')
     def test_detect_system_2(self, mock_cmd, mock_get_uuid, mock_get_cpus,
-                             mock_output_lines):
+                             mock_output_lines, mock_from_file):
         result = system.detect(sample('lshw2'))
         self.assertEqual(result, system_results.DETECT_SYSTEM2_RESULT)
 
@@ -67,9 +67,30 @@ class TestSystem(unittest.TestCase):
                     ('Ubuntu',),
                     ('Ubuntu 14.04 LTS',),
                     ('3.13.0-24-generic',),
-                    ('x86_64',),
-                    ('BOOT_IMAGE=/boot/vmlinuz',)])
+                    ('x86_64',)])
+    @mock.patch('hardware.detect_utils.from_file',
+                return_value='BOOT_IMAGE=/boot/vmlinuz\n')
     def test_detect_system(self, mock_cmd, mock_get_uuid, mock_get_cpus,
-                           mock_output_lines):
+                           mock_output_lines, mock_from_file):
         result = system.detect(sample('lshw'))
         self.assertEqual(result, system_results.DETECT_SYSTEM_RESULT)
+
+    @mock.patch('os.path.exists', return_value=True)
+    @mock.patch('hardware.detect_utils.from_file',
+                side_effect=['1', '1000', 'full',
+                             IOError(), '-1', 'unknown',
+                             '1', '2500', 'full'])
+    def test_detect_links(self, mock_from_file, mock_exists):
+        result = system.detect_links(
+            [('network', 'eth0', 'serial', '00:11:22:33:44:55'),
+             ('network', 'eth0', 'link', 'no'),
+             ('network', 'eth1', 'link', 'yes'),
+             ('network', 'eth2', 'link', 'yes'),
+             ('system', 'product', 'name', 'fake')])
+        self.assertEqual(result, [('network', 'eth0', 'link', 'yes'),
+                                  ('network', 'eth0', 'speed', '1Gbit/s'),
+                                  ('network', 'eth0', 'duplex', 'full'),
+                                  ('network', 'eth1', 'link', 'no'),
+                                  ('network', 'eth2', 'link', 'yes'),
+                                  ('network', 'eth2', 'speed', '2500Mbit/s'),
+                                  ('network', 'eth2', 'duplex', 'full')])
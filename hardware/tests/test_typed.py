@@ -0,0 +1,81 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import json
+import pickle
+import unittest
+
+from hardware import matcher
+from hardware import probe
+from hardware import typed
+
+FIELDS = [('disk', '*', 'size', int, 'GB'),
+          ('memory', 'total', 'size', int, 'B')]
+
+
+class TestTyped(unittest.TestCase):
+
+    def test_parse(self):
+        value = typed.parse('500', int, 'GB')
+        self.assertIsInstance(value, typed.Number)
+        self.assertEqual(value, '500')
+        self.assertEqual(hash(value), hash('500'))
+        self.assertEqual((value.number, value.unit), (500, 'GB'))
+        self.assertEqual(json.dumps([value]), '["500"]')
+        self.assertEqual(pickle.loads(pickle.dumps(value)).number, 500)
+        self.assertEqual(typed.parse('0x10', int).number, 16)
+        self.assertEqual(typed.parse('fast', int), 'fast')
+        self.assertEqual(typed.parse(12, int), 12)
+
+    def test_normalize(self):
+        hw_lst = [('disk', 'sda', 'size', '500'),
+                  ('disk', 'sda', 'vendor', '500'),
+                  ('memory', 'total', 'size', '4096'),
+                  ('cpu', 'logical', 'number', 4)]
+        ret = typed.normalize(hw_lst, FIELDS)
+        self.assertEqual(ret, hw_lst)
+        self.assertEqual([type(entry[3]) for entry in ret],
+                         [typed.Number, str, typed.Number, int])
+        self.assertEqual(ret[2][3].unit, 'B')
+
+    def test_normalize_undeclared(self):
+        ret = typed.normalize([['disk', 'sda', 'size', '1.5'],
+                               ('disk', 'sda', 'model', 'X1')])
+        self.assertEqual(ret, [['disk', 'sda', 'size', '1.5'],
+                               ('disk', 'sda', 'model', 'X1')])
+        self.assertEqual(ret[0][3].number, 1.5)
+        self.assertNotIsInstance(ret[1][3], typed.Number)
+
+    def test_number(self):
+        self.assertEqual(typed.number(typed.Number('1k', 1000)), 1000)
+        self.assertEqual(typed.number('2.5'), 2.5)
+        self.assertEqual(typed.number(3), 3.0)
+        self.assertRaises(ValueError, typed.number, 'fast')
+
+    def test_matcher_uses_number(self):
+        lines = [('disk', 'sda', 'size', typed.Number('1 TB', 1000))]
+        arr = {}
+        self.assertTrue(matcher.match_all(
+            lines, [('disk', '$disk', 'size', 'gt(500)')], arr, {}))
+        self.assertEqual(arr, {'disk': 'sda'})
+
+    def test_run_probes_typed(self):
+        probes = [probe.Probe('disk', lambda: [('disk', 'sda', 'size', '5')],
+                              fields=FIELDS)]
+        ret = probe.run_probes(probes, typed=True)['disk']
+        self.assertEqual(ret[0][3].number, 5)
+        ret = probe.run_probes(probes)['disk']
+        self.assertNotIsInstance(ret[0][3], typed.Number)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Numeric values of the inventory parsed once.
+
+A Number is the string reported by a collector together with its parsed
+value and unit. It is equal to, hashed and serialized to JSON like the
+string, so typed inventories keep the output format, while the matcher
+compares the parsed values without converting the strings again.
+
+The collectors declare the type and unit of their numeric fields with
+(class, type, key, kind, unit) tuples, see the fields attribute of
+probe.Probe.
+"""
+
+import fnmatch
+import functools
+import re
+
+
+class Number(str):
+    """String of a number with its parsed value and unit."""
+
+    def __new__(cls, text, number, unit=None):
+        ret = super(Number, cls).__new__(cls, text)
+        ret.number = number
+        ret.unit = unit
+        return ret
+
+    def __reduce__(self):
+        return (Number, (str(self), self.number, self.unit))
+
+
+def parse(value, kind=float, unit=None):
+    """Return value as a Number, unchanged when it is not a number string.
+
+    :param kind: int or float, the type of the parsed value
+    :param unit: unit of the value, e.g. 'GB'
+    """
+    if isinstance(value, Number) or not isinstance(value, str):
+        return value
+    try:
+        if kind is int and value.lower().startswith('0x'):
+            number = int(value, 16)
+        elif kind is int:
+            number = int(value)
+        else:
+            number = float(value)
+    except ValueError:
+        return value
+    return Number(value, number, unit)
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_float(text):
+    return float(text)
+
+
+def number(value):
+    """Return the numeric value of a Number, a string or a number.
+
+    :raises: ValueError when value is not a number
+    """
+    ret = getattr(value, 'number', None)
+    if ret is not None:
+        return ret
+    if isinstance(value, str):
+        return _parse_float(value)
+    return float(value)
+
+
+def _compile(fields):
+    """Split fields into exact (class, type, key) and pattern lookups."""
+    exact = {}
+    patterns = []
+    for cls, type_, key, kind, unit in fields:
+        if any(char in part for part in (cls, type_, key) for char in '*?['):
+            regexps = tuple(re.compile(fnmatch.translate(part))
+                            for part in (cls, type_, key))
+            patterns.append((regexps, kind, unit))
+        else:
+            exact.setdefault((cls, type_, key), (kind, unit))
+    return exact, patterns
+
+
+_NUMBER_REGEXP = re.compile(r'^-?(\d+(\.\d*)?|\.\d+)([eE][-+]?\d+)?$')
+
+
+def _with_value(entry, value):
+    if isinstance(entry, list):
+        return list(entry[0:3]) + [value]
+    return tuple(entry[0:3]) + (value,)
+
+
+def normalize(hw_lst, fields=None):
+    """Return hw_lst with the values of numeric fields as Number objects.
+
+    :param fields: list of (class, type, key, kind, unit) tuples, with
+        shell-style patterns in class, type and key. When None, every
+        string looking like a decimal number is parsed as a float.
+    """
+    exact, patterns = _compile(fields or ())
+    ret = []
+    for entry in hw_lst:
+        value = entry[3]
+        if not isinstance(value, str) or isinstance(value, Number):
+            ret.append(entry)
+            continue
+        if fields is None:
+            declared = (float, None) if _NUMBER_REGEXP.match(value) else None
+        else:
+            declared = exact.get(tuple(entry[0:3]))
+        if declared is None:
+            for regexps, kind, unit in patterns:
+                if all(regexp.match(str(part))
+                       for regexp, part in zip(regexps, entry)):
+                    declared = (kind, unit)
+                    break
+        if declared is not None:
+            entry = _with_value(entry, parse(value, *declared))
+        ret.append(entry)
+    return ret